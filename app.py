@@ -1,20 +1,32 @@
-from flask import Flask, render_template, redirect, url_for
+from flask import Flask, render_template, redirect, url_for, jsonify
 from flask_cors import CORS
 from config import Config
+import assets
+from json_provider import FastJSONProvider
 from database import Database
+import metrics
 from routes.user_routes import user_bp
 from routes.ride_routes import ride_bp
 
 def create_app():
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     app.config.from_object(Config)
     
     # Enable CORS for all routes
-    CORS(app)
+    CORS(app, expose_headers=Config.CORS_EXPOSE_HEADERS)
 
-    # Initialize Database
-    with app.app_context():
-        Database.initialize()
+    # Request latency histograms + /metrics
+    if Config.METRICS_ENABLED:
+        metrics.init_app(app)
+
+    # No database work here: the client is created on first use (get_db)
+    # and indexes are ensured once per INDEX_VERSION, off the request path.
+
+    # Move departed rides to rides_history periodically (opt-in, see Config.ARCHIVE_INTERVAL)
+    if Config.ARCHIVE_INTERVAL > 0:
+        from maintenance import start_archiver
+        start_archiver()
 
     # Register Blueprints
     # Standardizing to /api/v1 for both
@@ -22,6 +34,11 @@ def create_app():
     app.register_blueprint(ride_bp, url_prefix='/api/v1')
 
    
+    # Content-hashed asset URLs (see assets.py)
+    @app.context_processor
+    def asset_helpers():
+        return {"asset_url": assets.asset_url, "asset_version": assets.manifest()["version"]}
+
     @app.route('/')
     def index():
         return render_template('base.html') # Landing page
@@ -43,7 +60,25 @@ def create_app():
 
     @app.route('/sw.js')
     def serve_sw():
-        return app.send_static_file('sw.js')
+        # Always revalidated so a new ?v= registration is picked up promptly
+        response = app.send_static_file('sw.js')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @app.route('/asset-manifest.json')
+    def serve_asset_manifest():
+        response = jsonify(assets.manifest())
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    # -------------------------
+    # Health / Mongo pool stats (per worker)
+    # -------------------------
+    @app.route('/api/v1/health/db')
+    def db_health():
+        if not Database.ping():
+            return jsonify({"status": "down"}), 503
+        return jsonify({"status": "ok", "pool": Database.get_pool_stats()}), 200
 
     # -------------------------
     # Quick Seed for Demo
@@ -0,0 +1,83 @@
+"""
+Content-hashed manifest of the static assets, used for cache busting.
+
+    python assets.py        # writes static/asset-manifest.json (run at build time)
+
+Templates link assets through asset_url(), which appends ?v=<content hash>,
+and register the service worker as /sw.js?v=<version>. A changed file
+therefore gets a new URL (the worker's cache-first lookup misses), and a new
+version makes the browser install a fresh worker that drops old caches.
+Without a built manifest the same data is computed once per process.
+"""
+import hashlib
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, "static")
+TEMPLATE_DIR = os.path.join(ROOT, "templates")
+MANIFEST_PATH = os.path.join(STATIC_DIR, "asset-manifest.json")
+
+# Served from their own routes / generated, so never precached by hash
+EXCLUDED = {"sw.js", "manifest.json", "asset-manifest.json"}
+# App shell pages the worker precaches (rendered from TEMPLATE_DIR)
+PAGES = ["/", "/auth", "/dashboard"]
+
+_manifest = None
+
+def _digest(path):
+    h = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _files(directory):
+    for base, _, names in os.walk(directory):
+        for name in sorted(names):
+            path = os.path.join(base, name)
+            yield os.path.relpath(path, directory).replace(os.sep, "/"), path
+
+def build_manifest():
+    """{"version", "assets": {"/static/x": "/static/x?v=hash"}, "pages"} from the files on disk."""
+    assets = {}
+    overall = hashlib.blake2b(digest_size=8)
+    for rel, path in sorted(_files(STATIC_DIR)):
+        if rel in EXCLUDED:
+            continue
+        digest = _digest(path)
+        assets[f"/static/{rel}"] = f"/static/{rel}?v={digest}"
+        overall.update(f"{rel}:{digest}".encode("utf-8"))
+    # Page markup and the worker itself are part of the shell too
+    for rel, path in sorted(_files(TEMPLATE_DIR)):
+        overall.update(f"templates/{rel}:{_digest(path)}".encode("utf-8"))
+    overall.update(f"sw.js:{_digest(os.path.join(STATIC_DIR, 'sw.js'))}".encode("utf-8"))
+    return {"version": overall.hexdigest(), "assets": assets, "pages": PAGES}
+
+def write_manifest(path=MANIFEST_PATH):
+    data = build_manifest()
+    with open(path, "w") as fh:
+        json.dump(data, fh, indent=2, sort_keys=True)
+    return data
+
+def manifest():
+    """The built manifest if present, else one computed from the files (cached per process)."""
+    global _manifest
+    if _manifest is None:
+        if os.path.exists(MANIFEST_PATH):
+            with open(MANIFEST_PATH) as fh:
+                _manifest = json.load(fh)
+        else:
+            _manifest = build_manifest()
+    return _manifest
+
+def asset_url(path):
+    """Versioned URL for a file under static/, e.g. asset_url('js/rides.js')."""
+    url = f"/static/{path.lstrip('/')}"
+    return manifest()["assets"].get(url, url)
+
+if __name__ == "__main__":
+    data = write_manifest()
+    print(f"Wrote {MANIFEST_PATH}: {len(data['assets'])} assets, version {data['version']}")
+    sys.exit(0)
@@ -0,0 +1,50 @@
+"""
+Optional async serving mode for the read-heavy ride endpoints.
+
+    pip install -r requirements-async.txt
+    hypercorn async_app:app --bind 0.0.0.0:5001
+
+Serves GET /rides/nearby, /rides/search, /ride/<id>/availability and
+/my/joined-rides under /api/v1 on one event loop, so in-flight Mongo
+calls do not each hold a worker thread. Everything else (writes, auth,
+pages) stays on the regular Flask app; route map traffic to this one.
+"""
+from quart import Quart, request
+from config import Config
+from database import AsyncDatabase
+from routes.async_ride_routes import async_ride_bp
+
+# flask-cors' default allowed methods
+CORS_METHODS = "DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+
+def create_async_app():
+    app = Quart(__name__)
+    app.config.from_object(Config)
+
+    app.register_blueprint(async_ride_bp, url_prefix='/api/v1')
+
+    # Same open CORS policy as the Flask app (flask-cors defaults: any
+    # origin echoed back, any method, requested headers allowed on
+    # preflight). Quart answers OPTIONS for every route; this adds headers.
+    @app.after_request
+    async def add_cors_headers(response):
+        origin = request.headers.get('Origin')
+        if not origin:
+            return response
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Access-Control-Expose-Headers'] = ", ".join(Config.CORS_EXPOSE_HEADERS)
+        response.vary.add('Origin')
+        if request.method == 'OPTIONS' and 'Access-Control-Request-Method' in request.headers:
+            response.headers['Access-Control-Allow-Methods'] = CORS_METHODS
+            requested = request.headers.get('Access-Control-Request-Headers')
+            if requested:
+                response.headers['Access-Control-Allow-Headers'] = requested
+        return response
+
+    @app.after_serving
+    async def close_db():
+        await AsyncDatabase.close()
+
+    return app
+
+app = create_async_app()
@@ -0,0 +1,324 @@
+"""
+Concurrent load test / latency benchmark for the UniCarpool API.
+
+Boots create_app() in-process on a threaded WSGI server, seeds a dedicated
+benchmark database and drives a mixed workload from many concurrent clients.
+
+    # Against a local mongod (the database in the URI is WIPED and reseeded)
+    python benchmark.py --mongo-uri mongodb://localhost:27017/unicarpool_bench
+
+    # Against a throwaway in-process mongod (pip install pymongo_inmemory)
+    python benchmark.py --inmemory
+
+    # Record / compare a baseline
+    python benchmark.py --save-baseline
+    python benchmark.py --baseline bench_baseline.json --tolerance 0.2
+
+Exits non-zero if the join race oversells a ride, if any endpoint's error
+rate exceeds --max-error-rate, or if any endpoint's p95 latency / RPS
+regresses beyond the tolerance against the baseline. A failing run never
+overwrites the baseline.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt
+import requests
+from bson import ObjectId
+from werkzeug.serving import make_server
+
+CENTER_LAT = 40.75
+CENTER_LNG = -73.98
+PLACES = [
+    "University Library", "Campus Gate 1", "North Campus Housing", "Science Block",
+    "Grand Central Station", "Downtown Mall", "Airport", "City Center", "Sports Complex"
+]
+
+def log(msg, type="INFO"):
+    print(f"[{type}] {msg}")
+
+# ------------------------------------------
+# Setup
+# ------------------------------------------
+
+def configure_database(args):
+    """Points Config at the benchmark database before the app is created."""
+    from config import Config
+    # Indexes are built explicitly (and waited for) before seeding
+    Config.INDEX_BUILD = "off"
+    if args.inmemory:
+        from pymongo_inmemory import Mongod
+        mongod = Mongod(None)  # None = default context (version, port, download dir)
+        mongod.start()
+        Config.MONGO_URI = mongod.connection_string.rstrip("/") + "/unicarpool_bench"
+        return mongod
+
+    # Benchmark collections are wiped, so never default to the app's MONGO_URI
+    Config.MONGO_URI = args.mongo_uri
+    return None
+
+def seed(db, users, rides, rng):
+    """Seeds 'users' users and 'rides' rides around the demo map center."""
+    from models import User, Ride
+    for name in ("users", "rides", "rides_history", "places", "driver_stats", "route_rollups", "route_totals"):
+        db[name].delete_many({})
+
+    # One shared precomputed hash; benchmark logins are done with minted JWTs
+    user_docs = [
+        User.create_schema(f"Bench User {i}", f"bench{i}@test.com", "pbkdf2:sha256:bench", "Other", "")
+        for i in range(users)
+    ]
+    user_ids = db.users.insert_many(user_docs, ordered=False).inserted_ids
+
+    ride_docs = []
+    for _ in range(rides):
+        pickup, dropoff = rng.sample(PLACES, 2)
+        ride = Ride.create_schema(
+            driver_id=rng.choice(user_ids),
+            pickup=pickup,
+            dropoff=dropoff,
+            pickup_coords={"type": "Point", "coordinates": [
+                CENTER_LNG + rng.uniform(-0.05, 0.05), CENTER_LAT + rng.uniform(-0.05, 0.05)]},
+            dropoff_coords={"type": "Point", "coordinates": [
+                CENTER_LNG + rng.uniform(-0.2, 0.2), CENTER_LAT + rng.uniform(-0.2, 0.2)]},
+            time=datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=rng.uniform(1, 72)),
+            seats=rng.randint(1, 4)
+        )
+        ride_docs.append(ride)
+        if len(ride_docs) >= 5000:
+            db.rides.insert_many(ride_docs, ordered=False)
+            ride_docs = []
+    if ride_docs:
+        db.rides.insert_many(ride_docs, ordered=False)
+
+    from maintenance import rebuild_places, reconcile_driver_stats, rebuild_route_rollups
+    rebuild_places(db)
+    reconcile_driver_stats(db)
+    rebuild_route_rollups(db)
+    return [str(u) for u in user_ids]
+
+def mint_token(secret, user_id):
+    return jwt.encode({
+        'user_id': user_id,
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    }, secret, algorithm="HS256")
+
+def start_server(app, port):
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+# ------------------------------------------
+# Workload
+# ------------------------------------------
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, name, seconds, ok):
+        with self.lock:
+            self.samples.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, wall):
+        out = {}
+        for name, values in sorted(self.samples.items()):
+            values = sorted(values)
+            out[name] = {
+                "count": len(values),
+                "errors": self.errors.get(name, 0),
+                "rps": round(len(values) / wall, 1) if wall else 0,
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+            }
+        return out
+
+def build_workload(base, tokens, rng):
+    """Weighted (name, weight, fn(session)) list of read endpoints."""
+    def headers():
+        return {"Authorization": f"Bearer {rng.choice(tokens)}"}
+
+    def nearby(s):
+        return s.get(f"{base}/api/v1/rides/nearby", params={
+            "lat": CENTER_LAT + rng.uniform(-0.02, 0.02),
+            "lng": CENTER_LNG + rng.uniform(-0.02, 0.02)
+        }, headers=headers())
+
+    def search(s):
+        return s.get(f"{base}/api/v1/rides/search", params={"from": rng.choice(PLACES).split()[0][:4]}, headers=headers())
+
+    def stats(s):
+        return s.get(f"{base}/api/v1/driver/stats", headers=headers())
+
+    def popular(s):
+        return s.get(f"{base}/api/v1/analytics/popular-routes", params={"window": rng.choice(["24h", "7d", "all"])}, headers=headers())
+
+    return [("nearby", 5, nearby), ("search", 3, search), ("driver_stats", 1, stats), ("popular_routes", 1, popular)]
+
+def run_mixed(base, tokens, clients, duration, rng, recorder):
+    workload = build_workload(base, tokens, rng)
+    names = [w for w in workload for _ in range(w[1])]
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            name, _, fn = rng.choice(names)
+            start = time.perf_counter()
+            try:
+                res = fn(session)
+                ok = res.status_code < 400
+            except requests.RequestException:
+                ok = False
+            recorder.add(name, time.perf_counter() - start, ok)
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for _ in range(clients):
+            pool.submit(client)
+
+def run_join_race(base, db, tokens, driver_id, clients, recorder):
+    """Many passengers race for one 2-seat ride; it must never be oversold."""
+    from models import Ride
+    ride = Ride.create_schema(driver_id, "Race Start", "Race End",
+                              {"type": "Point", "coordinates": [CENTER_LNG, CENTER_LAT]},
+                              {"type": "Point", "coordinates": [CENTER_LNG, CENTER_LAT]},
+                              "2099-01-01T00:00", 2)
+    ride_id = str(db.rides.insert_one(ride).inserted_id)
+
+    def join(token):
+        start = time.perf_counter()
+        res = requests.post(f"{base}/api/v1/ride/request/{ride_id}", headers={"Authorization": f"Bearer {token}"})
+        recorder.add("join_race", time.perf_counter() - start, res.status_code in (200, 400, 409))
+        return res.status_code
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        codes = list(pool.map(join, tokens[:clients]))
+
+    stored = db.rides.find_one({"_id": ObjectId(ride_id)}, {"passengers": 1, "seatsAvailable": 1})
+    # A counter out of step with the array counts as oversold too
+    taken = max(len(stored["passengers"]), 2 - stored["seatsAvailable"])
+    return codes.count(200), taken
+
+# ------------------------------------------
+# Baseline
+# ------------------------------------------
+
+def error_failures(report, max_error_rate):
+    """Endpoints whose share of failed requests is above 'max_error_rate'."""
+    failures = []
+    for name, cur in report.items():
+        rate = cur["errors"] / cur["count"] if cur["count"] else 0
+        if rate > max_error_rate:
+            failures.append(f"{name}: {cur['errors']}/{cur['count']} requests failed ({rate:.1%})")
+    return failures
+
+def compare(report, baseline, tolerance):
+    failures = []
+    for name, base in baseline.items():
+        cur = report.get(name)
+        if not cur:
+            continue
+        if base["p95_ms"] and cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            failures.append(f"{name}: p95 {cur['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        if base["rps"] and cur["rps"] < base["rps"] * (1 - tolerance):
+            failures.append(f"{name}: rps {cur['rps']} < baseline {base['rps']}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/unicarpool_bench")
+    parser.add_argument("--inmemory", action="store_true")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rides", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", default="bench_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--max-error-rate", type=float, default=0.01,
+                        help="fail if more than this fraction of any endpoint's requests fail")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mongod = configure_database(args)
+    try:
+        from config import Config
+        Config.SECRET_KEY = Config.SECRET_KEY or "bench-secret"
+        from app import create_app
+        from database import Database
+        app = create_app()
+        db = Database.get_db()
+        if db is None:
+            raise SystemExit("Database connection failed")
+        Database.ensure_indexes()
+
+        log(f"Seeding {args.users} users / {args.rides} rides...", "SETUP")
+        user_ids = seed(db, args.users, args.rides, rng)
+        tokens = [mint_token(app.config["SECRET_KEY"], uid) for uid in user_ids]
+
+        server = start_server(app, args.port)
+        base = f"http://127.0.0.1:{args.port}"
+        recorder = Recorder()
+
+        log(f"Mixed workload: {args.clients} clients for {args.duration}s", "RUN")
+        start = time.monotonic()
+        run_mixed(base, tokens, args.clients, args.duration, rng, recorder)
+        wall = time.monotonic() - start
+
+        log("Join race on a single ride", "RUN")
+        joined, stored = run_join_race(base, db, tokens[1:], user_ids[0], min(args.clients, len(tokens) - 1), recorder)
+        server.shutdown()
+
+        report = recorder.report(wall)
+        print(json.dumps(report, indent=2))
+
+        failed = False
+        if joined > 2 or stored > 2 or joined != stored:
+            log(f"Join race oversold: {joined} successes, {stored} passengers stored", "FAIL")
+            failed = True
+
+        for failure in error_failures(report, args.max_error_rate):
+            log(failure, "FAIL")
+            failed = True
+
+        if args.save_baseline and failed:
+            log(f"Run failed, {args.baseline} left unchanged", "FAIL")
+        elif args.save_baseline:
+            with open(args.baseline, "w") as fh:
+                json.dump(report, fh, indent=2)
+            log(f"Baseline written to {args.baseline}", "SUCCESS")
+        elif os.path.exists(args.baseline):
+            with open(args.baseline) as fh:
+                regressions = compare(report, json.load(fh), args.tolerance)
+            for r in regressions:
+                log(r, "FAIL")
+            failed = failed or bool(regressions)
+
+        return 1 if failed else 0
+    finally:
+        if mongod is not None:
+            mongod.stop()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache with a per-entry time-to-live.
+    - Bounded to 'maxsize' entries (least recently used evicted first).
+    - Entries older than 'ttl' seconds are treated as misses.
+    - Keeps hit/miss counters so we can see if the cache is earning its keep.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+class RefreshingCache:
+    """
+    Short-lived cache for expensive, read-mostly results (e.g. analytics).
+    - Fresh for 'refresh_after' seconds.
+    - Between 'refresh_after' and 'ttl' the stale value is served while one
+      background thread recomputes it.
+    - Past 'ttl' (or on first use) the value is computed inline.
+    """
+
+    def __init__(self, refresh_after=30, ttl=300):
+        self.refresh_after = refresh_after
+        self.ttl = ttl
+        self._data = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or now - entry[0] >= self.ttl:
+            return self._load(key, loader)
+        if now - entry[0] >= self.refresh_after:
+            self._refresh_in_background(key, loader)
+        return entry[1]
+
+    def _load(self, key, loader):
+        value = loader()
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+        return value
+
+    def _refresh_in_background(self, key, loader):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._load(key, loader)
+            except Exception as e:
+                print(f"Background refresh failed for {key}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
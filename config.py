@@ -7,3 +7,103 @@ class Config:
     MONGO_URI = os.getenv("MONGO_URI")
     SECRET_KEY = os.getenv("SECRET_KEY")
     PORT = int(os.getenv("PORT", 5000))
+
+    # Response headers cross-origin scripts may read (both Flask and async apps)
+    CORS_EXPOSE_HEADERS = ["ETag", "X-Next-Cursor", "Link"]
+
+    # Prometheus-style /metrics endpoint and request / Mongo instrumentation
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    # Authenticated-user (principal) cache used by token_required
+    AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+    AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 60))
+
+    # Number of documents per pymongo batch / response chunk for streamed lists (async app only)
+    JSON_STREAM_BATCH_SIZE = int(os.getenv("JSON_STREAM_BATCH_SIZE", 100))
+
+    # Popular-routes analytics cache (seconds)
+    ROUTES_CACHE_REFRESH = float(os.getenv("ROUTES_CACHE_REFRESH", 30))
+    ROUTES_CACHE_TTL = float(os.getenv("ROUTES_CACHE_TTL", 300))
+
+    # MongoClient connection pool (one client per worker process)
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zlib")
+    # Reads go to the primary so a client always sees its own writes (join ->
+    # availability, create -> my rides). Routes whose answers are already
+    # cached for seconds (nearby, match, search, autocomplete, analytics) opt
+    # in to MONGO_STALE_READ_PREFERENCE with Database.get_db(stale_ok=True).
+    MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+    MONGO_STALE_READ_PREFERENCE = os.getenv("MONGO_STALE_READ_PREFERENCE", "secondaryPreferred")
+
+    # Index creation: "background" = once per INDEX_VERSION in a thread on first
+    # DB use; "off" = only via 'python maintenance.py ensure-indexes'
+    # (recommended for serverless deployments, run it on deploy)
+    INDEX_BUILD = os.getenv("INDEX_BUILD", "background")
+
+    # Password hashing (runs in a bounded process pool, off the request threads).
+    # Without an iteration count werkzeug's current default is used. Stored
+    # hashes are upgraded on next login only if PASSWORD_HASH_METHOD is a
+    # different algorithm or a higher work factor, never downgraded.
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+    PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", 2))  # 0 = hash inline
+    PASSWORD_POOL_MAX_PENDING = int(os.getenv("PASSWORD_POOL_MAX_PENDING", 16))
+    PASSWORD_RETRY_AFTER = int(os.getenv("PASSWORD_RETRY_AFTER", 2))
+
+    # Rides whose departure is older than ARCHIVE_GRACE_MINUTES are moved to
+    # 'rides_history' every ARCHIVE_INTERVAL seconds by an in-process thread.
+    # Off (0) by default: serverless instances are too short-lived for it, so
+    # schedule 'python maintenance.py archive-rides' instead, or set e.g. 3600
+    # on long-running servers.
+    ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", 0))
+    ARCHIVE_GRACE_MINUTES = int(os.getenv("ARCHIVE_GRACE_MINUTES", 60))
+
+    # Short-lived response caches (per worker) with ETag / Last-Modified
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 5000))
+    NEARBY_CACHE_TTL = float(os.getenv("NEARBY_CACHE_TTL", 5))
+    NEARBY_GRID_DEGREES = float(os.getenv("NEARBY_GRID_DEGREES", 0.001))  # ~110 m
+    AVAILABILITY_CACHE_TTL = float(os.getenv("AVAILABILITY_CACHE_TTL", 2))
+
+    # In-memory grid index of upcoming rides for /rides/nearby
+    GEO_INDEX_ENABLED = os.getenv("GEO_INDEX_ENABLED", "true").lower() == "true"
+    GEO_INDEX_CELL_DEGREES = float(os.getenv("GEO_INDEX_CELL_DEGREES", 0.01))  # ~1.1 km
+    GEO_INDEX_MAX_RIDES = int(os.getenv("GEO_INDEX_MAX_RIDES", 200000))
+    GEO_INDEX_REFRESH = float(os.getenv("GEO_INDEX_REFRESH", 30))   # incremental refresh ('updatedAt' watermark)
+    GEO_INDEX_OVERLAP = float(os.getenv("GEO_INDEX_OVERLAP", 30))   # re-read window for clock skew / in-flight writes
+    GEO_INDEX_FULL_RELOAD = float(os.getenv("GEO_INDEX_FULL_RELOAD", 900))  # full reload backstop
+    GEO_INDEX_MAX_AGE = float(os.getenv("GEO_INDEX_MAX_AGE", 120))  # no refresh for this long -> use Mongo
+
+    # Live ride events over SSE (/api/v1/events/rides).
+    # EVENTS_SOURCE: "local" (in-process pub/sub fed by the write routes) or
+    # "changestream" (one db.rides watcher per process; needs a replica set).
+    # In "local" mode a stream only sees writes made by its own worker process;
+    # other workers' writes show up when the client reconnects or refetches.
+    EVENTS_SOURCE = os.getenv("EVENTS_SOURCE", "local")
+    # Open streams per worker; extra streams get 503 + Retry-After and the
+    # client falls back to polling. Under gthread each stream parks a thread, so
+    # the default is WEB_THREADS less EVENTS_RESERVED_THREADS kept for API
+    # requests (24 with the default 32 threads); gevent workers take many.
+    EVENTS_RESERVED_THREADS = int(os.getenv("EVENTS_RESERVED_THREADS", 8))
+    EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS",
+        5000 if os.getenv("WEB_WORKER_CLASS", "gthread") in ("gevent", "eventlet")
+        else max(1, int(os.getenv("WEB_THREADS", 32)) - EVENTS_RESERVED_THREADS)))
+    EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 100))   # per subscriber
+    EVENTS_CELL_DEGREES = float(os.getenv("EVENTS_CELL_DEGREES", 0.05))  # ~5.5 km
+    EVENTS_MAX_REGION_CELLS = int(os.getenv("EVENTS_MAX_REGION_CELLS", 64))
+    EVENTS_MAX_RIDE_IDS = int(os.getenv("EVENTS_MAX_RIDE_IDS", 100))
+    EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", 15))
+    EVENTS_MAX_STREAM_SECONDS = float(os.getenv("EVENTS_MAX_STREAM_SECONDS", 300))
+    EVENTS_RETRY_DELAY = float(os.getenv("EVENTS_RETRY_DELAY", 5))
+
+    # Geocoding proxy (/api/v1/geocode, /api/v1/reverse-geocode)
+    GEOCODER_URL = os.getenv("GEOCODER_URL", "https://nominatim.openstreetmap.org")
+    GEOCODER_USER_AGENT = os.getenv("GEOCODER_USER_AGENT", "UniCarpool/1.0")
+    GEOCODER_TIMEOUT = float(os.getenv("GEOCODER_TIMEOUT", 5))
+    GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", 10000))
+    GEOCODE_MEMORY_TTL = float(os.getenv("GEOCODE_MEMORY_TTL", 86400))
+    GEOCODE_NEGATIVE_TTL = float(os.getenv("GEOCODE_NEGATIVE_TTL", 300))  # empty answers (memory only)
+    GEOCODE_CACHE_DAYS = int(os.getenv("GEOCODE_CACHE_DAYS", 30))  # Mongo tier (TTL index)
+    GEOCODE_REVERSE_DEGREES = float(os.getenv("GEOCODE_REVERSE_DEGREES", 0.0001))  # ~11 m
@@ -1,12 +1,189 @@
+import os
+import threading
+from datetime import datetime, timezone
 from pymongo import MongoClient, GEOSPHERE, ASCENDING, DESCENDING
+from pymongo import monitoring
+from pymongo.errors import OperationFailure
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
 from config import Config
+import metrics
+
+# ------------------------------------------
+# Index spec: collection -> [(keys, options)]
+# Every query shape in query_catalog.py must be served by one of these;
+# explain_check.py fails on any COLLSCAN or blocking SORT.
+# ------------------------------------------
+INDEXES = {
+    "users": [
+        ([("email", ASCENDING)], {"unique": True}),
+    ],
+    "rides": [
+        # Destination-side filter for two-sided matching (/rides/match)
+        ([("dropoffCoords", GEOSPHERE)], {}),
+        # Departure time: time windows, archiving, geo index reloads
+        ([("time", ASCENDING)], {}),
+        # Incremental geo index refresh (rides changed since a watermark)
+        ([("updatedAt", ASCENDING)], {}),
+        # Geo search: upcoming rides near a point with free seats (/rides/nearby,
+        # /rides/match pickup side). $geoNear stages must pass key="pickupCoords"
+        # because dropoffCoords has a 2dsphere index too.
+        ([("pickupCoords", GEOSPHERE), ("time", ASCENDING), ("seatsAvailable", ASCENDING)], {}),
+        # Route filtering
+        ([("pickup", ASCENDING), ("dropoff", ASCENDING)], {}),
+        # Place search: multikey word tokens (anchored prefix) + normalized names (exact)
+        ([("pickupTokens", ASCENDING)], {}),
+        ([("dropoffTokens", ASCENDING)], {}),
+        ([("pickupNorm", ASCENDING), ("dropoffNorm", ASCENDING)], {}),
+        # Driver / passenger lists, keyset-paginated on (time, _id)
+        ([("driverId", ASCENDING), ("time", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("passengers", ASCENDING), ("time", ASCENDING), ("_id", ASCENDING)], {}),
+    ],
+    # Archived (departed) rides: /my/history, newest first, keyset-paginated on (time, _id)
+    "rides_history": [
+        ([("driverId", ASCENDING), ("time", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("passengers", ASCENDING), ("time", DESCENDING), ("_id", DESCENDING)], {}),
+    ],
+    # Popular routes analytics
+    "route_rollups": [
+        ([("from", ASCENDING), ("to", ASCENDING), ("bucket", ASCENDING)], {"unique": True}),
+        ([("bucket", ASCENDING)], {}),
+    ],
+    "route_totals": [
+        ([("rideCount", DESCENDING)], {}),
+    ],
+    # Autocomplete
+    "places": [
+        ([("tokens", ASCENDING), ("rideCount", DESCENDING)], {}),
+    ],
+    # Geocoding proxy, second cache tier (expired by TTL)
+    "geocode_cache": [
+        ([("createdAt", ASCENDING)], {"expireAfterSeconds": Config.GEOCODE_CACHE_DAYS * 86400}),
+    ],
+}
+
+# Indexes earlier versions created that INDEXES now supersedes;
+# create_indexes() drops them if present
+OBSOLETE_INDEXES = {
+    "rides": [
+        [("pickupCoords", GEOSPHERE)],
+        [("pickupCoords", GEOSPHERE), ("time", ASCENDING)],
+    ],
+    "rides_history": [
+        [("driverId", ASCENDING), ("time", DESCENDING)],
+        [("passengers", ASCENDING), ("time", DESCENDING)],
+    ],
+}
+
+# Bump whenever INDEXES or OBSOLETE_INDEXES changes so every deployment re-runs it once
+INDEX_VERSION = 6
+
+def read_preference(name):
+    """'secondaryPreferred' -> pymongo read preference object."""
+    return make_read_preference(read_pref_mode_from_name(name), None)
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """
+    Counts connection pool events for the current process' MongoClient.
+    - checkedOut: connections currently lent to application threads
+    - waiting: threads currently blocked waiting for a connection
+    - created / closed: connections opened / closed since the client started
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"checkedOut": 0, "waiting": 0, "created": 0, "closed": 0, "checkoutFailed": 0}
+
+    def _add(self, key, delta=1):
+        with self._lock:
+            self.counts[key] += delta
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def connection_check_out_started(self, event):
+        self._add("waiting")
+
+    def connection_checked_out(self, event):
+        self._add("waiting", -1)
+        self._add("checkedOut")
+        # 'duration' (seconds) is reported by pymongo >= 4.7
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            metrics.MONGO_POOL_WAIT.observe(duration)
+
+    def connection_check_out_failed(self, event):
+        self._add("waiting", -1)
+        self._add("checkoutFailed")
+
+    def connection_checked_in(self, event):
+        self._add("checkedOut", -1)
+
+    def connection_created(self, event):
+        self._add("created")
+
+    def connection_closed(self, event):
+        self._add("closed")
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+
+INDEX_NOT_FOUND = 27
 
 class Database:
     client = None
     db = None
+    # Same database with MONGO_STALE_READ_PREFERENCE, see get_db(stale_ok=True)
+    stale_db = None
+    pool_stats = None
+    # PID that owns 'client'. MongoClient is not fork-safe, so a forked
+    # worker (gunicorn --preload) must never reuse its parent's client.
+    pid = None
+    indexes_checked = False
+
+    @staticmethod
+    def client_options():
+        """MongoClient keyword arguments driven by Config."""
+        options = {
+            "maxPoolSize": Config.MONGO_MAX_POOL_SIZE,
+            "minPoolSize": Config.MONGO_MIN_POOL_SIZE,
+            "maxIdleTimeMS": Config.MONGO_MAX_IDLE_TIME_MS,
+            "waitQueueTimeoutMS": Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            "readPreference": Config.MONGO_READ_PREFERENCE,
+            # Return datetimes as aware UTC so they compare with parsed request times
+            "tz_aware": True,
+        }
+        if Config.MONGO_COMPRESSORS:
+            options["compressors"] = Config.MONGO_COMPRESSORS
+        return options
+
+    @staticmethod
+    def reset():
+        """
+        Forget the current client without touching its sockets.
+        Call in a freshly forked child (see gunicorn.conf.py post_fork);
+        the next get_db() then builds a client owned by this process.
+        """
+        Database.client = None
+        Database.db = None
+        Database.stale_db = None
+        Database.pool_stats = None
+        Database.pid = None
+        Database.indexes_checked = False
 
     @staticmethod
     def initialize():
+        """
+        Builds this process' client. Called lazily by get_db() on first use.
+        MongoClient connects in the background, so nothing here blocks on the
+        network; index creation is deferred to ensure_indexes().
+        """
+        if Database.pid is not None and Database.pid != os.getpid():
+            Database.reset()
         if Database.db is not None:
             return Database.db
 
@@ -15,44 +192,166 @@ class Database:
                 print("CRITICAL: MONGO_URI is not set in environment variables!")
                 return None
 
-            Database.client = MongoClient(Config.MONGO_URI, serverSelectionTimeoutMS=5000)
-            # Test connection
-            Database.client.admin.command('ping')
-            
+            Database.pool_stats = PoolStats()
+            listeners = [Database.pool_stats]
+            if Config.METRICS_ENABLED:
+                listeners.append(metrics.CommandTimer())
+            Database.client = MongoClient(
+                Config.MONGO_URI,
+                event_listeners=listeners,
+                **Database.client_options()
+            )
+            Database.pid = os.getpid()
             Database.db = Database.client.get_database()
-            print("Connected to MongoDB successfully!")
-            Database.create_indexes()
+            Database.stale_db = Database.db.with_options(
+                read_preference=read_preference(Config.MONGO_STALE_READ_PREFERENCE)
+            )
+            if Config.INDEX_BUILD == "background":
+                Database.ensure_indexes_in_background()
             return Database.db
         except Exception as e:
             print(f"Error connecting to MongoDB: {str(e)}")
             Database.db = None
             return None
 
+    @staticmethod
+    def ping():
+        """True if the server answers; blocks up to serverSelectionTimeoutMS."""
+        if Database.get_db() is None:
+            return False
+        try:
+            Database.client.admin.command('ping')
+            return True
+        except Exception as e:
+            print(f"Error connecting to MongoDB: {str(e)}")
+            return False
+
+    @staticmethod
+    def ensure_indexes(force=False):
+        """
+        Runs create_indexes() once per INDEX_VERSION. The applied version is
+        recorded in 'schema_meta', so later cold starts skip it after one read.
+        Returns True if indexes were (re)built.
+        """
+        db = Database.get_db()
+        if db is None:
+            return False
+        marker = db.schema_meta.find_one({"_id": "indexes"}) or {}
+        if not force and marker.get("version") == INDEX_VERSION:
+            return False
+        Database.create_indexes()
+        db.schema_meta.update_one(
+            {"_id": "indexes"},
+            {"$set": {"version": INDEX_VERSION, "appliedAt": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        return True
+
+    @staticmethod
+    def ensure_indexes_in_background():
+        """ensure_indexes() in a daemon thread, at most once per process."""
+        if Database.indexes_checked:
+            return
+        Database.indexes_checked = True
+
+        def run():
+            try:
+                if Database.ensure_indexes():
+                    print(f"Indexes created (version {INDEX_VERSION})")
+            except Exception as e:
+                # Marker is only written on success, so the next start retries
+                Database.indexes_checked = False
+                print(f"Index creation failed: {str(e)}")
+
+        threading.Thread(target=run, daemon=True).start()
+
     @staticmethod
     def create_indexes():
-     
+        """Creates every index in INDEXES and drops OBSOLETE_INDEXES (idempotent)."""
         if Database.db is None:
             return
+        for collection, specs in INDEXES.items():
+            for keys, options in specs:
+                Database.db[collection].create_index(keys, **options)
+            print(f"Indexes ensured: {collection} ({len(specs)})")
+        # Only after their replacements exist, so no query is left without an index
+        for collection, specs in OBSOLETE_INDEXES.items():
+            for keys in specs:
+                try:
+                    Database.db[collection].drop_index(keys)
+                    print(f"Index dropped: {collection} {keys}")
+                except OperationFailure as e:
+                    if e.code != INDEX_NOT_FOUND:
+                        raise
+
+    @staticmethod
+    def get_db(stale_ok=False):
+        """
+        This process' database handle. 'stale_ok' returns the handle with
+        MONGO_STALE_READ_PREFERENCE, for reads that tolerate replication lag;
+        never use it to read back something the same request just wrote.
+        """
+        db = Database.db
+        if db is None or Database.pid != os.getpid():
+            db = Database.initialize()
+        if db is None or not stale_ok:
+            return db
+        return Database.stale_db
+
+    @staticmethod
+    def get_pool_stats():
+        """Pool counters for this worker's client plus its configured limits."""
+        if Database.pool_stats is None:
+            return None
+        return {
+            "pid": Database.pid,
+            "maxPoolSize": Config.MONGO_MAX_POOL_SIZE,
+            **Database.pool_stats.snapshot()
+        }
 
-        # USERS COLLECTION
-        users = Database.db.users
-        users.create_index([("email", ASCENDING)], unique=True)
-        print("Index created: users -> email (unique)")
 
-        # RIDES COLLECTION
-        rides = Database.db.rides
-        
-        # GeoSpatial Index for location-based search
-        # Must use 2dsphere for GeoJSON points
-        rides.create_index([("pickupCoords", GEOSPHERE)])
-        print("Index created: rides -> pickupCoords (2dsphere)")
+@metrics.register_collector
+def _pool_metrics():
+    stats = Database.get_pool_stats()
+    if stats is None:
+        return []
+    return [
+        ("mongo_pool_checked_out", "Connections currently checked out", stats["checkedOut"]),
+        ("mongo_pool_waiting", "Threads waiting for a connection", stats["waiting"]),
+        ("mongo_pool_connections_created", "Connections created since start", stats["created"]),
+        ("mongo_pool_connections_closed", "Connections closed since start", stats["closed"]),
+        ("mongo_pool_max_size", "Configured maxPoolSize", stats["maxPoolSize"]),
+    ]
 
-        # Compound index for route filtering
-        rides.create_index([("pickup", ASCENDING), ("dropoff", ASCENDING)])
-        print("Index created: rides -> pickup + dropoff")
+class AsyncDatabase:
+    """
+    Async twin of Database for the optional ASGI mode (async_app.py).
+    Uses pymongo's native AsyncMongoClient (pymongo >= 4.9), imported lazily
+    so the regular WSGI app never needs it.
+    """
+    client = None
+    db = None
+    stale_db = None
 
     @staticmethod
-    def get_db():
-        if Database.db is None:
-            return Database.initialize()
-        return Database.db
+    def get_db(stale_ok=False):
+        """See Database.get_db."""
+        if AsyncDatabase.db is None:
+            if not Config.MONGO_URI:
+                print("CRITICAL: MONGO_URI is not set in environment variables!")
+                return None
+
+            from pymongo import AsyncMongoClient
+            AsyncDatabase.client = AsyncMongoClient(Config.MONGO_URI, **Database.client_options())
+            AsyncDatabase.db = AsyncDatabase.client.get_database()
+            AsyncDatabase.stale_db = AsyncDatabase.db.with_options(
+                read_preference=read_preference(Config.MONGO_STALE_READ_PREFERENCE)
+            )
+        return AsyncDatabase.stale_db if stale_ok else AsyncDatabase.db
+
+    @staticmethod
+    async def close():
+        if AsyncDatabase.client is not None:
+            await AsyncDatabase.client.close()
+        AsyncDatabase.client = None
+        AsyncDatabase.db = None
@@ -0,0 +1,263 @@
+"""
+Live ride events (seat counts, new rides) fanned out to SSE subscribers.
+
+One feed per process drives the hub:
+- "local" (default): join_ride / cancel_ride_request / batch_booking /
+  create_ride publish directly after their write. Subscribers only see
+  writes handled by the same worker, so use it with a single worker
+  (e.g. gevent) or accept that other workers' writes show up on reconnect.
+- "changestream": one thread per process watches db.rides and publishes
+  every insert/update, so all workers see all writes. Needs a replica set.
+
+Subscribers register ride ids and/or a lng/lat box. Boxes are indexed by
+coarse grid cell, so a publish touches only the subscribers that can match
+it, and each event is encoded once no matter how many receive it.
+"""
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from config import Config
+from json_provider import encode_json
+import metrics
+
+class Subscription:
+    """One client's filter plus a bounded queue of encoded SSE frames."""
+    __slots__ = ("ride_ids", "bbox", "cells", "closed", "registered", "_frames", "_cond")
+
+    def __init__(self, ride_ids, bbox):
+        self.ride_ids = set(ride_ids)
+        self.bbox = bbox
+        self.cells = ()
+        self.closed = False
+        self.registered = False
+        self._frames = deque()
+        self._cond = threading.Condition()
+
+    def matches_point(self, lng, lat):
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        return min_lng <= lng <= max_lng and min_lat <= lat <= max_lat
+
+    def push(self, frame):
+        with self._cond:
+            if self.closed:
+                return
+            if len(self._frames) >= Config.EVENTS_QUEUE_SIZE:
+                # Slow consumer: drop it rather than buffer without bound.
+                # The client reconnects and re-reads current state.
+                self.closed = True
+            else:
+                self._frames.append(frame)
+            self._cond.notify()
+
+    def next(self, timeout):
+        """Next frame, or None after 'timeout' seconds / once closed."""
+        with self._cond:
+            if not self._frames and not self.closed:
+                self._cond.wait(timeout)
+            return self._frames.popleft() if self._frames else None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+class EventHub:
+    def __init__(self, cell_degrees=0.05):
+        self.cell_degrees = cell_degrees
+        self._by_ride = {}   # ride id -> {Subscription}
+        self._by_cell = {}   # grid cell -> {Subscription}
+        self._count = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _cell_key(self, lng, lat):
+        return (math.floor(lng / self.cell_degrees), math.floor(lat / self.cell_degrees))
+
+    def _cells_for(self, bbox):
+        min_lng, min_lat, max_lng, max_lat = bbox
+        x0, y0 = self._cell_key(min_lng, min_lat)
+        x1, y1 = self._cell_key(max_lng, max_lat)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > Config.EVENTS_MAX_REGION_CELLS:
+            raise ValueError("region too large")
+        return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    def subscribe(self, ride_ids=(), bbox=None):
+        """Registers a subscriber. Raises ValueError for an empty or oversized filter."""
+        sub = Subscription(ride_ids, bbox)
+        if bbox is not None:
+            sub.cells = self._cells_for(bbox)
+        if not sub.ride_ids and not sub.cells:
+            raise ValueError("subscribe to at least one ride id or a region")
+        with self._lock:
+            if self._count >= Config.EVENTS_MAX_SUBSCRIBERS:
+                raise OverflowError("too many subscribers")
+            self._count += 1
+            sub.registered = True
+            for ride_id in sub.ride_ids:
+                self._by_ride.setdefault(ride_id, set()).add(sub)
+            for cell in sub.cells:
+                self._by_cell.setdefault(cell, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        """Removes a subscriber. Safe to call more than once."""
+        sub.close()
+        with self._lock:
+            if not sub.registered:
+                return
+            sub.registered = False
+            self._count -= 1
+            for ride_id in sub.ride_ids:
+                subs = self._by_ride.get(ride_id)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._by_ride[ride_id]
+            for cell in sub.cells:
+                subs = self._by_cell.get(cell)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._by_cell[cell]
+
+    def publish(self, event_type, payload, coordinates=None):
+        """Sends one event to every subscriber of payload['rideId'] or of the point."""
+        with self._lock:
+            targets = set(self._by_ride.get(payload["rideId"], ()))
+            if coordinates is not None:
+                lng, lat = coordinates[:2]
+                for sub in self._by_cell.get(self._cell_key(lng, lat), ()):
+                    if sub.matches_point(lng, lat):
+                        targets.add(sub)
+            event_id = next(self._ids)
+        if not targets:
+            return 0
+        frame = f"id: {event_id}\nevent: {event_type}\ndata: {encode_json(payload)}\n\n"
+        for sub in targets:
+            sub.push(frame)
+        EVENTS_PUBLISHED.inc(event_type, amount=len(targets))
+        return len(targets)
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": self._count, "rides": len(self._by_ride), "cells": len(self._by_cell)}
+
+hub = EventHub(Config.EVENTS_CELL_DEGREES)
+
+EVENTS_PUBLISHED = metrics.Counter(
+    "ride_events_delivered_total",
+    "Ride events queued to SSE subscribers",
+    ("event",)
+)
+
+@metrics.register_collector
+def _event_metrics():
+    return [("ride_event_subscribers", "Open ride event streams in this worker", hub.stats()["subscribers"])]
+
+# ------------------------------------------
+# Event builders (shared by both feeds)
+# ------------------------------------------
+
+def _coordinates(ride):
+    return (ride.get("pickupCoords") or {}).get("coordinates")
+
+def _publish_seats(ride, passenger_count):
+    seats = int(ride.get("seats") or 0)
+    hub.publish("seats", {
+        "rideId": str(ride["_id"]),
+        "seats": seats,
+        "seatsTaken": passenger_count,
+        "seatsAvailable": max(0, seats - passenger_count)
+    }, _coordinates(ride))
+
+def _publish_created(ride):
+    passengers = ride.get("passengers") or []
+    seats = int(ride.get("seats") or 0)
+    hub.publish("ride", {
+        "rideId": str(ride["_id"]),
+        "driverId": ride.get("driverId"),
+        "pickup": ride.get("pickup"),
+        "dropoff": ride.get("dropoff"),
+        "pickupCoords": ride.get("pickupCoords"),
+        "time": ride.get("time"),
+        "seats": seats,
+        "seatsAvailable": max(0, seats - len(passengers))
+    }, _coordinates(ride))
+
+def _local():
+    return Config.EVENTS_SOURCE == "local"
+
+def ride_created(ride):
+    """Called by create_ride after the insert (no-op when the change stream feeds the hub)."""
+    if _local():
+        _publish_created(ride)
+
+def seats_changed(ride, passenger_count):
+    """
+    Called by the booking paths after a successful write. 'ride' needs
+    _id, seats and pickupCoords; 'passenger_count' is the new count.
+    """
+    if _local():
+        _publish_seats(ride, passenger_count)
+
+# ------------------------------------------
+# Change stream feed
+# ------------------------------------------
+
+_watcher_started = False
+_watcher_lock = threading.Lock()
+
+CHANGE_STREAM_PIPELINE = [
+    {"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}},
+    {"$project": {
+        "operationType": 1,
+        "fullDocument._id": 1, "fullDocument.driverId": 1, "fullDocument.pickup": 1,
+        "fullDocument.dropoff": 1, "fullDocument.pickupCoords": 1, "fullDocument.time": 1,
+        "fullDocument.seats": 1, "fullDocument.passengers": 1,
+        "updateDescription.updatedFields": 1
+    }}
+]
+
+def _touches_passengers(change):
+    # $push / $pull report "passengers" or "passengers.<n>" as updated
+    fields = change.get("updateDescription", {}).get("updatedFields", {})
+    return any(f == "passengers" or f.startswith("passengers.") for f in fields)
+
+def start_change_feed(get_db):
+    """
+    Starts the single per-process change stream watcher (EVENTS_SOURCE=changestream).
+    Safe to call on every subscribe; resumes after errors from the last token.
+    """
+    global _watcher_started
+    if _local():
+        return
+    with _watcher_lock:
+        if _watcher_started:
+            return
+        _watcher_started = True
+
+    def run():
+        resume_token = None
+        while True:
+            try:
+                db = get_db()
+                if db is None:
+                    raise RuntimeError("database unavailable")
+                with db.rides.watch(CHANGE_STREAM_PIPELINE, full_document="updateLookup",
+                                    resume_after=resume_token) as stream:
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        ride = change.get("fullDocument")
+                        if not ride:
+                            continue
+                        if change["operationType"] == "insert":
+                            _publish_created(ride)
+                        elif change["operationType"] == "replace" or _touches_passengers(change):
+                            _publish_seats(ride, len(ride.get("passengers") or []))
+            except Exception as e:
+                print(f"Ride change stream failed, retrying: {str(e)}")
+                time.sleep(Config.EVENTS_RETRY_DELAY)
+
+    threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,68 @@
+"""
+Explain-plan regression check for every cataloged query shape.
+
+Seeds a dedicated database, creates the indexes from database.INDEXES, then
+runs `explain` on each entry of query_catalog.query_shapes() and fails on
+any COLLSCAN, or on a blocking in-memory SORT / $sort / $group in a shape
+that does not document why its order is computed ('sort_ok').
+
+    # Against a local mongod (the database in the URI is WIPED and reseeded)
+    python explain_check.py --mongo-uri mongodb://localhost:27017/unicarpool_explain
+
+    # Against a throwaway in-process mongod (pip install pymongo_inmemory)
+    python explain_check.py --inmemory
+
+A shape the server cannot explain counts as a failure. Exits non-zero if
+any shape fails, so it can gate CI next to benchmark.py. The same check runs
+under pytest (tests/test_query_plans.py) when EXPLAIN_MONGO_URI is set.
+"""
+import argparse
+import random
+import sys
+
+from benchmark import configure_database, seed, log
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/unicarpool_explain")
+    parser.add_argument("--inmemory", action="store_true")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rides", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-v", "--verbose", action="store_true", help="print the plan stages of every shape")
+    args = parser.parse_args()
+
+    mongod = configure_database(args)
+    try:
+        from database import Database
+        from query_catalog import query_shapes, check_shape, BLOCKING_STAGES
+        db = Database.get_db()
+        if db is None:
+            raise SystemExit("Database connection failed")
+        Database.ensure_indexes(force=True)
+
+        log(f"Seeding {args.users} users / {args.rides} rides...", "SETUP")
+        user_ids = seed(db, args.users, args.rides, random.Random(args.seed))
+        ride = db.rides.find_one({}, {"_id": 1})
+
+        failures = 0
+        for shape in query_shapes(user_id=user_ids[0], ride_id=ride["_id"]):
+            stages, problems = check_shape(db, shape)
+            if problems:
+                failures += 1
+                log(f"{shape.name} [{shape.collection}]: {', '.join(problems)} -> {' > '.join(stages)}", "FAIL")
+            else:
+                note = f" (sort: {shape.sort_ok})" if shape.sort_ok and BLOCKING_STAGES.keys() & set(stages) else ""
+                log(f"{shape.name}{note}" + (f" -> {' > '.join(stages)}" if args.verbose else ""), "PASS")
+
+        if failures:
+            log(f"{failures} query shape(s) failed or are not index-backed; see database.INDEXES", "FAIL")
+            return 1
+        log("All query shapes are index-backed", "SUCCESS")
+        return 0
+    finally:
+        if mongod is not None:
+            mongod.stop()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+"""
+In-process spatial index of active (upcoming) rides for /rides/nearby.
+
+Rides are bucketed into a uniform lat/lng grid. Each cell keeps its ride
+ids in a list and their pickup coordinates in a flat array('d'), so a
+query gathers a handful of cells and scores them with NumPy in one shot.
+
+Freshness:
+- Write-through from create_ride / join_ride / cancel_ride_request /
+  batch_booking in THIS process. Writes made while a full load is running
+  are journaled and replayed onto the new snapshot before it is swapped in.
+- Every GEO_INDEX_REFRESH seconds (in a background thread) an incremental
+  refresh re-reads only rides whose 'updatedAt' is past the last watermark
+  (minus GEO_INDEX_OVERLAP for clock skew and in-flight writes), which
+  picks up other workers' writes, and drops departed rides locally.
+- A full reload runs on first use and every GEO_INDEX_FULL_RELOAD seconds,
+  as a backstop for writes that bypass 'updatedAt' (bulk loads, deletes).
+- While cold, or if the last refresh is older than GEO_INDEX_MAX_AGE,
+  lookups return None and the caller falls back to Mongo's $geoNear.
+- With more than GEO_INDEX_MAX_RIDES upcoming rides the index disables
+  itself and skips refreshes for GEO_INDEX_FULL_RELOAD seconds before
+  trying another full load.
+"""
+import math
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+from config import Config
+from matching import haversine, METERS_PER_DEGREE_LAT
+import metrics
+
+# Fields kept per ride (everything the nearby response needs)
+INDEXED_FIELDS = ("driverId", "pickup", "dropoff", "pickupCoords", "time", "seats", "seatsAvailable", "passengers")
+
+# Added to every nearby() result, next to INDEXED_FIELDS
+COMPUTED_FIELDS = ("distance", "matchScore")
+
+def covers(projection):
+    """
+    True if nearby() results hold every field an inclusive 'projection'
+    returns. Other views (e.g. 'detail') must be served from Mongo.
+    """
+    return all(v == 1 and (f in INDEXED_FIELDS or f in COMPUTED_FIELDS) for f, v in projection.items())
+
+def _departs_at_or_after(doc, when):
+    # Legacy rides may still hold a string time (see 'maintenance.py
+    # migrate-ride-times'); Mongo's datetime range never matches those either
+    departure = doc.get("time")
+    return isinstance(departure, datetime) and departure >= when
+
+class _Cell:
+    __slots__ = ("ids", "coords")
+
+    def __init__(self):
+        self.ids = []
+        self.coords = array("d")  # lng0, lat0, lng1, lat1, ...
+
+class RideGridIndex:
+    def __init__(self, cell_degrees=0.01, max_rides=200000):
+        self.cell_degrees = cell_degrees
+        self.max_rides = max_rides
+        self._cells = {}
+        self._rides = {}      # ride id -> summary doc
+        self._slots = {}      # ride id -> (cell key, position in cell)
+        self._lock = threading.RLock()
+        self._loading = False
+        self._journal = None  # writes made during a full load, see load()
+        self.loaded_at = None       # monotonic time of the last successful load / refresh
+        self.full_loaded_at = None  # monotonic time of the last full load
+        self.watermark = None       # wall-clock start of the last load / refresh
+        self.disabled_until = None  # monotonic time before which no reload is attempted
+        self._failure_reported_at = None
+
+    # ------------------------------------------
+    # Maintenance
+    # ------------------------------------------
+
+    def _cell_key(self, lng, lat):
+        return (math.floor(lng / self.cell_degrees), math.floor(lat / self.cell_degrees))
+
+    def _insert(self, ride_id, doc):
+        lng, lat = doc["pickupCoords"]["coordinates"][:2]
+        key = self._cell_key(lng, lat)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = _Cell()
+        self._slots[ride_id] = (key, len(cell.ids))
+        cell.ids.append(ride_id)
+        cell.coords.extend((lng, lat))
+        self._rides[ride_id] = doc
+
+    def _delete(self, ride_id):
+        slot = self._slots.pop(ride_id, None)
+        if slot is None:
+            return
+        key, pos = slot
+        cell = self._cells[key]
+        last = len(cell.ids) - 1
+        if pos != last:
+            # Swap-remove keeps the arrays dense
+            moved = cell.ids[last]
+            cell.ids[pos] = moved
+            cell.coords[2 * pos] = cell.coords[2 * last]
+            cell.coords[2 * pos + 1] = cell.coords[2 * last + 1]
+            self._slots[moved] = (key, pos)
+        cell.ids.pop()
+        del cell.coords[2 * last:]
+        if not cell.ids:
+            del self._cells[key]
+        self._rides.pop(ride_id, None)
+
+    def upsert(self, ride):
+        """Adds or replaces one ride (a Mongo document with '_id')."""
+        if not ride.get("pickupCoords"):
+            return
+        ride_id = str(ride["_id"])
+        doc = {k: ride.get(k) for k in INDEXED_FIELDS}
+        doc["passengers"] = list(doc["passengers"] or [])
+        with self._lock:
+            self._journal_write("upsert", ride)
+            self._delete(ride_id)
+            self._insert(ride_id, doc)
+
+    def remove(self, ride_id):
+        with self._lock:
+            self._journal_write("remove", ride_id)
+            self._delete(str(ride_id))
+
+    def add_passenger(self, ride_id, user_id):
+        with self._lock:
+            self._journal_write("add_passenger", ride_id, user_id)
+            doc = self._rides.get(str(ride_id))
+            if doc is not None and user_id not in doc["passengers"]:
+                doc["passengers"] = doc["passengers"] + [user_id]
+                if doc["seatsAvailable"] is not None:
+                    doc["seatsAvailable"] -= 1
+
+    def remove_passenger(self, ride_id, user_id):
+        with self._lock:
+            self._journal_write("remove_passenger", ride_id, user_id)
+            doc = self._rides.get(str(ride_id))
+            if doc is not None and user_id in doc["passengers"]:
+                doc["passengers"] = [p for p in doc["passengers"] if p != user_id]
+                if doc["seatsAvailable"] is not None:
+                    doc["seatsAvailable"] += 1
+
+    def _journal_write(self, op, *args):
+        # Caller holds the lock. All four writes are idempotent, so replaying
+        # one the new snapshot already reflects is harmless.
+        if self._journal is not None:
+            self._journal.append((op, args))
+
+    def _disable(self):
+        print(f"Geo index disabled for {Config.GEO_INDEX_FULL_RELOAD:.0f}s: more than {self.max_rides} active rides")
+        with self._lock:
+            self.loaded_at = None
+            self.full_loaded_at = None
+            self.disabled_until = time.monotonic() + Config.GEO_INDEX_FULL_RELOAD
+
+    def is_disabled(self):
+        return self.disabled_until is not None and time.monotonic() < self.disabled_until
+
+    def load(self, db):
+        """Rebuilds the whole index from upcoming rides; stays cold if there are too many."""
+        started = datetime.now(timezone.utc)
+        projection = {k: 1 for k in INDEXED_FIELDS}
+        fresh = RideGridIndex(self.cell_degrees, self.max_rides)
+        with self._lock:
+            self._journal = []
+        try:
+            for ride in db.rides.find({"time": {"$gte": started}}, projection).batch_size(5000):
+                fresh.upsert(ride)
+                if len(fresh._rides) > self.max_rides:
+                    self._disable()
+                    return False
+            with self._lock:
+                # Write-through calls made while we were reading would be lost by the swap
+                for op, args in self._journal:
+                    getattr(fresh, op)(*args)
+                self._cells, self._rides, self._slots = fresh._cells, fresh._rides, fresh._slots
+                self.loaded_at = self.full_loaded_at = time.monotonic()
+                self.watermark = started
+                self.disabled_until = None
+            return True
+        finally:
+            with self._lock:
+                self._journal = None
+
+    def refresh(self, db):
+        """
+        Applies rides changed since the last watermark and drops departed
+        ones. Costs one indexed query returning only the changed rides.
+        """
+        started = datetime.now(timezone.utc)
+        since = self.watermark - timedelta(seconds=Config.GEO_INDEX_OVERLAP)
+        projection = {k: 1 for k in INDEXED_FIELDS}
+        changed = list(db.rides.find({"updatedAt": {"$gte": since}}, projection).batch_size(5000))
+        with self._lock:
+            for ride in changed:
+                if _departs_at_or_after(ride, started):
+                    self.upsert(ride)
+                else:
+                    self.remove(ride["_id"])
+            departed = [i for i, doc in self._rides.items() if not _departs_at_or_after(doc, started)]
+            for ride_id in departed:
+                self._delete(ride_id)
+            if len(self._rides) > self.max_rides:
+                self._disable()
+                return False
+            self.loaded_at = time.monotonic()
+            self.watermark = started
+        return True
+
+    def refresh_in_background(self, db):
+        with self._lock:
+            if self._loading or self.is_disabled():
+                return
+            self._loading = True
+
+        def run():
+            try:
+                if self.needs_full_reload():
+                    self.load(db)
+                else:
+                    self.refresh(db)
+            except Exception as e:
+                self._report_failure(e)
+            finally:
+                with self._lock:
+                    self._loading = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _report_failure(self, error):
+        # A broken Mongo fails every refresh; one line per refresh interval is enough
+        now = time.monotonic()
+        if self._failure_reported_at is None or now - self._failure_reported_at >= Config.GEO_INDEX_REFRESH:
+            self._failure_reported_at = now
+            print(f"Geo index reload failed: {str(error)}")
+
+    def is_warm(self):
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < Config.GEO_INDEX_MAX_AGE
+
+    def needs_refresh(self):
+        if self.is_disabled():
+            return False
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= Config.GEO_INDEX_REFRESH
+
+    def needs_full_reload(self):
+        return (self.full_loaded_at is None or self.watermark is None
+                or time.monotonic() - self.full_loaded_at >= Config.GEO_INDEX_FULL_RELOAD)
+
+    # ------------------------------------------
+    # Queries
+    # ------------------------------------------
+
+    def nearby(self, lat, lng, max_dist, limit, min_seats=1, after=None, before=None):
+        """
+        Same result as ride_routes.build_nearby_pipeline, served from memory.
+        Returns None when the index is cold or stale, or when 'after' reaches
+        back before the last load (departed rides are not held), so the
+        caller should use Mongo.
+        """
+        if not self.is_warm():
+            return None
+        if after is not None and (self.watermark is None or after < self.watermark):
+            return None
+        import numpy as np
+
+        dlat = max_dist / METERS_PER_DEGREE_LAT
+        dlng = max_dist / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        x0, y0 = self._cell_key(lng - dlng, lat - dlat)
+        x1, y1 = self._cell_key(lng + dlng, lat + dlat)
+
+        ids, chunks = [], []
+        with self._lock:
+            # Walk whichever is smaller: the cells of the box or the occupied cells
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._cells):
+                cells = [cell for (x, y), cell in self._cells.items() if x0 <= x <= x1 and y0 <= y <= y1]
+            else:
+                cells = [self._cells.get((x, y)) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+            for cell in cells:
+                if cell is not None:
+                    ids.extend(cell.ids)
+                    chunks.append(np.frombuffer(cell.coords, dtype=np.float64).copy())
+            docs = [self._rides[i] for i in ids]
+        if not ids:
+            return []
+
+        coords = np.concatenate(chunks).reshape(-1, 2)
+        dist = haversine(coords[:, 0], coords[:, 1], lng, lat)
+
+        results = []
+        for i in np.flatnonzero(dist <= max_dist):
+            doc = docs[i]
+            ride_time = doc.get("time")
+            if after and (ride_time is None or ride_time < after):
+                continue
+            if before and (ride_time is None or ride_time > before):
+                continue
+            # The same denormalized counter the $geoNear query filters on
+            available = doc.get("seatsAvailable")
+            if available is None:
+                if min_seats > 0:
+                    continue
+                available = 0
+            available = max(0, int(available))
+            if available < min_seats:
+                continue
+            d = float(dist[i])
+            results.append({
+                "_id": ids[i],
+                **doc,
+                "distance": d,
+                "seatsAvailable": available,
+                "matchScore": int(max(0.0, (max_dist - d) / max_dist) * 50 + min(available * 10, 50))
+            })
+
+        results.sort(key=lambda r: (-r["matchScore"], r["distance"]))
+        return results[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {"rides": len(self._rides), "cells": len(self._cells), "warm": self.is_warm()}
+
+ride_index = RideGridIndex(Config.GEO_INDEX_CELL_DEGREES, Config.GEO_INDEX_MAX_RIDES)
+
+@metrics.register_collector
+def _geo_index_metrics():
+    stats = ride_index.stats()
+    return [
+        ("geo_index_rides", "Upcoming rides held in the in-memory grid index", stats["rides"]),
+        ("geo_index_warm", "1 if /rides/nearby is served from memory", int(stats["warm"])),
+    ]
@@ -0,0 +1,191 @@
+"""
+Forward / reverse geocoding behind /api/v1/geocode and /api/v1/reverse-geocode.
+
+Lookups go through two cache tiers before the upstream geocoder:
+1. an in-process LRU (TTLCache) - a repeat lookup costs one dict read;
+2. the 'geocode_cache' collection, shared by all workers and expired by a
+   TTL index after GEOCODE_CACHE_DAYS.
+Reverse lookups are keyed on coordinates snapped to GEOCODE_REVERSE_DEGREES,
+so nearby map clicks share an entry. Concurrent misses for the same key are
+coalesced: one thread calls upstream, the others wait for its result.
+
+The upstream is pluggable: GEOCODER_URL points the Nominatim client at any
+compatible server (e.g. a local stub), and set_upstream() swaps in any
+object with search(query, limit) and reverse(lat, lng).
+"""
+import json
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime, timezone
+from pymongo.errors import PyMongoError
+from cache import TTLCache
+from config import Config
+from database import Database
+from models import normalize_place
+import metrics
+
+GEOCODE_LOOKUPS = metrics.Counter(
+    "geocode_lookups_total",
+    "Geocoding lookups by kind and the tier that answered",
+    ("kind", "source")
+)
+GEOCODE_UPSTREAM_LATENCY = metrics.Histogram(
+    "geocode_upstream_duration_seconds",
+    "Upstream geocoder round trip",
+    ("kind",)
+)
+
+class GeocoderUnavailable(Exception):
+    """The upstream geocoder failed or timed out (nothing cached to fall back on)."""
+
+class GeocoderTimeout(GeocoderUnavailable):
+    """Waited too long on another request's in-flight lookup of the same key."""
+
+class NominatimGeocoder:
+    """Minimal client for the Nominatim /search and /reverse APIs."""
+
+    def __init__(self, base_url, user_agent, timeout=5):
+        self.base_url = base_url.rstrip("/")
+        self.user_agent = user_agent
+        self.timeout = timeout
+
+    def _get(self, path, params):
+        url = f"{self.base_url}/{path}?{urllib.parse.urlencode(params)}"
+        req = urllib.request.Request(url, headers={"User-Agent": self.user_agent})
+        with urllib.request.urlopen(req, timeout=self.timeout) as res:
+            return json.loads(res.read().decode("utf-8"))
+
+    def search(self, query, limit):
+        rows = self._get("search", {"format": "json", "q": query, "limit": limit})
+        return [{
+            "name": row.get("display_name", "").split(",")[0],
+            "displayName": row.get("display_name"),
+            "lat": float(row["lat"]),
+            "lng": float(row["lon"])
+        } for row in rows]
+
+    def reverse(self, lat, lng):
+        row = self._get("reverse", {"format": "jsonv2", "lat": lat, "lon": lng})
+        if not row or "error" in row:
+            return None
+        return {"displayName": row.get("display_name"), "lat": float(row["lat"]), "lng": float(row["lon"])}
+
+_upstream = NominatimGeocoder(Config.GEOCODER_URL, Config.GEOCODER_USER_AGENT, Config.GEOCODER_TIMEOUT)
+
+def set_upstream(geocoder):
+    """Replaces the upstream geocoder (tests / alternative providers). Clears the LRU."""
+    global _upstream
+    _upstream = geocoder
+    memory_cache.clear()
+
+memory_cache = TTLCache(maxsize=Config.GEOCODE_CACHE_SIZE, ttl=Config.GEOCODE_MEMORY_TTL)
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def snap(value, step=None):
+    """Rounds a coordinate to the GEOCODE_REVERSE_DEGREES grid."""
+    step = step or Config.GEOCODE_REVERSE_DEGREES
+    return round(round(value / step) * step, 7)
+
+def _read_store(key):
+    """Shared cache entry, or None. A Mongo outage is a miss, not an error."""
+    db = Database.get_db()
+    if db is None:
+        return None
+    try:
+        doc = db.geocode_cache.find_one({"_id": key}, {"result": 1})
+    except PyMongoError as e:
+        print(f"Geocode cache read failed: {str(e)}")
+        return None
+    return doc["result"] if doc else None
+
+def _write_store(key, result):
+    db = Database.get_db()
+    if db is None:
+        return
+    try:
+        db.geocode_cache.update_one(
+            {"_id": key},
+            {"$set": {"result": result, "createdAt": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+    except PyMongoError as e:
+        # The answer is still served (and kept in the LRU); only sharing is lost
+        print(f"Geocode cache write failed: {str(e)}")
+
+def _lookup(kind, key, fetch):
+    """
+    LRU -> Mongo -> coalesced upstream call. 'fetch' performs the upstream call.
+    Raises GeocoderUnavailable, or GeocoderTimeout when the in-flight lookup
+    this call joined has not finished within twice GEOCODER_TIMEOUT.
+    """
+    result = memory_cache.get(key)
+    if result is not None:
+        GEOCODE_LOOKUPS.inc(kind, "memory")
+        return result
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        GEOCODE_LOOKUPS.inc(kind, "coalesced")
+        try:
+            return future.result(timeout=Config.GEOCODER_TIMEOUT * 2)
+        except FutureTimeout:
+            raise GeocoderTimeout("timed out waiting for an in-flight lookup")
+
+    try:
+        result = _read_store(key)
+        if result is not None:
+            GEOCODE_LOOKUPS.inc(kind, "mongo")
+        else:
+            start = time.perf_counter()
+            try:
+                result = fetch()
+            except Exception as e:
+                # urllib raises socket timeouts bare or wrapped in URLError.reason
+                if isinstance(e, TimeoutError) or isinstance(getattr(e, "reason", None), TimeoutError):
+                    raise GeocoderTimeout(str(e))
+                raise GeocoderUnavailable(str(e))
+            finally:
+                GEOCODE_UPSTREAM_LATENCY.observe(time.perf_counter() - start, kind)
+            GEOCODE_LOOKUPS.inc(kind, "upstream")
+            if result:
+                _write_store(key, result)
+        # Empty answers stay in memory only, and only for GEOCODE_NEGATIVE_TTL,
+        # so a later upstream fix is picked up
+        memory_cache.set(key, result, None if result else Config.GEOCODE_NEGATIVE_TTL)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+def geocode(query, limit=5):
+    """Places matching 'query' (list, best first). Raises GeocoderUnavailable / GeocoderTimeout."""
+    normalized = normalize_place(query)
+    if not normalized:
+        return []
+    return _lookup("forward", f"f:{limit}:{normalized}", lambda: _upstream.search(query, limit))
+
+def reverse_geocode(lat, lng):
+    """Address for a point (dict or None), shared by every click in the same grid cell."""
+    lat, lng = snap(lat), snap(lng)
+    result = _lookup("reverse", f"r:{lat},{lng}", lambda: _upstream.reverse(lat, lng) or {})
+    return result or None
+
+@metrics.register_collector
+def _geocode_cache_metrics():
+    stats = memory_cache.stats()
+    return [
+        ("geocode_memory_cache_entries", "Entries in the in-process geocode LRU", stats["size"]),
+    ]
@@ -0,0 +1,32 @@
+"""
+Gunicorn settings for UniCarpool.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Everything is overridable through the environment. Worker classes:
+- gthread (default): WEB_THREADS threads per worker. Keep MONGO_MAX_POOL_SIZE
+  >= WEB_THREADS so threads do not queue on the Mongo pool. Live event
+  streams (/events/rides) each hold a thread and are capped per worker by
+  EVENTS_MAX_SUBSCRIBERS (default WEB_THREADS - EVENTS_RESERVED_THREADS,
+  i.e. 24 streams and 8 API threads).
+- gevent: WEB_WORKER_CONNECTIONS greenlets per worker (requires gevent).
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.getenv("WEB_WORKER_CLASS", "gthread")
+threads = int(os.getenv("WEB_THREADS", 32))
+worker_connections = int(os.getenv("WEB_WORKER_CONNECTIONS", 1000))
+timeout = int(os.getenv("WEB_TIMEOUT", 30))
+keepalive = int(os.getenv("WEB_KEEPALIVE", 5))
+preload_app = os.getenv("WEB_PRELOAD", "true").lower() == "true"
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", 0))
+
+def post_fork(server, worker):
+    # The app (and possibly a MongoClient) was created in the master with
+    # --preload. Each worker must build its own client after the fork.
+    from database import Database
+    Database.reset()
@@ -0,0 +1,52 @@
+"""
+Fast JSON encoding shared by jsonify() and the async app's streamed responses.
+
+- ObjectId -> str, datetime -> ISO 8601, handled natively (no per-route loops).
+- Uses orjson (C) when installed, falling back to the stdlib json module.
+"""
+import json
+from datetime import datetime
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    def encode_json(value):
+        """Compact JSON text for a response value."""
+        return orjson.dumps(value, default=_default).decode("utf-8")
+
+    def encode_json_bytes(value):
+        return orjson.dumps(value, default=_default)
+
+    def decode_json(text):
+        return orjson.loads(text)
+else:
+    def encode_json(value):
+        """Compact JSON text for a response value."""
+        return json.dumps(value, default=_default, separators=(",", ":"))
+
+    def encode_json_bytes(value):
+        return encode_json(value).encode("utf-8")
+
+    def decode_json(text):
+        return json.loads(text)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by encode_json / decode_json."""
+
+    def dumps(self, obj, **kwargs):
+        return encode_json(obj)
+
+    def loads(self, s, **kwargs):
+        return decode_json(s)
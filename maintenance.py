@@ -0,0 +1,219 @@
+"""
+One-off / scheduled maintenance jobs for the UniCarpool database.
+
+Usage:
+    python maintenance.py <command>
+"""
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database import Database
+from config import Config
+from models import Ride, Place, parse_departure
+
+BATCH_SIZE = 1000
+
+def _flush(collection, ops):
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+    return []
+
+def backfill_search_fields(db):
+    """Populates pickupNorm/dropoffNorm/*Tokens on rides created before place search existed."""
+    ops = []
+    cursor = db.rides.find(
+        {"pickupTokens": {"$exists": False}},
+        {"pickup": 1, "dropoff": 1}
+    )
+    for ride in cursor:
+        ops.append(UpdateOne(
+            {"_id": ride["_id"]},
+            {"$set": Ride.search_fields(ride.get("pickup", ""), ride.get("dropoff", ""))}
+        ))
+        if len(ops) >= BATCH_SIZE:
+            ops = _flush(db.rides, ops)
+    _flush(db.rides, ops)
+
+def all_rides(fields, *stages):
+    """
+    Pipeline (run on 'rides') over live AND archived rides: projects 'fields'
+    from 'rides' and 'rides_history', then applies 'stages'. Counters and
+    rollups rebuilt from 'rides' alone would lose everything the archiver
+    has moved. A ride caught mid-archive (copied, not yet deleted) counts
+    twice until the archiver's delete lands.
+    """
+    project = {"$project": fields}
+    return [project, {"$unionWith": {"coll": "rides_history", "pipeline": [project]}}, *stages]
+
+def rebuild_places(db):
+    """Rebuilds the autocomplete 'places' collection from live and archived rides."""
+    pipeline = all_rides(
+        {"names": ["$pickup", "$dropoff"]},
+        {"$unwind": "$names"},
+        {"$group": {"_id": "$names", "rideCount": {"$sum": 1}}}
+    )
+    counts = {}
+    for row in db.rides.aggregate(pipeline, allowDiskUse=True):
+        if not row["_id"]:
+            continue
+        place = Place.create_schema(row["_id"])
+        if not place["_id"]:
+            continue
+        entry = counts.setdefault(place["_id"], {**place, "rideCount": 0})
+        entry["rideCount"] += row["rideCount"]
+
+    db.places.delete_many({})
+    docs = list(counts.values())
+    for i in range(0, len(docs), BATCH_SIZE):
+        db.places.insert_many(docs[i:i + BATCH_SIZE], ordered=False)
+
+def reconcile_driver_stats(db):
+    """Rebuilds the 'driver_stats' counters from live and archived rides in a single aggregation."""
+    pipeline = all_rides(
+        {"driverId": 1, "passengers": 1},
+        {"$group": {
+            "_id": "$driverId",
+            "totalRidesOffered": {"$sum": 1},
+            "totalPassengersCarried": {"$sum": {"$size": {"$ifNull": ["$passengers", []]}}}
+        }},
+        {"$merge": {"into": "driver_stats", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    )
+    db.rides.aggregate(pipeline, allowDiskUse=True)
+    # Drivers with no ride left anywhere (live or archived) keep no counters
+    driver_ids = set(db.rides.distinct("driverId")) | set(db.rides_history.distinct("driverId"))
+    db.driver_stats.delete_many({"_id": {"$nin": list(driver_ids)}})
+
+def rebuild_route_rollups(db):
+    """Rebuilds 'route_rollups' (hourly) and 'route_totals' (all time) from live and archived rides."""
+    created = {"$ifNull": ["$createdAt", {"$toDate": "$_id"}]}
+    route_fields = {"pickup": 1, "dropoff": 1, "createdAt": 1}
+    db.route_rollups.delete_many({})
+    db.rides.aggregate(all_rides(
+        route_fields,
+        {"$group": {
+            "_id": {
+                "from": "$pickup",
+                "to": "$dropoff",
+                "bucket": {"$dateTrunc": {"date": created, "unit": "hour"}}
+            },
+            "rideCount": {"$sum": 1}
+        }},
+        {"$project": {"_id": 0, "from": "$_id.from", "to": "$_id.to", "bucket": "$_id.bucket", "rideCount": 1}},
+        {"$merge": {"into": "route_rollups", "on": ["from", "to", "bucket"], "whenMatched": "replace"}}
+    ), allowDiskUse=True)
+
+    db.route_totals.delete_many({})
+    db.rides.aggregate(all_rides(
+        route_fields,
+        {"$group": {"_id": {"from": "$pickup", "to": "$dropoff"}, "rideCount": {"$sum": 1}}},
+        {"$merge": {"into": "route_totals", "on": "_id", "whenMatched": "replace"}}
+    ), allowDiskUse=True)
+
+def backfill_seats_available(db):
+    """
+    Sets the denormalized 'seatsAvailable' = max(0, seats - len(passengers))
+    on every ride, in one server-side pipeline update. Safe to re-run; run it
+    once on deploy before join relies on the field.
+    """
+    result = db.rides.update_many({}, [{"$set": {"seatsAvailable": {"$max": [0, {"$subtract": [
+        "$seats", {"$size": {"$ifNull": ["$passengers", []]}}
+    ]}]}}}])
+    print(f"seatsAvailable set on {result.modified_count} rides")
+
+def migrate_ride_times(db):
+    """Converts legacy string 'time' values to real (UTC) datetimes."""
+    ops = []
+    skipped = 0
+    for ride in db.rides.find({"time": {"$type": "string"}}, {"time": 1}):
+        try:
+            when = parse_departure(ride["time"])
+        except ValueError:
+            skipped += 1
+            continue
+        ops.append(UpdateOne({"_id": ride["_id"]}, {"$set": {"time": when}}))
+        if len(ops) >= BATCH_SIZE:
+            ops = _flush(db.rides, ops)
+    _flush(db.rides, ops)
+    if skipped:
+        print(f"Skipped {skipped} rides with unparseable time")
+
+def archive_past_rides(db, grace_minutes=None):
+    """
+    Moves rides that departed more than 'grace_minutes' ago from 'rides' to
+    'rides_history', in batches. Safe to re-run or run from several workers:
+    copies are upserts-by-_id (duplicates ignored) and deletes only follow a copy.
+    Returns the number of rides archived.
+    """
+    grace = Config.ARCHIVE_GRACE_MINUTES if grace_minutes is None else grace_minutes
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=grace)
+    archived = 0
+    while True:
+        batch = list(db.rides.find({"time": {"$lt": cutoff}}).sort("time", 1).limit(BATCH_SIZE))
+        if not batch:
+            return archived
+        try:
+            db.rides_history.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # 11000 = already archived by a previous / concurrent run
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+        db.rides.delete_many({"_id": {"$in": [r["_id"] for r in batch]}})
+        archived += len(batch)
+
+_archiver_started = False
+
+def start_archiver():
+    """Runs archive_past_rides every Config.ARCHIVE_INTERVAL seconds in a daemon thread."""
+    global _archiver_started
+    if _archiver_started or Config.ARCHIVE_INTERVAL <= 0:
+        return
+    _archiver_started = True
+
+    def run():
+        while True:
+            time.sleep(Config.ARCHIVE_INTERVAL)
+            try:
+                db = Database.get_db()
+                if db is not None:
+                    archived = archive_past_rides(db)
+                    if archived:
+                        print(f"Archived {archived} departed rides")
+            except Exception as e:
+                print(f"Ride archiving failed: {str(e)}")
+
+    threading.Thread(target=run, daemon=True).start()
+
+def ensure_indexes(db):
+    """Creates all indexes and records INDEX_VERSION (run on deploy when INDEX_BUILD=off)."""
+    Database.ensure_indexes(force=True)
+
+COMMANDS = {
+    "backfill-search": backfill_search_fields,
+    "rebuild-places": rebuild_places,
+    "reconcile-driver-stats": reconcile_driver_stats,
+    "rebuild-route-rollups": rebuild_route_rollups,
+    "migrate-ride-times": migrate_ride_times,
+    "backfill-seats-available": backfill_seats_available,
+    "archive-rides": archive_past_rides,
+    "ensure-indexes": ensure_indexes,
+}
+
+def main(argv):
+    if len(argv) != 1 or argv[0] not in COMMANDS:
+        print(f"Usage: python maintenance.py <{'|'.join(COMMANDS)}>")
+        return 2
+    # Commands run in the foreground; never race a background index build
+    Config.INDEX_BUILD = "off"
+    db = Database.get_db()
+    if db is None:
+        print("Database connection failed")
+        return 1
+    COMMANDS[argv[0]](db)
+    print(f"✅ {argv[0]} complete")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,75 @@
+"""
+Two-sided (pickup + dropoff) ride matching.
+
+Candidates come from MongoDB already narrowed by the pickup 2dsphere index
+and a destination bounding box; everything after that is vectorized with
+NumPy over the whole candidate set instead of per-document Python.
+NumPy is imported on first use so it stays off the cold-start path.
+"""
+import math
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE_LAT = 111320.0
+
+def haversine(lng1, lat1, lng2, lat2):
+    """Great-circle distance in meters; all arguments broadcast as NumPy arrays."""
+    import numpy as np
+    lng1, lat1, lng2, lat2 = map(np.radians, (lng1, lat1, lng2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def bounding_polygon(lng, lat, radius):
+    """GeoJSON Polygon of the box enclosing a circle of 'radius' meters."""
+    dlat = radius / METERS_PER_DEGREE_LAT
+    dlng = radius / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    w, e, s, n = lng - dlng, lng + dlng, max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    return {"type": "Polygon", "coordinates": [[[w, s], [e, s], [e, n], [w, n], [w, s]]]}
+
+def rank_matches(rides, origin, destination, pickup_radius, dropoff_radius, limit):
+    """
+    Scores candidates on pickup AND dropoff distance and returns the top 'limit'.
+    - matchScore (0-100): 50 pts pickup closeness + 50 pts dropoff closeness.
+    - detourMeters: extra distance for the driver to go
+      pickup -> origin -> destination -> dropoff instead of pickup -> dropoff.
+    'origin' / 'destination' are (lng, lat). Each ride needs pickupCoords and dropoffCoords.
+    """
+    if not rides:
+        return []
+    import numpy as np
+
+    coords = np.array(
+        [r['pickupCoords']['coordinates'] + r['dropoffCoords']['coordinates'] for r in rides],
+        dtype=np.float64
+    )
+    p_lng, p_lat, d_lng, d_lat = coords.T
+    o_lng, o_lat = origin
+    t_lng, t_lat = destination
+
+    pickup_dist = haversine(p_lng, p_lat, o_lng, o_lat)
+    dropoff_dist = haversine(d_lng, d_lat, t_lng, t_lat)
+    # The bounding box is a square; drop the corners outside the radius
+    keep = (pickup_dist <= pickup_radius) & (dropoff_dist <= dropoff_radius)
+
+    trip = float(haversine(o_lng, o_lat, t_lng, t_lat))
+    direct = haversine(p_lng, p_lat, d_lng, d_lat)
+    detour = np.maximum(pickup_dist + trip + dropoff_dist - direct, 0.0)
+
+    score = 50 * (1 - pickup_dist / pickup_radius) + 50 * (1 - dropoff_dist / dropoff_radius)
+    score = np.where(keep, np.clip(score, 0, 100), -1.0)
+
+    k = min(limit, int(keep.sum()))
+    if k == 0:
+        return []
+    top = np.argpartition(-score, k - 1)[:k]
+    # Best score first, smaller detour on ties
+    top = top[np.lexsort((detour[top], -score[top]))]
+
+    results = []
+    for i in top:
+        ride = dict(rides[i])
+        ride['pickupDistance'] = round(float(pickup_dist[i]), 1)
+        ride['dropoffDistance'] = round(float(dropoff_dist[i]), 1)
+        ride['detourMeters'] = round(float(detour[i]), 1)
+        ride['matchScore'] = int(score[i])
+        results.append(ride)
+    return results
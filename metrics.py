@@ -0,0 +1,196 @@
+"""
+Lightweight in-process metrics exposed in Prometheus text format at /metrics.
+
+- Per-route request latency histograms (Flask before/after hooks).
+- Per-collection / per-command MongoDB durations (pymongo CommandListener).
+- Mongo pool checkout waits, plus gauges from registered collectors
+  (pool counters, principal cache, ...).
+
+Counters are plain dicts behind a lock, so the overhead is one lock and a
+bisect per observation - cheap enough to leave on in production.
+"""
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, g, request
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_metrics = []
+_collectors = []
+
+def _label_str(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = []
+    for k, v in zip(labelnames, values):
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{k}="{v}"')
+    return "{" + ",".join(pairs) + "}"
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in self._values.items():
+                lines.append(f"{self.name}{_label_str(self.labelnames, labels)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(e[0]), e[1], e[2]) for labels, e in self._values.items()]
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                label_str = _label_str(self.labelnames + ("le",), labels + (le,))
+                lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+            label_str = _label_str(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {total}")
+            lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+def register_collector(fn):
+    """
+    Registers fn() -> [(name, help, {labels: value} or value)] evaluated on
+    every scrape; used for gauges owned by other modules.
+    """
+    _collectors.append(fn)
+    return fn
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            samples = collector()
+        except Exception:
+            continue
+        for name, help, value in samples:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            if isinstance(value, dict):
+                for labels, v in value.items():
+                    lines.append(f"{name}{_label_str(tuple(k for k, _ in labels), tuple(v2 for _, v2 in labels))} {v}")
+            else:
+                lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+# ------------------------------------------
+# Metric definitions
+# ------------------------------------------
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Flask request latency (time to first byte for streamed responses)",
+    ("endpoint", "method", "status")
+)
+AUTH_LATENCY = Histogram(
+    "auth_token_duration_seconds",
+    "token_required work: JWT decode plus principal lookup"
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command round trip as seen by pymongo",
+    ("collection", "command")
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total",
+    "MongoDB commands that returned an error",
+    ("collection", "command")
+)
+MONGO_POOL_WAIT = Histogram(
+    "mongo_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled MongoDB connection"
+)
+
+# ------------------------------------------
+# Flask integration
+# ------------------------------------------
+
+def init_app(app):
+    """Adds latency hooks and the /metrics endpoint to a Flask app."""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        start = g.pop("metrics_start", None)
+        if start is not None and request.endpoint != "metrics":
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start,
+                request.endpoint or "unmatched", request.method, response.status_code
+            )
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+# ------------------------------------------
+# pymongo integration
+# ------------------------------------------
+
+class CommandTimer(monitoring.CommandListener):
+    """Records per-collection/per-command durations for every Mongo command."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else "-"
+        with self._lock:
+            self._inflight[(event.request_id, event.connection_id)] = collection
+
+    def _finish(self, event):
+        with self._lock:
+            return self._inflight.pop((event.request_id, event.connection_id), "-")
+
+    def succeeded(self, event):
+        collection = self._finish(event)
+        MONGO_COMMAND_LATENCY.observe(event.duration_micros / 1e6, collection, event.command_name)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        MONGO_COMMAND_LATENCY.observe(event.duration_micros / 1e6, collection, event.command_name)
+        MONGO_COMMAND_FAILURES.inc(collection, event.command_name)
@@ -1,5 +1,35 @@
+import re
 from datetime import datetime, timezone
 
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+def normalize_place(name):
+    """Lowercased, whitespace-collapsed place name used for indexed lookups."""
+    return " ".join(_WORD_RE.findall(str(name).casefold()))
+
+def place_tokens(name):
+    """Distinct lowercase words of a place name (multikey-indexed for prefix search)."""
+    return sorted(set(_WORD_RE.findall(str(name).casefold())))
+
+def parse_departure(value):
+    """
+    Departure time as a timezone-aware UTC datetime.
+    Accepts a datetime or an ISO 8601 string ("2024-12-01T10:00", "...Z",
+    "...+05:00"). Naive values are taken as UTC. Raises ValueError otherwise.
+    """
+    if isinstance(value, datetime):
+        when = value
+    elif isinstance(value, str) and value.strip():
+        text = value.strip()
+        if text.endswith(("Z", "z")):
+            text = text[:-1] + "+00:00"
+        when = datetime.fromisoformat(text)
+    else:
+        raise ValueError(f"Invalid time: {value!r}")
+    if when.tzinfo is None:
+        return when.replace(tzinfo=timezone.utc)
+    return when.astimezone(timezone.utc)
+
 class User:
     @staticmethod
     def create_schema(name, email, password_hash, gender, phone):
@@ -13,6 +43,34 @@ class User:
         }
 
 class Ride:
+    # Named response views: which fields an endpoint sends back.
+    # - card: ride lists (search, my rides, joined rides)
+    # - pin: map markers (nearby)
+    # - detail: the whole ride minus internal search fields
+    VIEWS = {
+        "card": ("driverId", "pickup", "dropoff", "time", "seats", "seatsAvailable", "passengers"),
+        "pin": ("pickup", "dropoff", "pickupCoords", "time", "seats", "seatsAvailable", "passengers"),
+        "detail": None
+    }
+    INTERNAL_FIELDS = ("pickupNorm", "dropoffNorm", "pickupTokens", "dropoffTokens")
+
+    @staticmethod
+    def projection(view, extra=()):
+        """Mongo projection for a named view; 'extra' adds computed fields. Raises ValueError."""
+        if view not in Ride.VIEWS:
+            raise ValueError(f"Unknown view '{view}', use one of: {', '.join(Ride.VIEWS)}")
+        fields = Ride.VIEWS[view]
+        if fields is None:
+            return {f: 0 for f in Ride.INTERNAL_FIELDS}
+        return {f: 1 for f in fields + tuple(extra)}
+
+    @staticmethod
+    def apply_projection(doc, projection):
+        """Applies a projection from Ride.projection() to an in-memory document."""
+        if any(v == 0 for v in projection.values()):
+            return {k: v for k, v in doc.items() if k not in projection}
+        return {k: v for k, v in doc.items() if k == "_id" or k in projection}
+
     @staticmethod
     def create_schema(driver_id, pickup, dropoff, pickup_coords, dropoff_coords, time, seats):
         """
@@ -26,8 +84,40 @@ class Ride:
             "dropoff": dropoff,
             "pickupCoords": pickup_coords,
             "dropoffCoords": dropoff_coords,
-            "time": time,
+            "time": parse_departure(time),  # indexed, drives windows + archiving
             "seats": int(seats),
+            # Denormalized seats - len(passengers); every booking path updates
+            # it atomically with the passengers array so it can be indexed
+            "seatsAvailable": int(seats),
             "passengers": [],  # Will store list of user IDs
-            "createdAt": datetime.now(timezone.utc)
+            **Ride.search_fields(pickup, dropoff),
+            "createdAt": datetime.now(timezone.utc),
+            # Bumped ($currentDate) by every booking write; geo index refresh watermark
+            "updatedAt": datetime.now(timezone.utc)
+        }
+
+    @staticmethod
+    def search_fields(pickup, dropoff):
+        """
+        Derived, indexed fields used by /rides/search.
+        Kept next to the display names so they never drift apart.
+        """
+        return {
+            "pickupNorm": normalize_place(pickup),
+            "dropoffNorm": normalize_place(dropoff),
+            "pickupTokens": place_tokens(pickup),
+            "dropoffTokens": place_tokens(dropoff)
+        }
+
+class Place:
+    @staticmethod
+    def create_schema(name):
+        """
+        Autocomplete entry, one per distinct normalized place name.
+        '_id' is the normalized name; 'rideCount' is bumped on every ride using it.
+        """
+        return {
+            "_id": normalize_place(name),
+            "name": name,
+            "tokens": place_tokens(name)
         }
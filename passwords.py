@@ -0,0 +1,138 @@
+"""
+Password hashing off the request threads.
+
+pbkdf2 costs a few hundred ms of CPU per call. Running it in a bounded
+process pool keeps a login burst from stalling every other endpoint in
+the worker. When more than PASSWORD_POOL_MAX_PENDING hashes are queued,
+callers get HashingBusy straight away and the route answers 503 with
+Retry-After instead of piling up.
+
+Pool processes are started with forkserver (spawn where unavailable), never
+by forking the multithreaded worker. If a pool process dies the pool is
+replaced and the call is hashed inline, so one crash cannot fail every
+later login.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from config import Config
+import metrics
+
+HASH_LATENCY = metrics.Histogram(
+    "password_hash_duration_seconds",
+    "Password hash / verify time including pool queueing",
+    ("op",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+HASH_REJECTED = metrics.Counter(
+    "password_hash_rejected_total",
+    "Hash requests rejected because the pool queue was full",
+    ("op",)
+)
+
+class HashingBusy(Exception):
+    """The hashing pool is saturated; retry after Config.PASSWORD_RETRY_AFTER seconds."""
+
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+_pending = 0
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+def _get_executor():
+    # One pool per process; a forked gunicorn worker must not reuse its parent's
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=Config.PASSWORD_POOL_WORKERS, mp_context=_mp_context())
+            _executor_pid = os.getpid()
+        return _executor
+
+def _discard_executor(broken):
+    """Drops 'broken' so the next call builds a fresh pool (no-op if already replaced)."""
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def _run(op, fn, *args):
+    global _pending
+    start = time.perf_counter()
+    try:
+        if Config.PASSWORD_POOL_WORKERS <= 0:
+            return fn(*args)
+
+        with _lock:
+            if _pending >= Config.PASSWORD_POOL_MAX_PENDING:
+                HASH_REJECTED.inc(op)
+                raise HashingBusy()
+            _pending += 1
+        try:
+            executor = _get_executor()
+            try:
+                return executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                print(f"Password pool broken, replacing it ({op} hashed inline)")
+                _discard_executor(executor)
+                return fn(*args)
+        finally:
+            with _lock:
+                _pending -= 1
+    finally:
+        HASH_LATENCY.observe(time.perf_counter() - start, op)
+
+def hash_password(password):
+    return _run("hash", generate_password_hash, password, Config.PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    return _run("verify", check_password_hash, password_hash, password)
+
+def _method_cost(method):
+    """
+    Splits a werkzeug method string into (variant, work factor), filling in
+    werkzeug's defaults: 'pbkdf2' -> (('pbkdf2', 'sha256'), 1000000),
+    'scrypt:32768:8:1' -> (('scrypt', 8, 1), 32768).
+    """
+    name, *params = method.split(":")
+    try:
+        if name == "pbkdf2":
+            digest = params[0] if params else "sha256"
+            iterations = int(params[1]) if len(params) > 1 else DEFAULT_PBKDF2_ITERATIONS
+            return (name, digest), iterations
+        if name == "scrypt":
+            n = int(params[0]) if params else 2 ** 15
+            r = int(params[1]) if len(params) > 1 else 8
+            p = int(params[2]) if len(params) > 2 else 1
+            return (name, r, p), n
+    except ValueError:
+        pass
+    # Unknown or malformed: only an identical method string counts as a match
+    return (method,), 0
+
+def needs_rehash(password_hash):
+    """
+    True if the stored hash uses another algorithm than configured, or a
+    lower work factor. A stronger stored hash is never rewritten weaker.
+    """
+    stored_variant, stored_cost = _method_cost(password_hash.split("$", 1)[0])
+    variant, cost = _method_cost(Config.PASSWORD_HASH_METHOD)
+    return stored_variant != variant or stored_cost < cost
+
+def pending():
+    with _lock:
+        return _pending
+
+@metrics.register_collector
+def _hashing_metrics():
+    return [
+        ("password_hash_queue_depth", "Hash / verify calls queued or running in the pool", pending()),
+        ("password_hash_queue_limit", "Configured PASSWORD_POOL_MAX_PENDING", Config.PASSWORD_POOL_MAX_PENDING),
+    ]
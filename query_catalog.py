@@ -0,0 +1,218 @@
+"""
+Catalog of the query shapes the API and its background jobs issue.
+
+Each entry is the database command a route sends, built from the same
+helpers the route uses, with representative values. explain_check.py runs
+`explain` on every entry against a seeded database and fails on a COLLSCAN
+or a blocking in-memory SORT / $sort / $group, so a missing index (see
+database.INDEXES) is caught before it reaches production.
+
+Add a shape here whenever a route gains a new query. 'sort_ok' documents
+the few shapes whose order (or grouping) is computed per request, so they
+can only be served by a blocking $sort / $group bounded by $limit.
+Full-collection maintenance rebuilds (maintenance.py reconcile/rebuild
+commands) scan by design and are not listed.
+"""
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+from models import Ride
+from routes.auth_middleware import PRINCIPAL_PROJECTION
+from routes.user_routes import LOGIN_PROJECTION, history_query
+from routes.pagination import seek_filter, DEFAULT_PAGE_SIZE
+from routes.ride_routes import (
+    NEARBY_PROJECTION, BOOKING_PROJECTION, AVAILABILITY_PROJECTION, AUTOCOMPLETE_LIMIT,
+    build_nearby_pipeline, build_match_pipeline, build_search_pipeline, joined_rides_query,
+    token_prefix_filter, join_filter, join_update, cancel_update, popular_routes_pipeline, route_bucket, time_filter
+)
+
+class QueryShape:
+    def __init__(self, name, collection, command, sort_ok=None):
+        self.name = name
+        self.collection = collection
+        self.command = command
+        self.sort_ok = sort_ok
+
+def find(collection, filter, projection=None, sort=None, limit=None):
+    command = {"find": collection, "filter": filter}
+    if projection is not None:
+        command["projection"] = projection
+    if sort is not None:
+        command["sort"] = sort
+    if limit is not None:
+        command["limit"] = limit
+    return command
+
+def aggregate(collection, pipeline):
+    return {"aggregate": collection, "pipeline": pipeline, "cursor": {}}
+
+def find_and_modify(collection, query, update, projection=None):
+    command = {"findAndModify": collection, "query": query, "update": update}
+    if projection is not None:
+        command["fields"] = projection
+    return command
+
+def update(collection, query, change, upsert=False):
+    return {"update": collection, "updates": [{"q": query, "u": change, "upsert": upsert}]}
+
+def query_shapes(user_id=None, ride_id=None, now=None):
+    """Every cataloged shape, filled with the given (or placeholder) values."""
+    user_id = user_id or str(ObjectId())
+    ride_id = ride_id or ObjectId()
+    now = now or datetime.now(timezone.utc)
+    later = now + timedelta(days=7)
+    cursor = {"time": now + timedelta(hours=1), "_id": ObjectId(), "relevance": 3}
+    page = DEFAULT_PAGE_SIZE + 1
+    by_time = {"time": 1, "_id": 1}
+    newest_first = {"time": -1, "_id": -1}
+    card = Ride.projection("card")
+
+    return [
+        # ---- users ----
+        QueryShape("auth: principal by _id", "users",
+            find("users", {"_id": ObjectId(user_id)}, PRINCIPAL_PROJECTION, limit=1)),
+        QueryShape("register: email exists", "users",
+            find("users", {"email": "a@b.c"}, {"_id": 1}, limit=1)),
+        QueryShape("login: user by email", "users",
+            find("users", {"email": "a@b.c"}, LOGIN_PROJECTION, limit=1)),
+        QueryShape("login: rehash password", "users",
+            update("users", {"_id": ObjectId(user_id), "password": "x"}, {"$set": {"password": "y"}})),
+
+        # ---- rides: discovery ----
+        QueryShape("nearby: $geoNear", "rides",
+            aggregate("rides", build_nearby_pipeline(40.75, -73.98, 5000, 50, 1, now, None, NEARBY_PROJECTION)),
+            sort_ok="ranked by computed matchScore after $geoNear, bounded by $limit"),
+        QueryShape("match: pickup $geoNear + dropoff box", "rides",
+            aggregate("rides", build_match_pipeline((-73.98, 40.75), (-73.9, 40.8), 2000, 3000, 1, now, None))),
+        QueryShape("search: from + to", "rides",
+            aggregate("rides", build_search_pipeline("univ", "city", page, now, None, card)),
+            sort_ok="ranks computed relevance over at most SEARCH_MAX_CANDIDATES earliest matches"),
+        QueryShape("search: from only, next page", "rides",
+            aggregate("rides", build_search_pipeline("univ", None, page, now, None, card, cursor)),
+            sort_ok="ranks computed relevance over at most SEARCH_MAX_CANDIDATES earliest matches"),
+        QueryShape("autocomplete: token prefix", "places",
+            find("places", {"tokens": token_prefix_filter("uni")}, {"_id": 0, "name": 1, "rideCount": 1},
+                 {"rideCount": -1}, AUTOCOMPLETE_LIMIT),
+            sort_ok="prefix range on multikey tokens cannot return rideCount order, bounded by limit"),
+
+        # ---- rides: lists (keyset pages) ----
+        QueryShape("joined rides: first page", "rides",
+            find("rides", joined_rides_query(user_id, now, None), card, by_time, page)),
+        QueryShape("joined rides: next page", "rides",
+            find("rides", joined_rides_query(user_id, now, later, cursor), card, by_time, page)),
+        QueryShape("my rides: driven", "rides",
+            find("rides", {"driverId": user_id, **time_filter(now, None)}, card, by_time, page)),
+        QueryShape("my rides: driven, next page", "rides",
+            find("rides", {"$and": [{"driverId": user_id}, seek_filter(cursor)]}, card, by_time, page)),
+        QueryShape("my rides: joined, all time", "rides",
+            find("rides", {"passengers": user_id}, card, by_time, page)),
+        QueryShape("history: driven", "rides_history",
+            find("rides_history", history_query(user_id, "driver"), card, newest_first, page)),
+        QueryShape("history: joined, next page", "rides_history",
+            find("rides_history", history_query(user_id, "passenger", cursor), card, newest_first, page)),
+
+        # ---- rides: booking ----
+        QueryShape("join: guarded update", "rides",
+            find_and_modify("rides", {"_id": ride_id, **join_filter(user_id)}, join_update(user_id), BOOKING_PROJECTION)),
+        QueryShape("join / cancel: diagnose refusal", "rides",
+            find("rides", {"_id": ride_id}, BOOKING_PROJECTION, limit=1)),
+        QueryShape("cancel: guarded $pull", "rides",
+            find_and_modify("rides", {"_id": ride_id, "passengers": user_id}, cancel_update(user_id), BOOKING_PROJECTION)),
+        QueryShape("batch booking: read", "rides",
+            find("rides", {"_id": {"$in": [ride_id, ObjectId()]}}, BOOKING_PROJECTION)),
+        QueryShape("batch booking: join", "rides",
+            update("rides", {"_id": ride_id, **join_filter(user_id)}, join_update(user_id))),
+        QueryShape("availability", "rides",
+            find("rides", {"_id": ride_id}, AVAILABILITY_PROJECTION, limit=1)),
+
+        # ---- stats / analytics ----
+        QueryShape("driver stats: read", "driver_stats",
+            find("driver_stats", {"_id": user_id}, limit=1)),
+        QueryShape("driver stats: bump", "driver_stats",
+            update("driver_stats", {"_id": user_id}, {"$inc": {"totalRidesOffered": 1}}, upsert=True)),
+        QueryShape("popular routes: all time", "route_totals",
+            find("route_totals", {}, sort={"rideCount": -1}, limit=5)),
+        QueryShape("popular routes: window", "route_rollups",
+            aggregate("route_rollups", popular_routes_pipeline(route_bucket(now - timedelta(days=7)), 5)),
+            sort_ok="sums the window's hourly rollups per route, then top-N by $limit"),
+        QueryShape("record route: rollup", "route_rollups",
+            update("route_rollups", {"from": "A", "to": "B", "bucket": route_bucket(now)},
+                   {"$inc": {"rideCount": 1}}, upsert=True)),
+        QueryShape("record place", "places",
+            update("places", {"_id": "city center"}, {"$inc": {"rideCount": 1}}, upsert=True)),
+
+        # ---- geocoding proxy (Mongo tier) ----
+        QueryShape("geocode cache: read", "geocode_cache",
+            find("geocode_cache", {"_id": "f:5:city center"}, {"result": 1}, limit=1)),
+        QueryShape("geocode cache: write", "geocode_cache",
+            update("geocode_cache", {"_id": "f:5:city center"}, {"$set": {"result": []}}, upsert=True)),
+
+        # ---- background jobs ----
+        QueryShape("geo index: load upcoming", "rides",
+            find("rides", {"time": {"$gte": now}})),
+        QueryShape("geo index: changed since watermark", "rides",
+            find("rides", {"updatedAt": {"$gte": now - timedelta(seconds=30)}})),
+        QueryShape("archiver: departed batch", "rides",
+            find("rides", {"time": {"$lt": now}}, sort={"time": 1}, limit=1000)),
+        QueryShape("migrate-ride-times: string times", "rides",
+            find("rides", {"time": {"$type": "string"}}, {"time": 1})),
+    ]
+
+# ------------------------------------------
+# Plan inspection
+# ------------------------------------------
+
+# Plan / pipeline stages that consume their whole input before returning a row
+BLOCKING_STAGES = {"SORT": "blocking SORT", "$SORT": "blocking $sort",
+                   "GROUP": "blocking GROUP", "$GROUP": "blocking $group"}
+
+def plan_stages(explain):
+    """
+    Every stage name inside the winning plan(s) of an explain result, plus
+    the aggregation stages the classic engine reports beside the plan
+    ('stages': [{"$cursor": ...}, {"$sort": ...}]) as "$SORT", "$GROUP", ...
+    """
+    stages = []
+
+    def walk(node, in_plan):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if in_plan and key == "stage" and isinstance(value, str):
+                    stages.append(value.upper())
+                if key == "stages" and isinstance(value, list):
+                    stages.extend(name.upper() for stage in value if isinstance(stage, dict)
+                                  for name in stage if name.startswith("$") and name != "$cursor")
+                walk(value, in_plan or key == "winningPlan")
+        elif isinstance(node, list):
+            for value in node:
+                walk(value, in_plan)
+
+    walk(explain, False)
+    return stages
+
+def plan_problems(shape, explain):
+    """Reasons this shape's plan is unacceptable (empty list = fine)."""
+    stages = plan_stages(explain)
+    problems = []
+    if "COLLSCAN" in stages:
+        problems.append("COLLSCAN")
+    if not shape.sort_ok:
+        problems.extend(BLOCKING_STAGES[stage] for stage in BLOCKING_STAGES if stage in stages)
+    if not stages:
+        problems.append("no winning plan in explain output")
+    return problems
+
+def explain(db, shape):
+    return db.command("explain", shape.command, verbosity="queryPlanner")
+
+def check_shape(db, shape):
+    """
+    (plan stages, problems) for one shape. A shape the server refuses to
+    explain (bad pipeline, missing 2dsphere index, ...) is reported as a
+    problem rather than raised, so one broken shape does not hide the rest.
+    """
+    try:
+        result = explain(db, shape)
+    except PyMongoError as e:
+        return [], [f"explain failed: {e}"]
+    return plan_stages(result), plan_problems(shape, result)
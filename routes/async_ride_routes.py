@@ -0,0 +1,136 @@
+"""
+Async (ASGI) versions of the read-heavy ride endpoints.
+
+Served by async_app.py. Query building, scoring and response shapes are
+imported from routes.ride_routes so both modes always agree.
+"""
+from functools import wraps
+from quart import Blueprint, request, jsonify, current_app, Response
+from bson import ObjectId
+from bson.errors import InvalidId
+from database import AsyncDatabase
+from models import Ride
+from routes.auth_middleware import bearer_token, decode_user_id, principal_cache, PRINCIPAL_PROJECTION
+from routes.json_stream import primed_json_array
+from routes.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from routes.ride_routes import (
+    parse_nearby_args, parse_time_window, build_nearby_pipeline, build_search_pipeline,
+    joined_rides_query, availability_payload, AVAILABILITY_PROJECTION
+)
+
+async_ride_bp = Blueprint('async_ride_bp', __name__)
+
+def first_page_limit(args):
+    """?limit= bounded like the sync routes. Async lists serve the first page only (no cursor)."""
+    return min(max(int(args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+
+async def load_principal_async(db, user_id):
+    """Async version of auth_middleware.load_principal (same shared cache)."""
+    user = principal_cache.get(user_id)
+    if user is None:
+        user = await db.users.find_one({"_id": ObjectId(user_id)}, PRINCIPAL_PROJECTION)
+        if user:
+            principal_cache.set(user_id, user)
+    return user
+
+def async_token_required(f):
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        token = bearer_token(request.headers)
+        if not token:
+            return jsonify({'message': 'Token is missing!'}), 401
+
+        try:
+            user_id = decode_user_id(token, current_app.config['SECRET_KEY'])
+            db = AsyncDatabase.get_db()
+            if db is None:
+                return jsonify({"message": "Server database connection lost"}), 500
+            current_user = await load_principal_async(db, user_id)
+            if not current_user:
+                raise Exception("User not found")
+        except Exception as e:
+            return jsonify({'message': 'Token is invalid!', 'error': str(e)}), 401
+
+        return await f(dict(current_user), *args, **kwargs)
+
+    return decorated
+
+async def stream_array(cursor):
+    """Streams 'cursor' as a JSON array; raises here if the first batch fails."""
+    return Response(await primed_json_array(cursor), status=200, mimetype="application/json")
+
+@async_ride_bp.route('/rides/nearby', methods=['GET'])
+async def get_nearby_rides():
+    """Async GET /api/v1/rides/nearby (see ride_routes.get_nearby_rides)."""
+    db = AsyncDatabase.get_db(stale_ok=True)
+    if db is None:
+        return jsonify({"message": "Database connection failed"}), 500
+    try:
+        params = parse_nearby_args(request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({"message": f"Invalid parameters: {str(e)}"}), 400
+
+    try:
+        return await stream_array(await db.rides.aggregate(build_nearby_pipeline(**params)))
+    except Exception as e:
+        return jsonify({"message": "Error fetching nearby rides", "error": str(e)}), 500
+
+@async_ride_bp.route('/rides/search', methods=['GET'])
+@async_token_required
+async def search_rides_v1(current_user):
+    """Async GET /api/v1/rides/search (see ride_routes.search_rides_v1)."""
+    db = AsyncDatabase.get_db(stale_ok=True)
+    if db is None:
+        return jsonify({"message": "Database connection failed"}), 500
+
+    try:
+        after, before = parse_time_window(request.args)
+        limit = first_page_limit(request.args)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid parameters: {str(e)}"}), 400
+
+    pipeline = build_search_pipeline(request.args.get('from'), request.args.get('to'), limit=limit,
+                                     after=after, before=before)
+    if pipeline is None:
+        return jsonify([]), 200
+    try:
+        return await stream_array(await db.rides.aggregate(pipeline))
+    except Exception as e:
+        return jsonify({"message": "Error searching rides", "error": str(e)}), 500
+
+@async_ride_bp.route('/ride/<ride_id>/availability', methods=['GET'])
+@async_token_required
+async def ride_availability(current_user, ride_id):
+    """Async GET /api/v1/ride/<ride_id>/availability."""
+    db = AsyncDatabase.get_db()
+    if db is None:
+        return jsonify({"message": "Database connection failed"}), 500
+
+    try:
+        ride = await db.rides.find_one({"_id": ObjectId(ride_id)}, AVAILABILITY_PROJECTION)
+    except InvalidId:
+        return jsonify({"message": "Invalid ride id"}), 400
+    except Exception as e:
+        return jsonify({"message": "Error checking availability", "error": str(e)}), 500
+    if not ride:
+        return jsonify({"message": "Ride not found"}), 404
+    return jsonify(availability_payload(ride)), 200
+
+@async_ride_bp.route('/my/joined-rides', methods=['GET'])
+@async_token_required
+async def my_joined_rides(current_user):
+    """Async GET /api/v1/my/joined-rides (first page, see first_page_limit)."""
+    db = AsyncDatabase.get_db()
+    if db is None:
+        return jsonify({"message": "Database connection failed"}), 500
+    try:
+        after, before = parse_time_window(request.args, upcoming_only=False)
+        limit = first_page_limit(request.args)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid parameters: {str(e)}"}), 400
+    query = joined_rides_query(str(current_user['_id']), after, before)
+    try:
+        cursor = db.rides.find(query, Ride.projection("card")).sort([("time", 1), ("_id", 1)]).limit(limit)
+        return await stream_array(cursor)
+    except Exception as e:
+        return jsonify({"message": "Error fetching joined rides", "error": str(e)}), 500
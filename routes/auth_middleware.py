@@ -1,34 +1,80 @@
 import jwt
 import datetime
+import time
 from functools import wraps
 from flask import request, jsonify, current_app
 from database import Database
+from config import Config
+from cache import TTLCache
 from bson import ObjectId
+import metrics
+
+# Only the fields route handlers read from current_user (never the password hash)
+PRINCIPAL_PROJECTION = {"name": 1, "email": 1, "gender": 1, "phone": 1}
+
+# In-process cache of authenticated users, keyed by user id string.
+# Saves a Mongo round trip on every protected call (dashboard polling etc).
+principal_cache = TTLCache(maxsize=Config.AUTH_CACHE_SIZE, ttl=Config.AUTH_CACHE_TTL)
+
+def load_principal(db, user_id):
+    """Returns the projected user document for 'user_id', cached."""
+    user = principal_cache.get(user_id)
+    if user is None:
+        user = db.users.find_one({"_id": ObjectId(user_id)}, PRINCIPAL_PROJECTION)
+        if user:
+            principal_cache.set(user_id, user)
+    return user
+
+@metrics.register_collector
+def _principal_cache_metrics():
+    stats = principal_cache.stats()
+    return [
+        ("principal_cache_hits", "token_required user lookups served from cache", stats["hits"]),
+        ("principal_cache_misses", "token_required user lookups that went to Mongo", stats["misses"]),
+        ("principal_cache_size", "Users currently cached", stats["size"]),
+    ]
+
+def invalidate_principal(user_id=None):
+    """Drop one cached user (after it changes) or the whole cache if no id given."""
+    if user_id is None:
+        principal_cache.clear()
+    else:
+        principal_cache.invalidate(str(user_id))
+
+def bearer_token(headers):
+    """Token from an 'Authorization: Bearer <token>' header, or None."""
+    auth_header = headers.get('Authorization', '')
+    if auth_header.startswith("Bearer "):
+        return auth_header.split(" ")[1]
+    return None
+
+def decode_user_id(token, secret_key):
+    """Validates the JWT and returns the user id it was issued for."""
+    return jwt.decode(token, secret_key, algorithms=["HS256"])['user_id']
 
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
         # Check for Authorization header: Bearer <token>
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if auth_header.startswith("Bearer "):
-                token = auth_header.split(" ")[1]
+        token = bearer_token(request.headers)
 
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
 
+        start = time.perf_counter()
         try:
-            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
+            user_id = decode_user_id(token, current_app.config['SECRET_KEY'])
             db = Database.get_db()
             if db is None:
                 return jsonify({"message": "Server database connection lost"}), 500
-            current_user = db.users.find_one({"_id": ObjectId(data['user_id'])})
+            current_user = load_principal(db, user_id)
             if not current_user:
                 raise Exception("User not found")
         except Exception as e:
             return jsonify({'message': 'Token is invalid!', 'error': str(e)}), 401
+        finally:
+            metrics.AUTH_LATENCY.observe(time.perf_counter() - start)
 
-        return f(current_user, *args, **kwargs)
+        return f(dict(current_user), *args, **kwargs)
 
     return decorated
@@ -0,0 +1,64 @@
+"""
+Streamed JSON arrays for the async (ASGI) ride routes.
+
+The Flask app does not stream its ride lists. Search, joined rides and my
+rides return keyset pages of at most MAX_PAGE_SIZE rows (routes/pagination.py),
+and the next-page token goes in a header that depends on the last row, so
+the page is read in full before the response starts. Nearby responses are
+cached as whole bodies for their ETag (routes/response_cache.py). Bounded
+pages are what keep those bodies small in sync mode.
+"""
+from config import Config
+from json_provider import encode_json
+
+# ObjectId -> str, datetime -> ISO string (same encoder as jsonify)
+_encode = encode_json
+
+async def aiter_json_array(cursor, batch_size=None):
+    """
+    Streams an async pymongo cursor (ASGI mode) as a JSON array, yielding
+    text chunks of 'batch_size' documents. The first chunk carries the
+    opening bracket *and* the first batch, so awaiting it runs the query.
+    """
+    batch_size = batch_size or Config.JSON_STREAM_BATCH_SIZE
+    if hasattr(cursor, "batch_size"):
+        cursor.batch_size(batch_size)
+
+    chunk = []
+    opened = False
+    async for doc in cursor:
+        chunk.append(_encode(doc))
+        if len(chunk) >= batch_size:
+            yield ("," if opened else "[") + ",".join(chunk)
+            opened = True
+            chunk = []
+    if not opened:
+        yield "[" + ",".join(chunk) + "]"
+    elif chunk:
+        yield "," + ",".join(chunk) + "]"
+    else:
+        yield "]"
+
+async def primed_json_array(cursor, batch_size=None):
+    """
+    Fetches the first batch before the response starts, so a failing query
+    raises in the route (which can still answer 500) instead of after a 200
+    has been sent. Returns an async iterator over the whole array.
+
+    A failure on a later batch can no longer change the status: it is logged
+    and re-raised, which aborts the chunked body so the client sees an
+    incomplete response rather than a silently truncated but valid array.
+    """
+    chunks = aiter_json_array(cursor, batch_size)
+    first = await chunks.__anext__()
+
+    async def rest():
+        yield first
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            print(f"JSON stream aborted mid-response: {str(e)}")
+            raise
+
+    return rest()
@@ -0,0 +1,107 @@
+"""
+Keyset (cursor) pagination for ride lists.
+
+Pages are sorted by (time, _id) - optionally preceded by a descending
+'relevance' for search - and the next page seeks past the last row with a
+range predicate instead of skip(), so page N costs the same as page 1.
+Cursor tokens are opaque URL-safe base64 of the last row's sort key.
+
+Every paged endpoint returns a plain JSON array and accepts ?limit= and
+?cursor=. When there is another page its token is in the X-Next-Cursor
+header, and a Link rel="next" header holds the full URL of that page.
+"""
+import base64
+import json
+from datetime import datetime
+from urllib.parse import quote
+from flask import jsonify, request
+from bson import ObjectId
+from bson.errors import InvalidId
+from models import parse_departure
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(doc, with_relevance=False):
+    """Token for the position right after 'doc'."""
+    key = {"t": doc["time"].isoformat(), "id": str(doc["_id"])}
+    if with_relevance:
+        key["r"] = doc.get("relevance", 0)
+    raw = json.dumps(key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token):
+    """Inverse of encode_cursor. Raises ValueError for malformed tokens."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        key = json.loads(raw)
+        # Values end up in seek_filter() as query values: never let an
+        # object (e.g. {"$gt": ...}) or a null through
+        if not isinstance(key, dict) or not isinstance(key.get("t"), str) or not key["t"]:
+            raise ValueError("cursor is not an object with a time")
+        relevance = key.get("r")
+        if relevance is not None and (isinstance(relevance, bool) or not isinstance(relevance, (int, float))):
+            raise ValueError("cursor relevance is not a number")
+        return {
+            "time": parse_departure(key["t"]),
+            "_id": ObjectId(key["id"]),
+            "relevance": relevance
+        }
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise ValueError("Invalid cursor")
+
+def parse_page_args(args):
+    """(limit, decoded cursor or None) from ?limit=&cursor=. Raises ValueError."""
+    limit = min(max(int(args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    token = args.get('cursor')
+    return limit, decode_cursor(token) if token else None
+
+def seek_filter(cursor, with_relevance=False, descending=False):
+    """
+    Rows strictly after 'cursor' in (relevance desc,) time asc, _id asc order,
+    or time desc, _id desc order when 'descending' (history lists).
+    """
+    if cursor is None:
+        return {}
+    past = "$lt" if descending else "$gt"
+    after_time = {"$or": [
+        {"time": {past: cursor["time"]}},
+        {"time": cursor["time"], "_id": {past: cursor["_id"]}}
+    ]}
+    if not with_relevance:
+        return after_time
+    return {"$or": [
+        {"relevance": {"$lt": cursor["relevance"]}},
+        {"$and": [{"relevance": cursor["relevance"]}, after_time]}
+    ]}
+
+def take_page(docs, limit, with_relevance=False):
+    """
+    Splits the 'limit' + 1 rows fetched for a page into (page, nextCursor).
+    nextCursor is None on the last page.
+
+    Rides whose time is still a legacy string (before 'maintenance.py
+    migrate-ride-times' has run) cannot be seeked past, so the cursor is taken
+    from the last row with a datetime time, and none is returned if the
+    page has no such row.
+    """
+    docs = list(docs)
+    if len(docs) <= limit:
+        return docs, None
+    page = docs[:limit]
+    last = next((doc for doc in reversed(page) if isinstance(doc.get("time"), datetime)), None)
+    return page, encode_cursor(last, with_relevance) if last is not None else None
+
+def page_response(docs, next_cursor):
+    """
+    JSON array response for one page. The next page's token goes in the
+    X-Next-Cursor header (and a Link rel="next"), keeping the body a plain list.
+    """
+    response = jsonify(docs)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        query = "&".join(f"{k}={quote(str(v))}" for k, v in args.items())
+        response.headers['Link'] = f'<{request.path}?{query}>; rel="next"'
+    return response, 200
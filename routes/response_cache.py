@@ -0,0 +1,75 @@
+"""
+Short-lived response caching with conditional GET support.
+
+Cached entries hold the encoded body plus an ETag and Last-Modified, so a
+repeat request costs no Mongo work and, when the client revalidates with
+If-None-Match / If-Modified-Since, no response bytes either (304).
+Ride writes invalidate the affected entries in this worker; the short
+TTLs bound staleness for writes handled by other workers.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from flask import Response, request
+from cache import TTLCache
+from config import Config
+from json_provider import encode_json, encode_json_bytes
+
+# Keyed by (quantized lat, quantized lng, dist, limit, minSeats, after, before)
+nearby_cache = TTLCache(maxsize=Config.RESPONSE_CACHE_SIZE, ttl=Config.NEARBY_CACHE_TTL)
+# Keyed by ride id
+availability_cache = TTLCache(maxsize=Config.RESPONSE_CACHE_SIZE, ttl=Config.AVAILABILITY_CACHE_TTL)
+
+def quantize(value, step=None):
+    """Snaps a coordinate to the center of its NEARBY_GRID_DEGREES cell."""
+    step = step or Config.NEARBY_GRID_DEGREES
+    return round((int(value // step) + 0.5) * step, 7)
+
+def _build_entry(payload):
+    body = encode_json_bytes(payload)
+    return {
+        "body": body,
+        "etag": '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"',
+        "lastModified": datetime.now(timezone.utc).replace(microsecond=0)
+    }
+
+def _not_modified(entry):
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        return entry["etag"] in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since:
+        try:
+            return entry["lastModified"] <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def cached_json(cache, key, producer):
+    """
+    Serves 'key' from 'cache', calling producer() -> (payload, status) on a miss.
+    Only 200 responses are cached. Answers 304 when the client's validators match.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        payload, status = producer()
+        if status != 200:
+            return Response(encode_json(payload), status=status, mimetype="application/json")
+        entry = _build_entry(payload)
+        cache.set(key, entry)
+
+    headers = {
+        "ETag": entry["etag"],
+        "Last-Modified": format_datetime(entry["lastModified"], usegmt=True),
+        # Clients may keep the body but must revalidate (cheap 304) before reuse
+        "Cache-Control": "no-cache"
+    }
+    if _not_modified(entry):
+        return Response(status=304, headers=headers)
+    return Response(entry["body"], status=200, mimetype="application/json", headers=headers)
+
+def invalidate_ride(ride_id=None):
+    """Drops cached responses a ride write may have changed."""
+    nearby_cache.clear()
+    if ride_id is not None:
+        availability_cache.invalidate(str(ride_id))
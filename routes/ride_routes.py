@@ -1,9 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from database import Database
-from models import Ride
+from models import Ride, Place, normalize_place, place_tokens, parse_departure
+from pymongo import UpdateOne, ReturnDocument
+from bson.errors import InvalidId
 from routes.auth_middleware import token_required
+from routes.pagination import parse_page_args, seek_filter, take_page, page_response
+from cache import RefreshingCache
+from config import Config
+from matching import rank_matches, bounding_polygon
+from geo_index import ride_index, covers as index_covers
+from geocoding import geocode, reverse_geocode, GeocoderUnavailable, GeocoderTimeout
+import events
+from routes.response_cache import cached_json, nearby_cache, availability_cache, quantize, invalidate_ride
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from functools import partial
+import time
+import re
 
 ride_bp = Blueprint('ride_bp', __name__)
 
@@ -34,189 +47,571 @@ def create_ride(current_user):
         )
         
         result = db.rides.insert_one(new_ride)
-        return jsonify({"message": "Ride created", "rideId": str(result.inserted_id)}), 201
         
     except KeyError as e:
         return jsonify({"message": f"Missing field: {str(e)}"}), 400
     except ValueError:
-        return jsonify({"message": "Invalid coordinates format"}), 400
+        return jsonify({"message": "Invalid coordinates or time format"}), 400
+
+    # The ride exists from here on, so derived data is best-effort: a 500 would
+    # make the client retry and create a duplicate ride
+    apply_derived_writes("create_ride", [
+        lambda: ride_index.upsert(new_ride),
+        invalidate_ride,
+        lambda: events.ride_created(new_ride),
+        lambda: record_places(db, new_ride['pickup'], new_ride['dropoff']),
+        lambda: bump_driver_stats(db, new_ride['driverId'], rides=1),
+        lambda: record_route(db, new_ride['pickup'], new_ride['dropoff'], new_ride['createdAt'])
+    ])
+    return jsonify({"message": "Ride created", "rideId": str(result.inserted_id)}), 201
+
+def apply_derived_writes(source, writes):
+    """
+    Runs each write, logging failures instead of raising. What they maintain
+    (places, driver_stats, route rollups) is rebuilt by the maintenance
+    commands rebuild-places / reconcile-driver-stats / rebuild-route-rollups,
+    and the geo index and caches catch up on their own refresh.
+    """
+    for write in writes:
+        try:
+            write()
+        except Exception as e:
+            print(f"{source}: derived write failed, left for maintenance: {str(e)}")
+
+
+# Fields the map / ride cards actually render for a nearby ride
+# Computed by the nearby pipeline on top of the requested view
+NEARBY_EXTRA_FIELDS = ("distance", "seatsAvailable", "matchScore")
+NEARBY_PROJECTION = Ride.projection("pin", NEARBY_EXTRA_FIELDS)
+
+def view_projection(args, default, extra=()):
+    """Projection for ?view=card|pin|detail (falls back to 'default'). Raises ValueError."""
+    return Ride.projection(args.get('view') or default, extra)
+
+NEARBY_DEFAULT_LIMIT = 50
+NEARBY_MAX_LIMIT = 200
+# Upper bound on ?dist= (meters); keeps the geo index scan and $geoNear bounded
+NEARBY_MAX_DIST = 50000
+
+def build_nearby_pipeline(lat, lng, max_dist, limit=NEARBY_DEFAULT_LIMIT, min_seats=1, after=None, before=None,
+                          projection=NEARBY_PROJECTION):
+    """
+    Builds the Smart Match $geoNear pipeline.
+    Scoring, filtering and top-K all happen inside MongoDB so only 'limit'
+    documents ever leave the server:
+    - Distance Score (Max 50 pts): 1.0 at 0m, 0.0 at max_dist.
+    - Seats Score (Max 50 pts): 10 points per available seat.
+    """
+    geo_near = {
+        "near": { "type": "Point", "coordinates": [lng, lat] },
+        # 'rides' has more than one 2dsphere index, so the stage must name its field
+        "key": "pickupCoords",
+        "distanceField": "distance", # Output field for distance in meters
+        "maxDistance": max_dist,
+        "spherical": True
+    }
+    # Time window and free seats are both answered by the
+    # (pickupCoords, time, seatsAvailable) index
+    query = time_filter(after, before)
+    if min_seats > 0:
+        query["seatsAvailable"] = { "$gte": min_seats }
+    if query:
+        geo_near["query"] = query
+
+    return [
+        { "$geoNear": geo_near },
+        { "$addFields": {
+            "matchScore": { "$toInt": { "$add": [
+                { "$multiply": [
+                    { "$max": [0, { "$divide": [{ "$subtract": [max_dist, "$distance"] }, max_dist] }] },
+                    50
+                ]},
+                { "$min": [{ "$multiply": ["$seatsAvailable", 10] }, 50] }
+            ]}}
+        }},
+        # Best matches first, closest first on ties
+        { "$sort": { "matchScore": -1, "distance": 1 } },
+        { "$limit": limit },
+        { "$project": projection }
+    ]
 
+def parse_time_window(args, upcoming_only=True):
+    """
+    Departure window from ?after=&before= (ISO 8601, naive = UTC).
+    'after' defaults to now when upcoming_only. Raises ValueError.
+    """
+    after = args.get('after')
+    before = args.get('before')
+    after = parse_departure(after) if after else (datetime.now(timezone.utc) if upcoming_only else None)
+    before = parse_departure(before) if before else None
+    return after, before
+
+def time_filter(after, before):
+    """{"time": {...}} clause for a departure window, or {} if unbounded."""
+    clause = {}
+    if after:
+        clause["$gte"] = after
+    if before:
+        clause["$lte"] = before
+    return {"time": clause} if clause else {}
+
+def parse_nearby_args(args):
+    """Parses and validates /rides/nearby query parameters. Raises ValueError/TypeError."""
+    lat = float(args.get('lat'))
+    lng = float(args.get('lng'))
+    max_dist = float(args.get('dist', 5000)) # default 5km
+    if not 0 < max_dist <= NEARBY_MAX_DIST:
+        raise ValueError(f"dist must be positive and at most {NEARBY_MAX_DIST}")
+    limit = min(max(int(args.get('limit', NEARBY_DEFAULT_LIMIT)), 1), NEARBY_MAX_LIMIT)
+    min_seats = max(int(args.get('minSeats', 1)), 0)
+    # Departure window; defaults to upcoming rides only
+    after, before = parse_time_window(args)
+    return {
+        "lat": lat, "lng": lng, "max_dist": max_dist, "limit": limit,
+        "min_seats": min_seats, "after": after, "before": before
+    }
 
 @ride_bp.route('/rides/nearby', methods=['GET'])
 def get_nearby_rides():
     """
     ADVANCED DB FEATURE: GeoSpatial Aggregation ($geoNear).
-    - Finds rides within 'max_dist'.
+    GET /api/v1/rides/nearby?lat=&lng=&dist=&limit=&minSeats=&after=&before=&view=pin
+    - Finds rides within 'dist' meters (default 5km).
     - Calculates a 'matchScore' (0-100) based on distance and availability.
     - "Smart Match Score": Closer + More Seats = Higher Score.
+    - Skips full rides (minSeats, default 1) and rides outside the departure window.
+    - Returns the top 'limit' matches (default 50, max 200).
+    - lat/lng are snapped to a NEARBY_GRID_DEGREES grid so map pans share a
+      short-lived cached response (ETag / Last-Modified, 304 on revalidation).
     """
-    db = Database.get_db()
+    db = Database.get_db(stale_ok=True)
     if db is None:
         return jsonify({"message": "Database connection failed"}), 500
     try:
-        lat = float(request.args.get('lat'))
-        lng = float(request.args.get('lng'))
-        max_dist = float(request.args.get('dist', 5000)) # default 5km
-        
-       
-        pipeline = [
-            {
-                "$geoNear": {
-                    "near": { "type": "Point", "coordinates": [lng, lat] },
-                    "distanceField": "distance", # Output field for distance in meters
-                    "maxDistance": max_dist,
-                    "spherical": True
-                }
-            }
-        ]
-        
-        rides = list(db.rides.aggregate(pipeline))
-        
-        # Calculate Smart Match Score in Python logic
-        for r in rides:
-            r['_id'] = str(r['_id'])
-            if 'createdAt' in r: r['createdAt'] = r['createdAt'].isoformat()
-            
-            # --- SCORING LOGIC ---
-            # 1. Distance Score (Max 50 pts): Closer is better
-            dist_val = r.get('distance', max_dist)
-            # Inverse normalized distance: 1.0 at 0m, 0.0 at max_dist
-            norm_dist = max(0, (max_dist - dist_val) / max_dist)
-            dist_score = norm_dist * 50
-            
-            # 2. Seats Score (Max 50 pts): More available seats is better
-            # Cap at 5 seats for max points to avoid skewing
-            passengers = r.get('passengers', [])
-            total_seats = int(r.get('seats', 0))
-            available = max(0, total_seats - len(passengers))
-            
-            # 10 points per seat, max 50
-            seat_score = min(available * 10, 50)
-            
-            # Total Score
-            r['matchScore'] = int(dist_score + seat_score)
-            
-        # Re-sort by matchScore descending (Best matches first)
-        rides.sort(key=lambda x: x['matchScore'], reverse=True)
-            
-        return jsonify(rides), 200
-        
+        params = parse_nearby_args(request.args)
+        projection = view_projection(request.args, "pin", NEARBY_EXTRA_FIELDS)
+    except (ValueError, TypeError) as e:
+        return jsonify({"message": f"Invalid parameters: {str(e)}"}), 400
+
+    params['lat'] = quantize(params['lat'])
+    params['lng'] = quantize(params['lng'])
+    key = (params['lat'], params['lng'], params['max_dist'], params['limit'], params['min_seats'],
+           request.args.get('after'), request.args.get('before'), request.args.get('view'))
+
+    def produce():
+        # The index keeps only INDEXED_FIELDS; wider views come from Mongo
+        if Config.GEO_INDEX_ENABLED and index_covers(projection):
+            if ride_index.needs_refresh():
+                ride_index.refresh_in_background(db)
+            rides = ride_index.nearby(**params)
+            if rides is not None:
+                return [Ride.apply_projection(r, projection) for r in rides], 200
+
+        # Index cold / stale / disabled: ask Mongo
+        try:
+            return list(db.rides.aggregate(build_nearby_pipeline(**params, projection=projection))), 200
+        except Exception as e:
+            return {"message": "Error fetching nearby rides", "error": str(e)}, 500
+
+    return cached_json(nearby_cache, key, produce)
+
+# Only what the join/cancel outcome logic needs back from Mongo
+# pickupCoords lets seat events reach region subscribers
+BOOKING_PROJECTION = {"driverId": 1, "passengers": 1, "seats": 1, "seatsAvailable": 1, "pickupCoords": 1}
+
+def join_filter(user_id):
+    """Query predicate: true if 'user_id' may take a seat on this ride."""
+    return {
+        "seatsAvailable": { "$gt": 0 },
+        "driverId": { "$ne": user_id },
+        "passengers": { "$ne": user_id }
+    }
+
+# Seat booking / release, applied atomically with the passengers change
+def join_update(user_id):
+    return {
+        "$push": { "passengers": user_id },
+        "$inc": { "seatsAvailable": -1 },
+        "$currentDate": { "updatedAt": True }
+    }
+
+def cancel_update(user_id):
+    return {
+        "$pull": { "passengers": user_id },
+        "$inc": { "seatsAvailable": 1 },
+        "$currentDate": { "updatedAt": True }
+    }
+
+def join_failure(ride, user_id):
+    """
+    Why 'user_id' could not join 'ride' (the document as the update saw it).
+    Returns (message, status) or None if the join is allowed.
+    """
+    if not ride:
+        return "Ride not found", 404
+    # We added application-level constraints to prevent logical misuse.
+    if ride['driverId'] == user_id:
+        return "Driver cannot join their own ride", 400
+    if user_id in ride.get('passengers', []):
+        return "You already joined this ride", 400
+    if ride.get('seatsAvailable', 0) <= 0:
+        return "Ride is full", 400
+    return None
+
+def cancel_failure(ride, user_id):
+    """Why 'user_id' could not leave 'ride'. Returns (message, status) or None."""
+    if not ride:
+        return "Ride not found", 404
+    if user_id not in ride.get('passengers', []):
+        return "You are not a passenger in this ride", 400
+    return None
+
+MATCH_DEFAULT_LIMIT = 10
+# Upper bound on candidates pulled from Mongo before vectorized ranking
+MATCH_MAX_CANDIDATES = 2000
+MATCH_PROJECTION = {
+    "driverId": 1, "pickup": 1, "dropoff": 1, "pickupCoords": 1, "dropoffCoords": 1,
+    "time": 1, "seats": 1, "passengers": 1, "seatsAvailable": 1
+}
+
+def build_match_pipeline(origin, destination, pickup_radius, dropoff_radius, min_seats=1, after=None, before=None):
+    """Candidate prefilter for /rides/match: pickup $geoNear + dropoff box + time window."""
+    query = {
+        "dropoffCoords": { "$geoWithin": { "$geometry": bounding_polygon(*destination, dropoff_radius) } },
+        **time_filter(after, before)
+    }
+    if min_seats > 0:
+        query["seatsAvailable"] = { "$gte": min_seats }
+    return [
+        { "$geoNear": {
+            "near": { "type": "Point", "coordinates": list(origin) },
+            "key": "pickupCoords",
+            "distanceField": "distance",
+            "maxDistance": pickup_radius,
+            "spherical": True,
+            "query": query
+        }},
+        { "$limit": MATCH_MAX_CANDIDATES },
+        { "$project": MATCH_PROJECTION }
+    ]
+
+@ride_bp.route('/rides/match', methods=['GET'])
+def match_rides():
+    """
+    TWO-SIDED ROUTE MATCHING
+    GET /api/v1/rides/match?originLat=&originLng=&destLat=&destLng=
+        &pickupRadius=2000&dropoffRadius=3000&limit=10&minSeats=1&after=&before=
+    - Prefilter in Mongo: $geoNear on pickupCoords (2dsphere) within pickupRadius,
+      dropoffCoords inside the destination bounding box, seats and departure window.
+    - Rank with NumPy: pickup + dropoff closeness, detour estimate for the driver.
+    - Returns the top 'limit' rides with pickupDistance, dropoffDistance,
+      detourMeters and matchScore.
+    """
+    db = Database.get_db(stale_ok=True)
+    if db is None:
+        return jsonify({"message": "Database connection failed"}), 500
+    try:
+        origin = (float(request.args.get('originLng')), float(request.args.get('originLat')))
+        destination = (float(request.args.get('destLng')), float(request.args.get('destLat')))
+        pickup_radius = float(request.args.get('pickupRadius', 2000))
+        dropoff_radius = float(request.args.get('dropoffRadius', 3000))
+        if pickup_radius <= 0 or dropoff_radius <= 0:
+            raise ValueError("radius must be positive")
+        limit = min(max(int(request.args.get('limit', MATCH_DEFAULT_LIMIT)), 1), NEARBY_MAX_LIMIT)
+        min_seats = max(int(request.args.get('minSeats', 1)), 0)
+        after, before = parse_time_window(request.args)
     except (ValueError, TypeError) as e:
         return jsonify({"message": f"Invalid parameters: {str(e)}"}), 400
 
+    pipeline = build_match_pipeline(origin, destination, pickup_radius, dropoff_radius, min_seats, after, before)
+    try:
+        candidates = list(db.rides.aggregate(pipeline))
+    except Exception as e:
+        return jsonify({"message": "Error matching rides", "error": str(e)}), 500
+    matches = rank_matches(candidates, origin, destination, pickup_radius, dropoff_radius, limit)
+    return jsonify(matches), 200
+
 @ride_bp.route('/ride/request/<ride_id>', methods=['POST'])
 @token_required
 def join_ride(current_user, ride_id):
     """
-    ADVANCED DB FEATURE: using $push to add a passenger.
-    Uses atomic update with $expr to ensure concurrency safety.
+    ADVANCED DB FEATURE: atomic conditional $push in ONE round trip.
+    - find_one_and_update whose filter is the join guard (seat free, not the
+      driver, not joined) and whose update pushes the passenger and
+      decrements 'seatsAvailable' together.
+    - Only a refused join costs a second read, to say why (404 / driver /
+      already joined / full).
     """
     db = Database.get_db()
     if db is None:
         return jsonify({"message": "Database connection failed"}), 500
     user_id = str(current_user['_id'])
-    
-    # Check if ride exists (for 404)
-    ride = db.rides.find_one({"_id": ObjectId(ride_id)})
-    if not ride:
-        return jsonify({"message": "Ride not found"}), 404
 
-    # We added application-level constraints to prevent logical misuse.
-    if ride['driverId'] == user_id:
-        return jsonify({"message": "Driver cannot join their own ride"}), 400
-
-    # Atomic Update combining:
-    # 1. Not already joined ($ne)
-    # 2. Capacity check ($expr $lt $size)
-    result = db.rides.update_one(
-        {
-            "_id": ObjectId(ride_id),
-            "passengers": { "$ne": user_id },
-            "$expr": { "$lt": [{ "$size": "$passengers" }, "$seats"] }
-        },
-        {"$push": {"passengers": user_id}}
+    try:
+        ride_oid = ObjectId(ride_id)
+    except InvalidId:
+        return jsonify({"message": "Invalid ride id"}), 400
+
+    ride = db.rides.find_one_and_update(
+        {"_id": ride_oid, **join_filter(user_id)},
+        join_update(user_id),
+        projection=BOOKING_PROJECTION,
+        return_document=ReturnDocument.BEFORE
     )
-    
-    if result.modified_count > 0:
-        return jsonify({"message": "Successfully joined ride"}), 200
-    
-    # If update failed, determine why for better UX
-    # (Since we know ride exists and driver check passed)
-    if user_id in ride.get('passengers', []):
-        return jsonify({"message": "You already joined this ride"}), 400
-    
-    # If we are here, it likely means the ride is full (or became full just now)
-    # Re-fetch or just assume full if concurrency high
-    updated_ride = db.rides.find_one({"_id": ObjectId(ride_id)})
-    if len(updated_ride.get('passengers', [])) >= updated_ride['seats']:
-        return jsonify({"message": "Ride is full"}), 400
-        
-    return jsonify({"message": "Join failed"}), 400
+
+    if ride is None:
+        current = db.rides.find_one({"_id": ride_oid}, BOOKING_PROJECTION)
+        message, status = join_failure(current, user_id) or ("Booking changed concurrently, please retry", 409)
+        return jsonify({"message": message}), status
+
+    # The seat is taken: a 500 now would make the retry fail with "already joined"
+    apply_derived_writes("join_ride", [
+        lambda: bump_driver_stats(db, ride['driverId'], passengers=1),
+        lambda: ride_index.add_passenger(ride_id, user_id),
+        lambda: invalidate_ride(ride_id),
+        lambda: events.seats_changed(ride, len(ride['passengers']) + 1)
+    ])
+    return jsonify({"message": "Successfully joined ride"}), 200
 
 
 # ==========================================
 # NEW API ENDPOINTS (v1) - Advanced Features
 # ==========================================
 
+# Max words of a search query we turn into index predicates
+SEARCH_MAX_TOKENS = 5
+SEARCH_LIMIT = 50
+# Matches ranked per search: the earliest-departing ones. Fixed (not a
+# multiple of ?limit=) so every page of a search ranks the same candidates.
+SEARCH_MAX_CANDIDATES = 1000
+AUTOCOMPLETE_LIMIT = 10
+
+def record_places(db, *names):
+    """Upserts the autocomplete 'places' entries used by a new ride."""
+    ops = []
+    for name in names:
+        place = Place.create_schema(name)
+        if not place["_id"]:
+            continue
+        ops.append(UpdateOne(
+            {"_id": place["_id"]},
+            {"$setOnInsert": {"name": place["name"], "tokens": place["tokens"]}, "$inc": {"rideCount": 1}},
+            upsert=True
+        ))
+    if ops:
+        db.places.bulk_write(ops, ordered=False)
+
+def token_prefix_filter(text):
+    """
+    {"$all": [/^tok1/, /^tok2/]} over a multikey token field.
+    Anchored and escaped, so it can use the index and user input is never a regex.
+    Returns None if the text has no searchable words.
+    """
+    tokens = place_tokens(text)[:SEARCH_MAX_TOKENS]
+    if not tokens:
+        return None
+    return {"$all": [re.compile("^" + re.escape(t)) for t in tokens]}
+
+def relevance_expr(field, query):
+    """3 = exact name, 2 = name starts with query, 1 = word-prefix match only."""
+    norm = normalize_place(query)
+    return {
+        "$cond": [{ "$eq": [f"${field}Norm", norm] }, 3,
+            { "$cond": [{ "$eq": [{ "$indexOfCP": [{ "$ifNull": [f"${field}Norm", ""] }, norm] }, 0] }, 2, 1] }]
+    }
+
+def build_search_pipeline(pickup_query, dropoff_query, limit=SEARCH_LIMIT, after=None, before=None,
+                          projection=None, cursor=None):
+    """
+    Builds the indexed, relevance-ranked place search. Returns None if nothing can match.
+    Order is (relevance desc, time, _id); 'cursor' seeks past a previous page.
+    Only the SEARCH_MAX_CANDIDATES earliest matches are ranked: relevance is
+    computed, so ranking every match of a short prefix ("ca") would fetch and
+    sort most of the collection. The leading $match/$sort/$limit runs as an
+    indexed query (time index walked in order, or tokens index + top-k sort,
+    whichever the planner finds cheaper for the prefix).
+    """
+    match = time_filter(after, before)
+    score_parts = []
+    for field, text in (("pickup", pickup_query), ("dropoff", dropoff_query)):
+        if not text:
+            continue
+        prefix = token_prefix_filter(text)
+        if prefix is None:
+            return None
+        match[f"{field}Tokens"] = prefix
+        score_parts.append(relevance_expr(field, text))
+
+    pipeline = [
+        { "$match": match },
+        { "$sort": { "time": 1, "_id": 1 } },
+        { "$limit": SEARCH_MAX_CANDIDATES },
+        { "$addFields": { "relevance": { "$add": score_parts } } }
+    ]
+    if cursor is not None:
+        pipeline.append({ "$match": seek_filter(cursor, with_relevance=True) })
+    pipeline += [
+        { "$sort": { "relevance": -1, "time": 1, "_id": 1 } },
+        { "$limit": limit }
+    ]
+    pipeline.append({ "$project": projection or Ride.projection("card", ("relevance",)) })
+    return pipeline
+
 @ride_bp.route('/rides/search', methods=['GET'])
 @token_required
 def search_rides_v1(current_user):
     """
     1) SEARCH RIDES
-    GET /api/v1/rides/search?from=<pickup>&to=<dropoff>
-    - Filters rides using the compound index on 'pickup' and 'dropoff' (text regex).
-    - Returns JSON list of matches.
+    GET /api/v1/rides/search?from=<pickup>&to=<dropoff>&after=&before=&view=card&limit=50&cursor=
+    - Matches word prefixes of pickup/dropoff against indexed lowercase tokens
+      (e.g. "uni lib" matches "University Library").
+    - Ranks exact name > name prefix > word prefix, then earliest departure,
+      over the SEARCH_MAX_CANDIDATES earliest-departing matches.
+    - Input is escaped, never interpreted as a regex.
+    - Upcoming rides only unless 'after' says otherwise.
+    - Returns one page of matches (default 50, max 200); the next page's
+      cursor is in the X-Next-Cursor header.
     """
-    db = Database.get_db()
+    db = Database.get_db(stale_ok=True)
     if db is None:
         return jsonify({"message": "Database connection failed"}), 500
     pickup_query = request.args.get('from')
     dropoff_query = request.args.get('to')
+    try:
+        after, before = parse_time_window(request.args)
+        projection = view_projection(request.args, "card", ("relevance",))
+        limit, cursor = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid parameters: {str(e)}"}), 400
 
-    # Build query
-    query = {}
-    if pickup_query:
-        # Case-insensitive regex search
-        query['pickup'] = {"$regex": pickup_query, "$options": "i"}
-    if dropoff_query:
-        query['dropoff'] = {"$regex": dropoff_query, "$options": "i"}
+    pipeline = build_search_pipeline(pickup_query, dropoff_query, limit=limit + 1, after=after, before=before,
+                                     projection=projection, cursor=cursor)
+    if pipeline is None:
+        return jsonify([]), 200
 
     try:
-        # Use projection to limit fields if necessary, here we return full objects
-        rides = list(db.rides.find(query).limit(50))
-        
-        # Serialize ObjectId and datetime
-        for r in rides:
-            r['_id'] = str(r['_id'])
-            if 'createdAt' in r: r['createdAt'] = r['createdAt'].isoformat()
-            
-        return jsonify(rides), 200
+        return page_response(*take_page(db.rides.aggregate(pipeline), limit, with_relevance=True))
     except Exception as e:
         return jsonify({"message": "Error searching rides", "error": str(e)}), 500
 
+@ride_bp.route('/places/autocomplete', methods=['GET'])
+@token_required
+def autocomplete_places(current_user):
+    """
+    GET /api/v1/places/autocomplete?q=<text>&limit=<n>
+    - Suggests known pickup/dropoff names whose words start with the typed text.
+    - Most used places first.
+    """
+    db = Database.get_db(stale_ok=True)
+    if db is None:
+        return jsonify({"message": "Database connection failed"}), 500
+
+    prefix = token_prefix_filter(request.args.get('q', ''))
+    if prefix is None:
+        return jsonify([]), 200
+    try:
+        limit = min(max(int(request.args.get('limit', AUTOCOMPLETE_LIMIT)), 1), 50)
+    except ValueError:
+        return jsonify({"message": "Invalid limit"}), 400
+
+    places = db.places.find(
+        {"tokens": prefix},
+        {"_id": 0, "name": 1, "rideCount": 1}
+    ).sort("rideCount", -1).limit(limit)
+    return jsonify(list(places)), 200
+
+GEOCODE_MAX_RESULTS = 10
+
+def geocode_response(payload):
+    """JSON response browsers may reuse for a day (answers rarely change)."""
+    response = jsonify(payload)
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response, 200
+
+@ride_bp.route('/geocode', methods=['GET'])
+@token_required
+def geocode_place(current_user):
+    """
+    GET /api/v1/geocode?q=<text>&limit=5
+    - Forward geocoding proxy: [{name, displayName, lat, lng}, ...], best first.
+    - Served from the in-process / Mongo geocode caches when possible.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"message": "Missing parameter: 'q'"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 5)), 1), GEOCODE_MAX_RESULTS)
+    except ValueError:
+        return jsonify({"message": "Invalid limit"}), 400
+
+    try:
+        return geocode_response(geocode(query, limit))
+    except GeocoderTimeout as e:
+        return jsonify({"message": "Geocoding service timed out", "error": str(e)}), 504
+    except GeocoderUnavailable as e:
+        return jsonify({"message": "Geocoding service unavailable", "error": str(e)}), 502
+
+@ride_bp.route('/reverse-geocode', methods=['GET'])
+@token_required
+def reverse_geocode_point(current_user):
+    """
+    GET /api/v1/reverse-geocode?lat=&lng=
+    - Reverse geocoding proxy: {displayName, lat, lng} (404 if nothing there).
+    - Coordinates are snapped to GEOCODE_REVERSE_DEGREES before lookup.
+    """
+    try:
+        lat = float(request.args.get('lat'))
+        lng = float(request.args.get('lng'))
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError("coordinates out of range")
+    except (ValueError, TypeError) as e:
+        return jsonify({"message": f"Invalid parameters: {str(e)}"}), 400
+
+    try:
+        place = reverse_geocode(lat, lng)
+    except GeocoderTimeout as e:
+        return jsonify({"message": "Geocoding service timed out", "error": str(e)}), 504
+    except GeocoderUnavailable as e:
+        return jsonify({"message": "Geocoding service unavailable", "error": str(e)}), 502
+    if place is None:
+        return jsonify({"message": "No address found"}), 404
+    return geocode_response(place)
+
+def joined_rides_query(user_id, after=None, before=None, cursor=None):
+    """
+    Rides where 'passengers' array contains 'user_id', optionally in a departure
+    window and after a pagination cursor. Sort by (time, _id).
+    """
+    query = {"passengers": user_id, **time_filter(after, before)}
+    seek = seek_filter(cursor)
+    return {"$and": [query, seek]} if seek else query
+
 @ride_bp.route('/my/joined-rides', methods=['GET'])
 @token_required
 def my_joined_rides(current_user):
     """
     2) MY JOINED RIDES
-    GET /api/v1/my/joined-rides
+    GET /api/v1/my/joined-rides?after=&before=&view=card&limit=50&cursor=
     - Finds rides where the current user's ID is in the 'passengers' array.
     - Demonstrates array querying in MongoDB.
+    - Keyset-paginated on (time, _id); next page cursor in X-Next-Cursor.
     """
     db = Database.get_db()
     if db is None:
         return jsonify({"message": "Database connection failed"}), 500
     user_id = str(current_user['_id'])
+    try:
+        after, before = parse_time_window(request.args, upcoming_only=False)
+        projection = view_projection(request.args, "card")
+        limit, cursor = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid parameters: {str(e)}"}), 400
 
     try:
         # Query: find docs where 'passengers' array contains 'user_id'
-        rides = list(db.rides.find({"passengers": user_id}))
-        
-        for r in rides:
-            r['_id'] = str(r['_id'])
-            if 'createdAt' in r: r['createdAt'] = r['createdAt'].isoformat()
-
-        return jsonify(rides), 200
+        rides = db.rides.find(joined_rides_query(user_id, after, before, cursor), projection) \
+            .sort([("time", 1), ("_id", 1)]).limit(limit + 1)
+        return page_response(*take_page(rides, limit))
     except Exception as e:
         return jsonify({"message": "Error fetching joined rides", "error": str(e)}), 500
 
@@ -226,8 +621,10 @@ def cancel_ride_request(current_user, ride_id):
     """
     3) CANCEL RIDE REQUEST
     POST /api/v1/ride/cancel/<ride_id>
-    - Removes the user from the 'passengers' array using $pull.
-    - Ensures atomicity.
+    - Removes the user from the 'passengers' array using $pull and gives
+      the seat back to 'seatsAvailable' in the same atomic update.
+    - The filter requires the user to be a passenger, so the counter never
+      drifts; only a refused cancel costs a second read, to say why.
     """
     db = Database.get_db()
     if db is None:
@@ -235,82 +632,200 @@ def cancel_ride_request(current_user, ride_id):
     user_id = str(current_user['_id'])
 
     try:
-        # Check if ride exists
-        ride = db.rides.find_one({"_id": ObjectId(ride_id)})
-        if not ride:
-            return jsonify({"message": "Ride not found"}), 404
-        
-        # Check if user is actually a passenger
-        if user_id not in ride.get('passengers', []):
-            return jsonify({"message": "You are not a passenger in this ride"}), 400
-
-        # Atomic Update: $pull
-        # Removes all instances of user_id from the passengers array
-        result = db.rides.update_one(
-            {"_id": ObjectId(ride_id)},
-            {"$pull": {"passengers": user_id}}
+        ride_oid = ObjectId(ride_id)
+        ride = db.rides.find_one_and_update(
+            {"_id": ride_oid, "passengers": user_id},
+            cancel_update(user_id),
+            projection=BOOKING_PROJECTION,
+            return_document=ReturnDocument.BEFORE
         )
 
-        if result.modified_count > 0:
-            return jsonify({"message": "Successfully cancelled ride request"}), 200
-        else:
-            return jsonify({"message": "Cancellation failed"}), 500
-
+        if ride is None:
+            current = db.rides.find_one({"_id": ride_oid}, BOOKING_PROJECTION)
+            message, status = cancel_failure(current, user_id) or ("Booking changed concurrently, please retry", 409)
+            return jsonify({"message": message}), status
     except Exception as e:
         return jsonify({"message": "Error cancelling ride", "error": str(e)}), 500
 
-@ride_bp.route('/driver/stats', methods=['GET'])
+    # The seat is released: report success even if derived data lags behind
+    apply_derived_writes("cancel_ride_request", [
+        lambda: bump_driver_stats(db, ride['driverId'], passengers=-1),
+        lambda: ride_index.remove_passenger(ride_id, user_id),
+        lambda: invalidate_ride(ride_id),
+        lambda: events.seats_changed(ride, len(ride['passengers']) - 1)
+    ])
+    return jsonify({"message": "Successfully cancelled ride request"}), 200
+
+BATCH_BOOKING_MAX_OPS = 50
+
+@ride_bp.route('/rides/batch-booking', methods=['POST'])
 @token_required
-def driver_stats_v1(current_user):
+def batch_booking(current_user):
     """
-    4) DRIVER STATISTICS (AGGREGATION)
-    GET /api/v1/driver/stats
-    - Calculates stats for the LOGGED-IN driver.
-    - Uses MongoDB Aggregation Pipeline: $match, $project (size), $group.
+    BATCH JOIN / CANCEL
+    POST /api/v1/rides/batch-booking
+    Body: { "operations": [ { "action": "join" | "cancel", "rideId": "<id>" }, ... ] }
+    - Applies many joins/cancels for the logged-in user in one bulk_write.
+    - Round trips: one read of all rides, one bulk_write, plus one re-read
+      only if a concurrent booking made some conditional update miss.
+    - Returns one result per operation, in request order.
     """
     db = Database.get_db()
     if db is None:
         return jsonify({"message": "Database connection failed"}), 500
-    driver_id = str(current_user['_id'])
+    user_id = str(current_user['_id'])
 
-    pipeline = [
-        # 1. Match rides created by this driver
-        { "$match": { "driverId": driver_id } },
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"message": "Missing field: 'operations'"}), 400
+    if len(operations) > BATCH_BOOKING_MAX_OPS:
+        return jsonify({"message": f"At most {BATCH_BOOKING_MAX_OPS} operations per batch"}), 400
+
+    parsed = []
+    for op in operations:
+        try:
+            action = op['action']
+            if action not in ('join', 'cancel'):
+                raise ValueError(action)
+            parsed.append((action, ObjectId(op['rideId'])))
+        except (KeyError, TypeError, ValueError, InvalidId):
+            return jsonify({"message": f"Invalid operation: {op}"}), 400
+
+    rides = {
+        r['_id']: r for r in
+        db.rides.find({"_id": {"$in": list({oid for _, oid in parsed})}}, BOOKING_PROJECTION)
+    }
+
+    results = [None] * len(parsed)
+    writes, pending, seen = [], [], set()
+    for i, (action, oid) in enumerate(parsed):
+        if (action, oid) in seen:
+            results[i] = {"message": "Duplicate operation", "status": 400}
+            continue
+        seen.add((action, oid))
+
+        ride = rides.get(oid)
+        failure = join_failure(ride, user_id) if action == 'join' else cancel_failure(ride, user_id)
+        if failure:
+            results[i] = {"message": failure[0], "status": failure[1]}
+            continue
+
+        if action == 'join':
+            writes.append(UpdateOne({"_id": oid, **join_filter(user_id)}, join_update(user_id)))
+        else:
+            writes.append(UpdateOne({"_id": oid, "passengers": user_id}, cancel_update(user_id)))
+        pending.append(i)
+
+    if writes:
+        result = db.rides.bulk_write(writes, ordered=False)
+        after = None
+        if result.modified_count < len(writes):
+            # Some guard lost a race; re-read once to see which
+            after = {
+                r['_id']: r for r in
+                db.rides.find({"_id": {"$in": [parsed[i][1] for i in pending]}}, BOOKING_PROJECTION)
+            }
 
-        # 2. Project existing fields plus the count of passengers
-        { "$project": {
-            "seats": 1,
-            "passengerCount": { "$size": "$passengers" }
-        }},
+        deltas, counts, derived = {}, {}, []
+        for i in pending:
+            action, oid = parsed[i]
+            ride = rides[oid]
+            if after is not None:
+                now = after.get(oid) or {}
+                joined = user_id in now.get('passengers', [])
+                if joined != (action == 'join'):
+                    failure = join_failure(now, user_id) if action == 'join' else cancel_failure(now, user_id)
+                    message, status = failure or ("Booking changed concurrently, please retry", 409)
+                    results[i] = {"message": message, "status": status}
+                    continue
+            deltas[ride['driverId']] = deltas.get(ride['driverId'], 0) + (1 if action == 'join' else -1)
+            counts[oid] = counts.get(oid, len(ride['passengers'])) + (1 if action == 'join' else -1)
+            if action == 'join':
+                derived.append(partial(ride_index.add_passenger, oid, user_id))
+            else:
+                derived.append(partial(ride_index.remove_passenger, oid, user_id))
+            derived.append(partial(invalidate_ride, oid))
+            results[i] = {
+                "message": "Successfully joined ride" if action == 'join' else "Successfully cancelled ride request",
+                "status": 200
+            }
+        derived.append(partial(bump_driver_stats_bulk, db, deltas))
+        derived.extend(partial(events.seats_changed, rides[oid], count) for oid, count in counts.items())
+        # The bookings are committed; per-op results must not turn into a 500
+        apply_derived_writes("batch_booking", derived)
 
-        # 3. Group to calculate totals and averages
-        { "$group": {
-            "_id": "$driverId", # or null since we matched one driver
-            "totalRidesOffered": { "$sum": 1 },
-            "totalPassengersCarried": { "$sum": "$passengerCount" },
-            "averagePassengersPerRide": { "$avg": "$passengerCount" }
-        }}
+    return jsonify([
+        {"action": action, "rideId": str(oid), **res} for (action, oid), res in zip(parsed, results)
+    ]), 200
+
+def bump_driver_stats(db, driver_id, rides=0, passengers=0):
+    """
+    Atomically adjusts the driver's running counters in 'driver_stats'.
+    Called from every write path that changes them (create / join / cancel);
+    maintenance.py 'reconcile-driver-stats' rebuilds them from rides.
+    """
+    db.driver_stats.update_one(
+        {"_id": str(driver_id)},
+        {"$inc": {"totalRidesOffered": rides, "totalPassengersCarried": passengers}},
+        upsert=True
+    )
+
+def bump_driver_stats_bulk(db, passenger_deltas):
+    """Applies {driverId: passengerDelta} counter changes in one bulk_write."""
+    ops = [
+        UpdateOne({"_id": str(driver_id)}, {"$inc": {"totalPassengersCarried": delta}}, upsert=True)
+        for driver_id, delta in passenger_deltas.items() if delta
     ]
+    if ops:
+        db.driver_stats.bulk_write(ops, ordered=False)
+
+@ride_bp.route('/driver/stats', methods=['GET'])
+@token_required
+def driver_stats_v1(current_user):
+    """
+    4) DRIVER STATISTICS
+    GET /api/v1/driver/stats
+    - Stats for the LOGGED-IN driver.
+    - Single _id point read of the incrementally maintained 'driver_stats' counters.
+    """
+    db = Database.get_db()
+    if db is None:
+        return jsonify({"message": "Database connection failed"}), 500
+    driver_id = str(current_user['_id'])
 
     try:
-        stats = list(db.rides.aggregate(pipeline))
-        
-        if not stats:
-            return jsonify({
-                "totalRidesOffered": 0,
-                "totalPassengersCarried": 0,
-                "averagePassengersPerRide": 0
-            }), 200
-
-        result = stats[0]
-        # Cleanup _id from result if present
-        if "_id" in result: del result["_id"]
-        
-        return jsonify(result), 200
+        stats = db.driver_stats.find_one({"_id": driver_id}) or {}
+        offered = stats.get("totalRidesOffered", 0)
+        carried = stats.get("totalPassengersCarried", 0)
+
+        return jsonify({
+            "totalRidesOffered": offered,
+            "totalPassengersCarried": carried,
+            "averagePassengersPerRide": carried / offered if offered else 0
+        }), 200
 
     except Exception as e:
         return jsonify({"message": "Error calculating stats", "error": str(e)}), 500
 
+AVAILABILITY_PROJECTION = {"seats": 1, "seatsAvailable": 1}
+
+def availability_payload(ride):
+    """Seat summary for one ride, from the denormalized 'seatsAvailable'."""
+    total_seats = ride.get('seats', 0)
+    remaining = ride.get('seatsAvailable', 0)
+    taken_seats = total_seats - remaining
+
+    status = "Available" if remaining > 0 else "Full"
+
+    return {
+        "rideId": str(ride['_id']),
+        "totalSeats": total_seats,
+        "seatsTaken": taken_seats,
+        "remainingSeats": remaining,
+        "status": status
+    }
+
 @ride_bp.route('/ride/<ride_id>/availability', methods=['GET'])
 @token_required
 def ride_availability(current_user, ride_id):
@@ -318,60 +833,170 @@ def ride_availability(current_user, ride_id):
     5) RIDE AVAILABILITY
     GET /api/v1/ride/<ride_id>/availability
     - Returns remaining seats and status.
-    - Logic: seats - length(passengers).
+    - Reads 'seatsAvailable' instead of the passengers array.
+    - Briefly cached per ride with ETag / Last-Modified so polling gets 304s.
     """
     db = Database.get_db()
     if db is None:
         return jsonify({"message": "Database connection failed"}), 500
-
     try:
-        ride = db.rides.find_one({"_id": ObjectId(ride_id)})
-        if not ride:
-            return jsonify({"message": "Ride not found"}), 404
+        ride_oid = ObjectId(ride_id)
+    except InvalidId:
+        return jsonify({"message": "Invalid ride id"}), 400
+
+    def produce():
+        try:
+            ride = db.rides.find_one({"_id": ride_oid}, AVAILABILITY_PROJECTION)
+            if not ride:
+                return {"message": "Ride not found"}, 404
+            return availability_payload(ride), 200
+        except Exception as e:
+            return {"message": "Error checking availability", "error": str(e)}, 500
+
+    return cached_json(availability_cache, ride_id, produce)
+
+def parse_bbox(value):
+    """'minLng,minLat,maxLng,maxLat' -> tuple of floats. Raises ValueError."""
+    parts = [float(p) for p in value.split(',')]
+    if len(parts) != 4 or parts[0] > parts[2] or parts[1] > parts[3]:
+        raise ValueError("bbox must be minLng,minLat,maxLng,maxLat")
+    return tuple(parts)
+
+@ride_bp.route('/events/rides', methods=['GET'])
+@token_required
+def ride_events(current_user):
+    """
+    LIVE RIDE EVENTS (Server-Sent Events)
+    GET /api/v1/events/rides?rides=<id>,<id>&bbox=minLng,minLat,maxLng,maxLat
+    - Replaces polling /ride/<id>/availability and /rides/nearby.
+    - 'seats' events: {rideId, seats, seatsTaken, seatsAvailable} for the
+      listed rides and for rides picked up inside the box.
+    - 'ride' events: rides created inside the box.
+    - Comment heartbeats every EVENTS_HEARTBEAT seconds; the stream ends after
+      EVENTS_MAX_STREAM_SECONDS (or if the client falls behind) and the
+      client reconnects.
+    - Each stream holds a worker thread under gthread, so a worker accepts at
+      most EVENTS_MAX_SUBSCRIBERS streams (WEB_THREADS less the threads kept
+      for the API, unless running gevent) and answers 503 + Retry-After
+      beyond that.
+    """
+    try:
+        ride_ids = [r for r in request.args.get('rides', '').split(',') if r]
+        if len(ride_ids) > Config.EVENTS_MAX_RIDE_IDS:
+            raise ValueError(f"at most {Config.EVENTS_MAX_RIDE_IDS} ride ids")
+        ride_ids = [str(ObjectId(r)) for r in ride_ids]
+        bbox = parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+        subscription = events.hub.subscribe(ride_ids, bbox)
+    except (ValueError, InvalidId) as e:
+        return jsonify({"message": f"Invalid parameters: {str(e)}"}), 400
+    except OverflowError:
+        response = jsonify({"message": "Too many live connections, please retry shortly"})
+        response.headers['Retry-After'] = str(int(Config.EVENTS_HEARTBEAT))
+        return response, 503
+
+    events.start_change_feed(Database.get_db)
+
+    def generate():
+        deadline = time.monotonic() + Config.EVENTS_MAX_STREAM_SECONDS
+        try:
+            yield "retry: 3000\n: connected\n\n"
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                frame = subscription.next(min(Config.EVENTS_HEARTBEAT, remaining))
+                if frame is not None:
+                    yield frame
+                elif subscription.closed:
+                    break
+                else:
+                    yield ": ping\n\n"
+        finally:
+            events.hub.unsubscribe(subscription)
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    # The generator's finally never runs if the body is not iterated
+    # (HEAD, or the client left before the first byte)
+    response.call_on_close(lambda: events.hub.unsubscribe(subscription))
+    return response
+
+# Rolling windows served by /analytics/popular-routes (None = all time)
+ROUTE_WINDOWS = {
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "all": None
+}
+
+routes_cache = RefreshingCache(refresh_after=Config.ROUTES_CACHE_REFRESH, ttl=Config.ROUTES_CACHE_TTL)
+
+def route_bucket(when):
+    """Hourly bucket (aware UTC, truncated) a ride is counted in. Naive values are taken as UTC."""
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+def record_route(db, pickup, dropoff, created_at):
+    """
+    Counts a new ride in the route rollups:
+    - 'route_rollups': one doc per (from, to, hour bucket) for windowed top-N.
+    - 'route_totals': one doc per (from, to) for the all-time top-N.
+    """
+    route = {"from": pickup, "to": dropoff}
+    db.route_rollups.update_one(
+        {**route, "bucket": route_bucket(created_at)},
+        {"$inc": {"rideCount": 1}},
+        upsert=True
+    )
+    db.route_totals.update_one({"_id": route}, {"$inc": {"rideCount": 1}}, upsert=True)
 
-        total_seats = ride.get('seats', 0)
-        taken_seats = len(ride.get('passengers', []))
-        remaining = total_seats - taken_seats
-        
-        status = "Available" if remaining > 0 else "Full"
+def popular_routes_pipeline(since, limit):
+    """Top-N routes over the rollup buckets from 'since' onwards."""
+    return [
+        { "$match": { "bucket": { "$gte": since } } },
+        { "$group": {
+            "_id": { "from": "$from", "to": "$to" },
+            "rideCount": { "$sum": "$rideCount" }
+        }},
+        { "$sort": { "rideCount": -1 } },
+        { "$limit": limit }
+    ]
 
-        return jsonify({
-            "rideId": str(ride['_id']),
-            "totalSeats": total_seats,
-            "seatsTaken": taken_seats,
-            "remainingSeats": remaining,
-            "status": status
-        }), 200
+def query_popular_routes(db, window, limit):
+    """Top-N routes for a window, read from the rollups (never from rides)."""
+    span = ROUTE_WINDOWS[window]
+    if span is None:
+        return list(db.route_totals.find({}).sort("rideCount", -1).limit(limit))
 
-    except Exception as e:
-        return jsonify({"message": "Error checking availability", "error": str(e)}), 500
+    since = route_bucket(datetime.now(timezone.utc) - span)
+    return list(db.route_rollups.aggregate(popular_routes_pipeline(since, limit)))
 
 @ride_bp.route('/analytics/popular-routes', methods=['GET'])
 @token_required
 def popular_routes(current_user):
     """
     6) POPULAR ROUTES ANALYTICS
-    GET /api/v1/analytics/popular-routes
-    - Groups rides by pickup -> dropoff.
-    - Returns top 5 frequent routes.
+    GET /api/v1/analytics/popular-routes?window=24h|7d|all&limit=<n>
+    - Top pickup -> dropoff routes (default: all time, top 5).
+    - Served from hourly route rollups maintained on ride creation,
+      cached in-process and refreshed in the background.
     """
-    db = Database.get_db()
+    db = Database.get_db(stale_ok=True)
     if db is None:
         return jsonify({"message": "Database connection failed"}), 500
-    
-    pipeline = [
-        {
-            "$group": {
-                "_id": { "from": "$pickup", "to": "$dropoff" },
-                "rideCount": { "$sum": 1 }
-            }
-        },
-        { "$sort": { "rideCount": -1 } },
-        { "$limit": 5 }
-    ]
-    
+
+    window = request.args.get('window', 'all')
+    if window not in ROUTE_WINDOWS:
+        return jsonify({"message": f"Invalid window, use one of: {', '.join(ROUTE_WINDOWS)}"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 5)), 1), 50)
+    except ValueError:
+        return jsonify({"message": "Invalid limit"}), 400
+
     try:
-        results = list(db.rides.aggregate(pipeline))
+        results = routes_cache.get((window, limit), lambda: query_popular_routes(db, window, limit))
         return jsonify(results), 200
     except Exception as e:
         return jsonify({"message": "Error fetching analytics", "error": str(e)}), 500
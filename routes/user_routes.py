@@ -1,14 +1,25 @@
 from flask import Blueprint, request, jsonify, current_app
-from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
 from database import Database
 from models import User
+from config import Config
+from passwords import hash_password, verify_password, needs_rehash, HashingBusy
 from routes.auth_middleware import token_required
+from routes.ride_routes import parse_time_window, time_filter, view_projection
+from routes.pagination import parse_page_args, seek_filter, take_page, page_response
 from bson import ObjectId
 
 user_bp = Blueprint('user_bp', __name__)
 
+# What login needs from the user document (skips profile fields)
+LOGIN_PROJECTION = {"name": 1, "email": 1, "password": 1}
+
+def hashing_busy_response():
+    response = jsonify({"message": "Server is busy, please try again shortly"})
+    response.headers['Retry-After'] = str(Config.PASSWORD_RETRY_AFTER)
+    return response, 503
+
 @user_bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -18,10 +29,13 @@ def register():
         return jsonify({"message": "Database connection failed. Check MONGO_URI and IP whitelist."}), 500
     
     # Check if user exists
-    if db.users.find_one({"email": data['email']}):
+    if db.users.find_one({"email": data['email']}, {"_id": 1}):
         return jsonify({"message": "User already exists"}), 400
     
-    hashed_password = generate_password_hash(data['password'], method='pbkdf2:sha256')
+    try:
+        hashed_password = hash_password(data['password'])
+    except HashingBusy:
+        return hashing_busy_response()
     
     new_user = User.create_schema(
         name=data['name'],
@@ -43,10 +57,25 @@ def login():
     if db is None:
         return jsonify({"message": "Database connection failed. Check MONGO_URI and IP whitelist."}), 500
     
-    user = db.users.find_one({"email": data['email']})
-    
-    if not user or not check_password_hash(user['password'], data['password']):
-        return jsonify({"message": "Invalid credentials"}), 401
+    user = db.users.find_one({"email": data['email']}, LOGIN_PROJECTION)
+
+    try:
+        if not user or not verify_password(user['password'], data['password']):
+            return jsonify({"message": "Invalid credentials"}), 401
+
+    except HashingBusy:
+        return hashing_busy_response()
+
+    # Transparently move old hashes to the configured parameters
+    # (best effort: skipped if the pool is busy, retried on a later login)
+    if needs_rehash(user['password']):
+        try:
+            db.users.update_one(
+                {"_id": user['_id'], "password": user['password']},
+                {"$set": {"password": hash_password(data['password'])}}
+            )
+        except HashingBusy:
+            pass
     
     # Generate JWT
     token = jwt.encode({
@@ -76,27 +105,80 @@ def get_me(current_user):
     }
     return jsonify(user_data), 200
 
+HISTORY_ROLES = {"driver": "driverId", "passenger": "passengers"}
+
+def history_query(user_id, role, cursor=None):
+    """Archived rides the user drove / joined, newest first, after a pagination cursor."""
+    query = {HISTORY_ROLES[role]: user_id}
+    seek = seek_filter(cursor, descending=True)
+    return {"$and": [query, seek]} if seek else query
+
+@user_bp.route('/my/history', methods=['GET'])
+@token_required
+def get_my_history(current_user):
+    """
+    GET /api/v1/my/history?role=driver|passenger&view=card&limit=50&cursor=
+    - Departed rides the archiver moved to 'rides_history', newest first.
+    - Keyset-paginated on (time, _id) descending; next page cursor in X-Next-Cursor.
+    """
+    db = Database.get_db()
+    if db is None:
+        return jsonify({"message": "Database connection failed"}), 500
+    role = request.args.get('role', 'passenger')
+    if role not in HISTORY_ROLES:
+        return jsonify({"message": f"Invalid role, use one of: {', '.join(HISTORY_ROLES)}"}), 400
+    try:
+        projection = view_projection(request.args, "card")
+        limit, cursor = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid parameters: {str(e)}"}), 400
+
+    try:
+        rides = db.rides_history.find(history_query(str(current_user['_id']), role, cursor), projection) \
+            .sort([("time", -1), ("_id", -1)]).limit(limit + 1)
+        return page_response(*take_page(rides, limit))
+    except Exception as e:
+        return jsonify({"message": "Error fetching ride history", "error": str(e)}), 500
+
 @user_bp.route('/my/rides', methods=['GET'])
 @token_required
 def get_my_rides(current_user):
+    """
+    GET /api/v1/my/rides?role=driver|passenger&after=&before=&view=card&limit=50&cursor=
+    - With 'role': the rides the user drives / has joined, as a keyset-paginated
+      array on (time, _id); next page cursor in X-Next-Cursor, like the other lists.
+    - Without 'role': {"driven_rides": [...], "joined_rides": [...]}, the first
+      'limit' rides of each. Not pageable; use 'role' to read further.
+    """
     db = Database.get_db()
     
-    # Rides where user is driver
-    driver_rides = list(db.rides.find({"driverId": str(current_user['_id'])}))
-    
-    # Rides where user is a passenger
-    passenger_rides = list(db.rides.find({"passengers": str(current_user['_id'])}))
-    
-    # Helper to serialize ObjectId
-    def serialize_rides(rides):
-        for r in rides:
-            r['_id'] = str(r['_id'])
-            # Format datetime if needed
-            if 'createdAt' in r:
-                r['createdAt'] = r['createdAt'].isoformat()
-        return rides
-        
+    user_id = str(current_user['_id'])
+    role = request.args.get('role')
+    if role is not None and role not in HISTORY_ROLES:
+        return jsonify({"message": f"Invalid role, use one of: {', '.join(HISTORY_ROLES)}"}), 400
+    try:
+        # Optional ?after=&before= departure window
+        window = time_filter(*parse_time_window(request.args, upcoming_only=False))
+        projection = view_projection(request.args, "card")
+        limit, cursor = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid parameters: {str(e)}"}), 400
+
+    def page(query, cursor):
+        seek = seek_filter(cursor)
+        rides = db.rides.find({"$and": [query, seek]} if seek else query, projection) \
+            .sort([("time", 1), ("_id", 1)]).limit(limit + 1)
+        return take_page(rides, limit)
+
+    if role is not None:
+        return page_response(*page({HISTORY_ROLES[role]: user_id, **window}, cursor))
+
+    if cursor is not None:
+        return jsonify({"message": "Invalid parameters: cursor needs a role"}), 400
+    # Rides where user is driver / a passenger
+    driven, _ = page({"driverId": user_id, **window}, None)
+    joined, _ = page({"passengers": user_id, **window}, None)
     return jsonify({
-        "driven_rides": serialize_rides(driver_rides),
-        "joined_rides": serialize_rides(passenger_rides)
+        "driven_rides": driven,
+        "joined_rides": joined
     }), 200
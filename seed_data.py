@@ -1,9 +1,14 @@
+import argparse
 import random
 from datetime import datetime, timedelta, timezone
 from werkzeug.security import generate_password_hash
 from database import Database
 from config import Config
+from models import Ride, User
+from maintenance import rebuild_places, reconcile_driver_stats, rebuild_route_rollups, backfill_seats_available
+from routes.auth_middleware import invalidate_principal
 from pymongo import MongoClient
+from bson import ObjectId
 import time
 
 # Use coordinates near the default frontend map view (Manhattan)
@@ -11,6 +16,29 @@ import time
 CENTER_LAT = 40.75
 CENTER_LNG = -73.98
 
+SEED_PASSWORD = "password"
+
+def clear_data(db):
+    db.users.delete_many({})
+    db.rides.delete_many({})
+    db.places.delete_many({})
+    db.driver_stats.delete_many({})
+    db.route_rollups.delete_many({})
+    db.route_totals.delete_many({})
+    db.rides_history.delete_many({})
+    invalidate_principal()
+
+def rebuild_derived(db, seats=True):
+    """
+    Recomputes every collection / field derived from rides after a bulk load.
+    'seats=False' skips the seatsAvailable backfill for rides that already carry it.
+    """
+    if seats:
+        backfill_seats_available(db)
+    rebuild_places(db)
+    reconcile_driver_stats(db)
+    rebuild_route_rollups(db)
+
 def seed_logic():
     print("🌱 Seeding Demo Data...")
     db = Database.get_db()
@@ -18,8 +46,7 @@ def seed_logic():
         raise Exception("Database connection failed")
     
     # 1. Clear existing data
-    db.users.delete_many({})
-    db.rides.delete_many({})
+    clear_data(db)
     
     # 2. Create Users
     users_data = [
@@ -29,18 +56,14 @@ def seed_logic():
         {"name": "Sarah Commuter", "email": "sarah@test.com", "gender": "Female"},
     ]
     
-    created_users = []
-    for u in users_data:
-        user_doc = {
-            "name": u['name'],
-            "email": u['email'],
-            "password": generate_password_hash("password", method='pbkdf2:sha256'),
-            "gender": u['gender'],
-            "phone": "1234567890",
-            "createdAt": datetime.now(timezone.utc)
-        }
-        res = db.users.insert_one(user_doc)
-        created_users.append({**user_doc, "_id": res.inserted_id})
+    # Every demo user shares one password, so hash it once
+    password_hash = generate_password_hash(SEED_PASSWORD, method='pbkdf2:sha256')
+    user_docs = [
+        User.create_schema(u['name'], u['email'], password_hash, u['gender'], "1234567890")
+        for u in users_data
+    ]
+    res = db.users.insert_many(user_docs)
+    created_users = [{**doc, "_id": _id} for doc, _id in zip(user_docs, res.inserted_ids)]
         
     driver = created_users[0]
     alice = created_users[1]
@@ -61,7 +84,7 @@ def seed_logic():
             "dropoff": "Grand Central Station",
             "pickupCoords": get_coords(0.002, 0.002),
             "dropoffCoords": get_coords(0.05, 0.05),
-            "time": (datetime.now() + timedelta(hours=2)).isoformat(),
+            "time": datetime.now(timezone.utc) + timedelta(hours=2),
             "seats": 4,
             "passengers": [str(alice['_id'])]
         },
@@ -71,7 +94,7 @@ def seed_logic():
             "dropoff": "Downtown Mall",
             "pickupCoords": get_coords(-0.002, -0.002),
             "dropoffCoords": get_coords(-0.06, -0.06),
-            "time": (datetime.now() + timedelta(hours=1)).isoformat(),
+            "time": datetime.now(timezone.utc) + timedelta(hours=1),
             "seats": 3,
             "passengers": [str(driver['_id']), str(bob['_id']), str(alice['_id'])]
         },
@@ -81,7 +104,7 @@ def seed_logic():
             "dropoff": "Airport",
             "pickupCoords": get_coords(0.1, 0.1),
             "dropoffCoords": get_coords(0.2, 0.2),
-            "time": (datetime.now() + timedelta(days=1)).isoformat(),
+            "time": datetime.now(timezone.utc) + timedelta(days=1),
             "seats": 2,
             "passengers": []
         },
@@ -91,7 +114,7 @@ def seed_logic():
             "dropoff": "Grand Central Station",
             "pickupCoords": get_coords(0.003, 0.003),
             "dropoffCoords": get_coords(0.05, 0.05),
-            "time": (datetime.now() + timedelta(hours=5)).isoformat(),
+            "time": datetime.now(timezone.utc) + timedelta(hours=5),
             "seats": 3,
             "passengers": []
         },
@@ -101,26 +124,175 @@ def seed_logic():
             "dropoff": "City Center",
             "pickupCoords": get_coords(0.005, -0.005),
             "dropoffCoords": get_coords(0.1, 0.1),
-            "time": (datetime.now() + timedelta(hours=3)).isoformat(),
+            "time": datetime.now(timezone.utc) + timedelta(hours=3),
             "seats": 3,
             "passengers": [str(bob['_id'])]
         }
     ]
     
-    db.rides.insert_many(rides_data)
+    db.rides.insert_many([
+        {**r, **Ride.search_fields(r['pickup'], r['dropoff'])} for r in rides_data
+    ])
+    rebuild_derived(db)
+    return {"users": created_users, "rides": len(rides_data)}
+
+# ==========================================
+# HIGH-VOLUME SYNTHETIC DATA (capacity planning)
+# ==========================================
+
+# Campus hotspots: (name, lat offset, lng offset, spread in degrees, weight)
+HOTSPOTS = [
+    ("University Library", 0.002, 0.002, 0.0015, 30),
+    ("Campus Gate 1", -0.002, -0.002, 0.0015, 25),
+    ("Science Block", 0.005, -0.005, 0.0015, 15),
+    ("North Campus Housing", 0.02, 0.01, 0.003, 15),
+    ("Sports Complex", -0.01, 0.008, 0.002, 5),
+]
+DESTINATIONS = [
+    ("Grand Central Station", 0.05, 0.05, 0.004, 30),
+    ("Downtown Mall", -0.06, -0.06, 0.004, 20),
+    ("Airport", 0.2, 0.2, 0.006, 15),
+    ("City Center", 0.1, 0.1, 0.005, 25),
+    ("Central Park", 0.03, 0.01, 0.004, 10),
+]
+# Departure hour weights (commute peaks around 8-9am and 5-6pm)
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 10, 14, 8, 5, 5, 6, 5, 5, 6, 10, 14, 10, 6, 4, 3, 2, 1]
+SEAT_WEIGHTS = {1: 10, 2: 25, 3: 35, 4: 30}
+GENERATE_CHUNK = 10000
+
+def _pick(rng, places):
+    name, dlat, dlng, spread, _ = rng.choices(places, weights=[p[4] for p in places])[0]
+    point = {"type": "Point", "coordinates": [
+        round(CENTER_LNG + dlng + rng.gauss(0, spread), 6),
+        round(CENTER_LAT + dlat + rng.gauss(0, spread), 6)
+    ]}
+    return name, point
+
+def _synthetic_ride(rng, user_ids, start):
+    driver = rng.choice(user_ids)
+    pickup, pickup_coords = _pick(rng, HOTSPOTS)
+    dropoff, dropoff_coords = _pick(rng, DESTINATIONS)
+    if rng.random() < 0.4:
+        # Return trips: from town back to campus
+        pickup, pickup_coords, dropoff, dropoff_coords = dropoff, dropoff_coords, pickup, pickup_coords
+
+    day = rng.randrange(14)
+    hour = rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+    departure = start + timedelta(days=day, hours=hour, minutes=rng.randrange(0, 60, 5))
+    seats = rng.choices(list(SEAT_WEIGHTS), weights=list(SEAT_WEIGHTS.values()))[0]
+
+    ride = Ride.create_schema(driver, pickup, dropoff, pickup_coords, dropoff_coords,
+                              departure, seats)
+    # Occupancy skews towards half-full, some rides full
+    taken = min(seats, int(rng.betavariate(2, 2) * (seats + 1)))
+    ride["passengers"] = [str(u) for u in rng.sample(user_ids, min(taken + 1, len(user_ids))) if u != driver][:taken]
+    ride["seatsAvailable"] = seats - len(ride["passengers"])
+    return ride
+
+# Per worker process, set once by _init_worker so tasks stay a few bytes
+_worker = {}
+
+def _init_worker(mongo_uri, user_ids, start):
+    _worker["rides"] = MongoClient(mongo_uri, w=1).get_database().rides
+    _worker["user_ids"] = user_ids
+    _worker["start"] = start
+
+def _insert_ride_chunk(args):
+    """Worker: builds and inserts one deterministic chunk of rides."""
+    seed, chunk_index, count = args
+    rng = random.Random(f"{seed}:{chunk_index}")
+    docs = [_synthetic_ride(rng, _worker["user_ids"], _worker["start"]) for _ in range(count)]
+    _worker["rides"].insert_many(docs, ordered=False)
+    return count
+
+def default_start():
+    """Midnight UTC today: runs on the same day with the same seed are identical."""
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def generate(users, rides, seed=42, processes=None, mongo_uri=None, start=None):
+    """
+    Wipes the database and loads 'users' users and 'rides' rides.
+    - Deterministic for a given seed and 'start' (chunk i always uses
+      Random(f"{seed}:{i}")); 'start' defaults to default_start().
+    - Pickups/dropoffs cluster around campus hotspots and common destinations,
+      departures follow commute peaks over the 14 days from 'start'.
+    - All users share SEED_PASSWORD, hashed once.
+    - Rides are built and inserted in parallel chunks with unordered insert_many.
+    """
+    import multiprocessing
+
+    mongo_uri = mongo_uri or Config.MONGO_URI
+    db = Database.get_db()
+    if db is None:
+        raise Exception("Database connection failed")
+    clear_data(db)
+
+    start = start or default_start()
+    rng = random.Random(seed)
+    password_hash = generate_password_hash(SEED_PASSWORD, method='pbkdf2:sha256')
+    user_ids = []
+    for offset in range(0, users, GENERATE_CHUNK):
+        batch = [
+            # Fixed _id (start timestamp + user number) so rides reference the same ids every run
+            {"_id": ObjectId(f"{int(start.timestamp()):08x}{i:016x}"),
+             **User.create_schema(f"Student {i}", f"student{i}@test.com", password_hash,
+                                  rng.choice(["Male", "Female", "Other"]), f"555{i:07d}")}
+            for i in range(offset, min(users, offset + GENERATE_CHUNK))
+        ]
+        user_ids.extend(db.users.insert_many(batch, ordered=False).inserted_ids)
+
+    print(f"Departures from {start.isoformat()} (pass --start to reproduce)")
+    tasks = [
+        (seed, i, min(GENERATE_CHUNK, rides - offset))
+        for i, offset in enumerate(range(0, rides, GENERATE_CHUNK))
+    ]
+    inserted = 0
+    started = time.monotonic()
+    # user_ids reach each worker once, through the initializer. Workers are
+    # not forked from this process: it holds a MongoClient and may be running
+    # the background index build, neither of which survives a fork.
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    with context.Pool(processes, initializer=_init_worker, initargs=(mongo_uri, user_ids, start)) as pool:
+        for count in pool.imap_unordered(_insert_ride_chunk, tasks):
+            inserted += count
+            rate = inserted / max(time.monotonic() - started, 1e-6)
+            print(f"     -> {inserted}/{rides} rides ({rate:,.0f}/s)", end="\r")
+    print()
+
+    print("Rebuilding derived collections...")
+    # _synthetic_ride already sets seatsAvailable
+    rebuild_derived(db, seats=False)
+    return {"users": len(user_ids), "rides": inserted}
 
 def seed():
-    client = MongoClient(Config.MONGO_URI)
-    Database.db = client.get_database()
-    seed_logic()
-    print("\n✅ SEEDING COMPLETE!")
-    print(f"     -> Created {len(rides_data)} rides.")
+    parser = argparse.ArgumentParser(description="Seed demo data, or generate a synthetic data set.")
+    parser.add_argument("--users", type=int, help="generate N synthetic users")
+    parser.add_argument("--rides", type=int, help="generate M synthetic rides")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None,
+                        help="first departure day, e.g. 2026-01-05 (default: today, UTC)")
+    args = parser.parse_args()
+
+    if args.users or args.rides:
+        start = args.start
+        if start is not None and start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        result = generate(args.users or 1000, args.rides or 10000, args.seed, args.processes, start=start)
+        print("\n✅ GENERATION COMPLETE!")
+        print(f"     -> Created {result['users']} users and {result['rides']} rides.")
+        print(f"  Log in as student0@test.com / {SEED_PASSWORD}")
+        return
 
+    result = seed_logic()
+    driver = result["users"][0]
     print("\n✅ SEEDING COMPLETE!")
+    print(f"     -> Created {result['rides']} rides.")
     print("------------------------------------------------")
     print("Log in with:")
     print(f"  Email: {driver['email']}")
-    print("  Password: password")
+    print(f"  Password: {SEED_PASSWORD}")
     print("------------------------------------------------")
 
 if __name__ == "__main__":
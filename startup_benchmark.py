@@ -0,0 +1,116 @@
+"""
+Cold-start benchmark: process start -> app imported -> first response byte.
+
+Each run spawns a fresh interpreter that imports wsgi (which runs
+create_app(), as a serverless cold start does) and serves one request per
+path through the test client. Reported times are medians over --runs.
+
+    python startup_benchmark.py --mongo-uri mongodb://localhost:27017/unicarpool
+    python startup_benchmark.py --save-baseline          # on the old build
+    python startup_benchmark.py --baseline startup_baseline.json
+
+Paths default to '/' (no database) and '/api/v1/health/db' (first database
+round trip). Exits non-zero if a median regresses beyond --tolerance.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+from wsgi import app
+imported = time.perf_counter()
+client = app.test_client()
+timings = {"import_ms": (imported - start) * 1000}
+for path in sys.argv[1:]:
+    res = client.get(path)
+    res.get_data()
+    timings[path] = {"status": res.status_code, "first_byte_ms": (time.perf_counter() - start) * 1000}
+print("STARTUP " + json.dumps(timings))
+"""
+
+def log(msg, type="INFO"):
+    print(f"[{type}] {msg}")
+
+def run_once(paths, env):
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, *paths],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True, timeout=120
+    )
+    wall = (time.perf_counter() - start) * 1000
+    for line in out.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            timings = json.loads(line[len("STARTUP "):])
+            timings["process_ms"] = wall
+            return timings
+    raise SystemExit(f"Child process failed:\n{out.stdout}\n{out.stderr}")
+
+def summarize(runs, paths):
+    report = {
+        "import_ms": round(statistics.median(r["import_ms"] for r in runs), 1),
+        "process_ms": round(statistics.median(r["process_ms"] for r in runs), 1),
+    }
+    for path in paths:
+        report[path] = {
+            "status": runs[-1][path]["status"],
+            "first_byte_ms": round(statistics.median(r[path]["first_byte_ms"] for r in runs), 1)
+        }
+    return report
+
+def compare(report, baseline, tolerance):
+    failures = []
+    for key, base in baseline.items():
+        cur = report.get(key)
+        if cur is None:
+            continue
+        base_ms = base["first_byte_ms"] if isinstance(base, dict) else base
+        cur_ms = cur["first_byte_ms"] if isinstance(cur, dict) else cur
+        if base_ms and cur_ms > base_ms * (1 + tolerance):
+            failures.append(f"{key}: {cur_ms}ms > baseline {base_ms}ms")
+        else:
+            log(f"{key}: {cur_ms}ms (baseline {base_ms}ms)", "OK")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/unicarpool"))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", action="append", dest="paths")
+    parser.add_argument("--baseline", default="startup_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    paths = args.paths or ["/", "/api/v1/health/db"]
+    env = dict(os.environ, MONGO_URI=args.mongo_uri, SECRET_KEY=os.getenv("SECRET_KEY", "startup-bench"))
+
+    runs = []
+    for i in range(args.runs):
+        runs.append(run_once(paths, env))
+        log(f"run {i + 1}/{args.runs}: import {runs[-1]['import_ms']:.1f}ms", "RUN")
+
+    report = summarize(runs, paths)
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as fh:
+            json.dump(report, fh, indent=2)
+        log(f"Baseline written to {args.baseline}", "SUCCESS")
+        return 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            failures = compare(report, json.load(fh), args.tolerance)
+        for f in failures:
+            log(f, "FAIL")
+        return 1 if failures else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
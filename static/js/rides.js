@@ -24,6 +24,32 @@ const authFetch = (url, options = {}) => {
     return fetch(url, { ...options, headers });
 };
 
+// ---------------- SERVICE WORKER MESSAGES ----------------
+// Offline join/cancel requests are queued by sw.js; ask it to replay them
+// whenever we are (back) online, and refresh views it revalidated.
+if (navigator.serviceWorker) {
+    const replayQueued = () => {
+        if (navigator.serviceWorker.controller) {
+            navigator.serviceWorker.controller.postMessage({ type: 'replay' });
+        }
+    };
+    window.addEventListener('online', replayQueued);
+    if (navigator.onLine) replayQueued();
+
+    navigator.serviceWorker.addEventListener('message', (e) => {
+        const msg = e.data || {};
+        if (msg.type === 'queued-result') {
+            alert(`Queued request sent: ${msg.message || 'status ' + msg.status}`);
+            loadMyRides();
+        } else if (msg.type === 'api-updated') {
+            if (msg.url.includes('/api/v1/my/')) loadMyRides();
+            else if (msg.url.includes('/api/v1/driver/stats') || msg.url.includes('/api/v1/analytics/')) {
+                if (document.getElementById('statsList')?.innerHTML) loadStats();
+            }
+        }
+    });
+}
+
 // Create Ride Logic
 const createForm = document.getElementById('createRideForm');
 let selectionMap = null;
@@ -49,14 +75,15 @@ async function searchLocation(type) {
         const statusEl = document.getElementById('selectionStatus');
         statusEl.innerText = `Searching for "${query}"...`;
 
-        // Nominatim OpenStreetMap Search API
-        const res = await fetch(`https://nominatim.openstreetmap.org/search?format=json&q=${encodeURIComponent(query)}`);
+        // Server-side geocoding proxy (cached, rate-limit friendly)
+        const res = await authFetch(`/api/v1/geocode?q=${encodeURIComponent(query)}&limit=1`);
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
         const results = await res.json();
 
         if (results.length > 0) {
             const topResult = results[0];
-            const lat = parseFloat(topResult.lat);
-            const lng = parseFloat(topResult.lon);
+            const lat = topResult.lat;
+            const lng = topResult.lng;
 
             // Center Map
             if (selectionMap) selectionMap.setView([lat, lng], 16);
@@ -72,7 +99,7 @@ async function searchLocation(type) {
                 setDropoff(lat, lng);
             }
 
-            statusEl.innerText = `Found: ${topResult.display_name.split(',')[0]}`;
+            statusEl.innerText = `Found: ${topResult.name}`;
         } else {
             alert("Location not found. Try a different name.");
             statusEl.innerText = "Location not found.";
@@ -83,7 +110,7 @@ async function searchLocation(type) {
     }
 }
 
-// Reverse Geocoding Helper (Nominatim)
+// Reverse Geocoding Helper (server-side proxy)
 async function reverseGeocode(lat, lng, elementId) {
     // If this change came from a search, we might not want to overwrite the input immediately with "Fetching..."
     // But for consistency:
@@ -95,10 +122,10 @@ async function reverseGeocode(lat, lng, elementId) {
     }
 
     try {
-        const res = await fetch(`https://nominatim.openstreetmap.org/reverse?format=jsonv2&lat=${lat}&lon=${lng}`);
-        const data = await res.json();
+        const res = await authFetch(`/api/v1/reverse-geocode?lat=${lat}&lng=${lng}`);
+        const data = res.ok ? await res.json() : {};
         if (el) {
-            el.value = data.display_name || "Unknown Location";
+            el.value = data.displayName || "Unknown Location";
             el.disabled = false;
         }
     } catch (err) {
@@ -234,7 +261,8 @@ if (createForm) {
             // Backend expects { lng, lat }
             pickupCoords: { lng: pickupPoint.lng, lat: pickupPoint.lat },
             dropoffCoords: { lng: dropoffPoint.lng, lat: dropoffPoint.lat },
-            time: document.getElementById('cTime').value,
+            // Local datetime-local value -> UTC ISO string
+            time: new Date(document.getElementById('cTime').value).toISOString(),
             seats: document.getElementById('cSeats').value
         };
 
@@ -304,6 +332,16 @@ async function findNearbyRides() {
             const rides = await res.json();
             renderRides(rides);
 
+            const b = map.getBounds();
+            const live = new URLSearchParams();
+            const bbox = [b.getWest(), b.getSouth(), b.getEast(), b.getNorth()];
+            // A zoomed-out viewport would be refused (400); follow the listed rides only
+            if (liveRegionCells(bbox) <= LIVE_MAX_REGION_CELLS) {
+                live.set('bbox', bbox.map(v => v.toFixed(5)).join(','));
+            }
+            if (rides.length) live.set('rides', rides.slice(0, 100).map(r => r._id).join(','));
+            if ([...live.keys()].length) subscribeLive(live);
+
             rides.forEach(ride => {
                 if (!ride.pickupCoords?.coordinates) return;
 
@@ -358,13 +396,14 @@ function renderRides(rides) {
 
         const div = document.createElement('div');
         div.className = 'ride-card';
+        div.dataset.rideId = ride._id;
         div.style.position = 'relative'; // For badge positioning
 
         div.innerHTML = `
             ${scoreBadge}
             <h4>${ride.pickup} ➝ ${ride.dropoff}</h4>
             <p>📅 ${new Date(ride.time).toLocaleString()}</p>
-            <p>💺 Seats Left: ${seatsLeft}</p>
+            <p class="seats-left">💺 Seats Left: ${seatsLeft}</p>
             <div class="card-actions">
                 <button class="join-btn"
                     ${seatsLeft <= 0 ? 'disabled' : ''}
@@ -381,6 +420,93 @@ function renderRides(rides) {
     });
 }
 
+// ---------------- LIVE UPDATES (SSE) ----------------
+// Read with fetch() rather than EventSource so the token stays in a header.
+let liveAbort = null;
+// Same grid as Config.EVENTS_CELL_DEGREES / EVENTS_MAX_REGION_CELLS on the server
+const LIVE_CELL_DEGREES = 0.05;
+const LIVE_MAX_REGION_CELLS = 64;
+const LIVE_RETRY_MS = 3000;
+
+function liveRegionCells([minLng, minLat, maxLng, maxLat]) {
+    const cell = v => Math.floor(v / LIVE_CELL_DEGREES);
+    return (cell(maxLng) - cell(minLng) + 1) * (cell(maxLat) - cell(minLat) + 1);
+}
+
+async function subscribeLive(params) {
+    if (liveAbort) liveAbort.abort();
+    liveAbort = new AbortController();
+    const signal = liveAbort.signal;
+
+    while (!signal.aborted) {
+        let delay = LIVE_RETRY_MS;
+        try {
+            const res = await fetch(`/api/v1/events/rides?${params}`, {
+                headers: { 'Authorization': `Bearer ${token}` },
+                signal
+            });
+            if (res.status >= 400 && res.status < 500) {
+                // Bad filter or expired token: retrying cannot succeed
+                console.warn('Live updates refused', res.status);
+                return;
+            }
+            if (res.status === 503) {
+                // Worker's stream limit reached; back off as told
+                delay = (parseInt(res.headers.get('Retry-After'), 10) || 15) * 1000;
+            }
+            if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            for (;;) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let end;
+                while ((end = buffer.indexOf('\n\n')) >= 0) {
+                    handleLiveEvent(buffer.slice(0, end));
+                    buffer = buffer.slice(end + 2);
+                }
+            }
+        } catch (err) {
+            if (signal.aborted) return;
+            console.warn('Live updates disconnected', err);
+        }
+        // Server closes streams periodically; reconnect after a short pause
+        await new Promise(resolve => setTimeout(resolve, delay));
+    }
+}
+
+function handleLiveEvent(block) {
+    let type = 'message';
+    let data = '';
+    block.split('\n').forEach(line => {
+        if (line.startsWith('event: ')) type = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+    });
+    if (!data) return;
+
+    const event = JSON.parse(data);
+    if (type === 'seats') {
+        document.querySelectorAll(`[data-ride-id="${event.rideId}"]`).forEach(card => {
+            card.querySelector('.seats-left').innerText = `💺 Seats Left: ${event.seatsAvailable}`;
+            const btn = card.querySelector('.join-btn');
+            btn.disabled = event.seatsAvailable <= 0;
+            btn.innerText = event.seatsAvailable <= 0 ? 'Full' : 'Request Ride';
+        });
+    } else if (type === 'ride' && map && event.pickupCoords?.coordinates) {
+        const [rLng, rLat] = event.pickupCoords.coordinates;
+        currentMarkers.push(
+            L.marker([rLat, rLng]).addTo(map).bindPopup(`
+                <b>${event.pickup} ➝ ${event.dropoff}</b><br>
+                Seats Left: ${event.seatsAvailable}<br>
+                <button onclick="joinRide('${event.rideId}')">Request Ride</button>
+            `)
+        );
+    }
+}
+
 // ---------------- JOIN / CANCEL ----------------
 async function joinRide(rideId) {
     const res = await authFetch(`/api/v1/ride/request/${rideId}`, { method: 'POST' });
@@ -405,25 +531,45 @@ async function checkAvailability(rideId) {
 }
 
 // ---------------- MY RIDES ----------------
+// Both lists are keyset-paged: the X-Next-Cursor header carries the next page's token
+const MY_RIDE_LISTS = {
+    driven: {
+        url: '/api/v1/my/rides?role=driver',
+        card: r => `<div class="ride-card">${r.pickup} ➝ ${r.dropoff}</div>`
+    },
+    joined: {
+        url: '/api/v1/my/joined-rides',
+        card: r => `<div class="ride-card">${r.pickup} ➝ ${r.dropoff}
+        <button onclick="cancelRide('${r._id}')">Leave</button></div>`
+    }
+};
+
 async function loadMyRides() {
     const container = document.getElementById('myRidesList');
     if (!container) return;
 
-    const driven = await authFetch('/api/v1/my/rides').then(r => r.json());
-    const joined = await authFetch('/api/v1/my/joined-rides').then(r => r.json());
+    container.innerHTML = `
+        <h3>Offered Rides</h3><div id="myRides-driven"></div>
+        <h3>Joined Rides</h3><div id="myRides-joined"></div>`;
+    await Promise.all(Object.keys(MY_RIDE_LISTS).map(name => loadMyRidesPage(name)));
+}
 
-    let html = '<h3>Offered Rides</h3>';
-    driven.driven_rides.forEach(r =>
-        html += `<div class="ride-card">${r.pickup} ➝ ${r.dropoff}</div>`
-    );
+async function loadMyRidesPage(name, cursor = null) {
+    const list = MY_RIDE_LISTS[name];
+    const el = document.getElementById(`myRides-${name}`);
+    if (!el) return;
 
-    html += '<h3>Joined Rides</h3>';
-    joined.forEach(r =>
-        html += `<div class="ride-card">${r.pickup} ➝ ${r.dropoff}
-        <button onclick="cancelRide('${r._id}')">Leave</button></div>`
-    );
+    const sep = list.url.includes('?') ? '&' : '?';
+    const res = await authFetch(cursor ? `${list.url}${sep}cursor=${encodeURIComponent(cursor)}` : list.url);
+    const rides = await res.json();
+    const next = res.headers.get('X-Next-Cursor');
 
-    container.innerHTML = html;
+    el.querySelector('.more-btn')?.remove();
+    el.insertAdjacentHTML('beforeend', rides.map(list.card).join(''));
+    if (next) {
+        el.insertAdjacentHTML('beforeend',
+            `<button class="more-btn" onclick="loadMyRidesPage('${name}', '${next}')">Show more</button>`);
+    }
 }
 
 // ---------------- STATS ----------------
@@ -1,26 +1,250 @@
-const CACHE_NAME = 'unicarpool-v1';
-const ASSETS = [
-    '/',
-    '/auth',
-    '/dashboard',
-    '/static/css/styles.css',
-    '/static/js/rides.js',
-    '/static/js/auth.js',
-    '/static/img/icon.png',
-    '/static/img/landing_hero.png'
+// UniCarpool service worker
+//
+// - Static assets: cache-first under content-hashed URLs (?v=<hash>, see
+//   assets.py). The worker is registered as /sw.js?v=<version>, so a build
+//   with changed assets installs a new worker, which drops the old caches.
+// - App shell pages and selected /api/v1 GETs: stale-while-revalidate with a
+//   per-route max-age. Fresh entries are served without touching the
+//   network; stale ones are served at once and refreshed in the background.
+// - Join / cancel POSTs that fail for lack of network are queued in
+//   IndexedDB and replayed when connectivity returns.
+
+const VERSION = new URL(self.location.href).searchParams.get('v') || 'dev';
+const STATIC_CACHE = `unicarpool-static-${VERSION}`;
+const API_CACHE = 'unicarpool-api';
+const CACHED_AT = 'sw-cached-at';
+
+// Route prefix -> seconds a cached response is served without revalidating
+const API_MAX_AGE = [
+    ['/api/v1/my/rides', 60],
+    ['/api/v1/my/joined-rides', 60],
+    ['/api/v1/driver/stats', 300],
+    ['/api/v1/analytics/popular-routes', 600],
+    ['/api/v1/rides/nearby', 30],
+    ['/api/v1/rides/search', 60],
+    ['/api/v1/places/autocomplete', 3600],
+    ['/api/v1/geocode', 86400],
+    ['/api/v1/reverse-geocode', 86400],
+    ['/api/v1/me', 3600]
 ];
+// Writes that change what the cached reads above return
+const INVALIDATED_BY_WRITES = ['/api/v1/my/', '/api/v1/driver/stats', '/api/v1/rides/'];
+// POSTs that may be queued while offline
+const QUEUEABLE = [/^\/api\/v1\/ride\/request\/[^/]+$/, /^\/api\/v1\/ride\/cancel\/[^/]+$/];
+const SHELL_PAGES = ['/', '/auth', '/dashboard'];
 
+// ---------------------------------------------
+// Install / activate
+// ---------------------------------------------
 self.addEventListener('install', (e) => {
-    e.waitUntil(
-        caches.open(CACHE_NAME).then((cache) => cache.addAll(ASSETS))
-    );
+    e.waitUntil((async () => {
+        const res = await fetch(`/asset-manifest.json?v=${VERSION}`, { cache: 'no-cache' });
+        const manifest = await res.json();
+        const cache = await caches.open(STATIC_CACHE);
+        await cache.addAll([...Object.values(manifest.assets), ...(manifest.pages || SHELL_PAGES)]);
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', (e) => {
+    e.waitUntil((async () => {
+        const names = await caches.keys();
+        await Promise.all(names
+            .filter(n => n.startsWith('unicarpool-') && n !== STATIC_CACHE && n !== API_CACHE)
+            .map(n => caches.delete(n)));
+        await self.clients.claim();
+    })());
 });
 
+// ---------------------------------------------
+// Fetch routing
+// ---------------------------------------------
 self.addEventListener('fetch', (e) => {
-    // Simple cache-first strategy for static assets
-    if (e.request.url.includes('/static/')) {
-        e.respondWith(
-            caches.match(e.request).then((r) => r || fetch(e.request))
-        );
+    const request = e.request;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (request.method === 'GET') {
+        if (url.pathname.startsWith('/static/')) {
+            e.respondWith(cacheFirst(request));
+        } else if (request.mode === 'navigate' && SHELL_PAGES.includes(url.pathname)) {
+            e.respondWith(staleWhileRevalidate(e, STATIC_CACHE, request, request, 0));
+        } else if (url.pathname.startsWith('/api/v1/')) {
+            const maxAge = apiMaxAge(url.pathname);
+            if (maxAge !== null) {
+                e.respondWith(apiKey(request).then(key =>
+                    staleWhileRevalidate(e, API_CACHE, request, key, maxAge)));
+            }
+        }
+        return;
+    }
+
+    if (request.method === 'POST' && url.pathname.startsWith('/api/v1/')) {
+        e.respondWith(sendWrite(request, QUEUEABLE.some(re => re.test(url.pathname))));
+    }
+});
+
+function apiMaxAge(pathname) {
+    const route = API_MAX_AGE.find(([prefix]) => pathname === prefix || pathname.startsWith(prefix + '/'));
+    return route ? route[1] : null;
+}
+
+async function cacheFirst(request) {
+    const cached = await caches.match(request);
+    if (cached) return cached;
+    const res = await fetch(request);
+    if (res.ok) {
+        const cache = await caches.open(STATIC_CACHE);
+        cache.put(request, res.clone());
+    }
+    return res;
+}
+
+// API responses are per user: key them on a hash of the bearer token
+async function apiKey(request) {
+    const auth = request.headers.get('Authorization') || '';
+    const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(auth));
+    const user = Array.from(new Uint8Array(digest).slice(0, 8)).map(b => b.toString(16).padStart(2, '0')).join('');
+    const url = new URL(request.url);
+    url.searchParams.set('__sw_user', user);
+    return new Request(url.toString());
+}
+
+async function stamp(res) {
+    const headers = new Headers(res.headers);
+    headers.set(CACHED_AT, String(Date.now()));
+    return new Response(await res.blob(), { status: res.status, statusText: res.statusText, headers });
+}
+
+async function staleWhileRevalidate(event, cacheName, request, key, maxAge) {
+    const cache = await caches.open(cacheName);
+    const cached = await cache.match(key);
+
+    const revalidate = () => fetch(request).then(async (res) => {
+        if (res.ok) {
+            await cache.put(key, await stamp(res.clone()));
+            if (cached) notifyClients({ type: 'api-updated', url: request.url });
+        }
+        return res;
+    });
+
+    if (cached) {
+        const age = (Date.now() - Number(cached.headers.get(CACHED_AT) || 0)) / 1000;
+        if (age >= maxAge) {
+            // Serve stale now; keep the worker alive until the refresh lands
+            event.waitUntil(revalidate().catch(() => {}));
+        }
+        return cached;
+    }
+    return revalidate();
+}
+
+async function invalidateApiCache(prefixes) {
+    const cache = await caches.open(API_CACHE);
+    const keys = await cache.keys();
+    await Promise.all(keys
+        .filter(req => prefixes.some(p => new URL(req.url).pathname.startsWith(p)))
+        .map(req => cache.delete(req)));
+}
+
+async function notifyClients(message) {
+    const clients = await self.clients.matchAll({ includeUncontrolled: true });
+    clients.forEach(c => c.postMessage(message));
+}
+
+// ---------------------------------------------
+// Writes and the offline queue
+// ---------------------------------------------
+async function sendWrite(request, queueable) {
+    const copy = queueable ? await serialize(request) : null;
+    try {
+        const res = await fetch(request);
+        if (res.ok) await invalidateApiCache(INVALIDATED_BY_WRITES);
+        return res;
+    } catch (err) {
+        if (!queueable) throw err;
+        await outbox('readwrite', store => store.add(copy));
+        if (self.registration.sync) {
+            try { await self.registration.sync.register('replay-outbox'); } catch (e) { /* unsupported */ }
+        }
+        return new Response(JSON.stringify({
+            message: 'You are offline. The request was queued and will be sent when you are back online.',
+            queued: true
+        }), { status: 202, headers: { 'Content-Type': 'application/json' } });
+    }
+}
+
+async function serialize(request) {
+    return {
+        url: request.url,
+        method: request.method,
+        headers: { 'Authorization': request.headers.get('Authorization') || '', 'Content-Type': 'application/json' },
+        body: await request.clone().text(),
+        queuedAt: Date.now()
+    };
+}
+
+let replaying = null;
+
+function replayOutbox() {
+    // One replay at a time; 'sync', 'online' messages and page loads may overlap
+    if (!replaying) {
+        replaying = doReplay().finally(() => { replaying = null; });
+    }
+    return replaying;
+}
+
+async function doReplay() {
+    const entries = await outbox('readonly', store => store.getAll());
+    let sent = 0;
+    for (const entry of entries) {
+        let res;
+        try {
+            res = await fetch(entry.url, {
+                method: entry.method,
+                headers: entry.headers,
+                body: entry.body || undefined
+            });
+        } catch (err) {
+            break; // still offline; keep this and later entries in order
+        }
+        await outbox('readwrite', store => store.delete(entry.id));
+        sent++;
+        let message = '';
+        try { message = (await res.json()).message || ''; } catch (e) { /* not JSON */ }
+        notifyClients({ type: 'queued-result', url: entry.url, status: res.status, message });
+    }
+    if (sent) await invalidateApiCache(INVALIDATED_BY_WRITES);
+}
+
+self.addEventListener('sync', (e) => {
+    if (e.tag === 'replay-outbox') e.waitUntil(replayOutbox());
+});
+
+self.addEventListener('message', (e) => {
+    const type = e.data && e.data.type;
+    if (type === 'replay') {
+        e.waitUntil(replayOutbox());
+    } else if (type === 'logout') {
+        e.waitUntil(Promise.all([
+            caches.delete(API_CACHE),
+            outbox('readwrite', store => store.clear())
+        ]));
     }
 });
+
+// Minimal IndexedDB wrapper: one 'outbox' store with auto-increment ids
+function outbox(mode, fn) {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open('unicarpool-sw', 1);
+        open.onupgradeneeded = () => open.result.createObjectStore('outbox', { keyPath: 'id', autoIncrement: true });
+        open.onerror = () => reject(open.error);
+        open.onsuccess = () => {
+            const db = open.result;
+            const tx = db.transaction('outbox', mode);
+            const req = fn(tx.objectStore('outbox'));
+            tx.oncomplete = () => { db.close(); resolve(req.result); };
+            tx.onerror = () => { db.close(); reject(tx.error); };
+        };
+    });
+}
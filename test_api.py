@@ -10,7 +10,7 @@ def log(msg, type="INFO"):
 def get_auth_token(email, password, name="Test User"):
     # Try login first
     login_payload = {"email": email, "password": password}
-    res = requests.post(f"{BASE_URL}/api/login", json=login_payload)
+    res = requests.post(f"{BASE_URL}/api/v1/login", json=login_payload)
     
     if res.status_code == 200:
         return res.json()['token']
@@ -24,10 +24,10 @@ def get_auth_token(email, password, name="Test User"):
             "gender": "Other", 
             "phone": "1234567890"
         }
-        res = requests.post(f"{BASE_URL}/api/register", json=reg_payload)
+        res = requests.post(f"{BASE_URL}/api/v1/register", json=reg_payload)
         if res.status_code == 201:
             # Login again to get token
-            res = requests.post(f"{BASE_URL}/api/login", json=login_payload)
+            res = requests.post(f"{BASE_URL}/api/v1/login", json=login_payload)
             return res.json()['token']
     
     log(f"Failed to auth user {email}: {res.text}", "ERROR")
@@ -53,10 +53,10 @@ def run_tests():
         "dropoff": "City Center Mall",
         "pickupCoords": {"lat": 24.8607, "lng": 67.0011}, # Karachi coords example
         "dropoffCoords": {"lat": 24.8500, "lng": 67.0100},
-        "time": "2024-12-01T10:00:00",
+        "time": "2099-12-01T10:00:00",
         "seats": 3
     }
-    res = requests.post(f"{BASE_URL}/api/ride/create", json=ride_payload, headers=driver_headers)
+    res = requests.post(f"{BASE_URL}/api/v1/ride/create", json=ride_payload, headers=driver_headers)
     if res.status_code != 201:
         log(f"Failed to create ride: {res.text}", "ERROR")
         return
@@ -79,7 +79,7 @@ def run_tests():
     # TEST 2: JOIN RIDE (Prerequisite for next tests)
     # ==========================================
     log("Passenger joining ride...", "SETUP")
-    res = requests.post(f"{BASE_URL}/api/ride/request/{ride_id}", headers=passenger_headers)
+    res = requests.post(f"{BASE_URL}/api/v1/ride/request/{ride_id}", headers=passenger_headers)
     if res.status_code == 200:
         log("Joined ride successfully", "SUCCESS")
     else:
@@ -0,0 +1,93 @@
+import datetime
+
+import jwt
+import mongomock
+import pytest
+
+
+class FakeClock:
+    """Stands in for time.monotonic() so TTL tests never sleep."""
+
+    def __init__(self, start=1000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """A mongomock database returned by Database.get_db() (primary and stale handles)."""
+    from database import Database
+    from routes.auth_middleware import principal_cache
+
+    # mongomock 4.3 predates the 'sort' argument pymongo 4.11+ passes for UpdateOne
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        assert sort is None, "mongomock cannot apply a sorted UpdateOne"
+        return add_update(self, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.BulkOperationBuilder, "add_update", add_update_without_sort)
+    db = mongomock.MongoClient(tz_aware=True).unicarpool
+    monkeypatch.setattr(Database, "get_db", staticmethod(lambda stale_ok=False: db))
+    principal_cache.clear()
+    yield db
+    principal_cache.clear()
+
+
+@pytest.fixture
+def new_ride(mongo):
+    """new_ride(driver_id, seats=2, passengers=()) -> id of a ride departing tomorrow."""
+    from models import Ride
+
+    def make(driver_id, seats=2, passengers=()):
+        point = {"type": "Point", "coordinates": [-73.98, 40.75]}
+        ride = Ride.create_schema(driver_id, "Campus", "Airport", point, point,
+                                  datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1), seats)
+        ride["passengers"] = list(passengers)
+        ride["seatsAvailable"] = seats - len(passengers)
+        return mongo.rides.insert_one(ride).inserted_id
+
+    return make
+
+
+@pytest.fixture
+def app(mongo, monkeypatch):
+    """The Flask app over the 'mongo' database, with background jobs off."""
+    from app import create_app
+    from config import Config
+    monkeypatch.setattr(Config, "ARCHIVE_INTERVAL", 0)
+    flask_app = create_app()
+    flask_app.config.update(TESTING=True, SECRET_KEY="test-secret-key-of-at-least-32-bytes")
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(mongo, app):
+    """login(name) -> (user id, Authorization headers) for a new user."""
+    from models import User
+
+    def make(name):
+        user = User.create_schema(name, f"{name}@test.com", "pbkdf2:sha256:test", "Other", "")
+        user_id = str(mongo.users.insert_one(user).inserted_id)
+        token = jwt.encode({
+            "user_id": user_id,
+            "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+        }, app.config["SECRET_KEY"], algorithm="HS256")
+        return user_id, {"Authorization": f"Bearer {token}"}
+
+    return make
@@ -0,0 +1,175 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+pytest.importorskip("quart")
+pymongo = pytest.importorskip("pymongo")
+if not hasattr(pymongo, "AsyncMongoClient"):
+    pytest.skip("async app needs pymongo's AsyncMongoClient (pymongo >= 4.9)", allow_module_level=True)
+
+LAT, LNG = 40.75, -73.98
+
+
+class AsyncCursor:
+    """Async face of a mongomock cursor (sort / limit chain, async iteration)."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self.cursor = self.cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, n):
+        self.cursor = self.cursor.limit(n)
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.cursor:
+            yield doc
+
+
+class AsyncCollection:
+    """The AsyncMongoClient collection methods the async routes call, over mongomock."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+    async def aggregate(self, pipeline):
+        return AsyncCursor(self.collection.aggregate(pipeline))
+
+
+class AsyncDb:
+    def __init__(self, db):
+        self.db = db
+
+    def __getattr__(self, name):
+        return AsyncCollection(self.db[name])
+
+
+@pytest.fixture
+def async_client(mongo, app, monkeypatch):
+    """Test client of the async app over the 'mongo' database, sharing the Flask app's secret."""
+    from async_app import create_async_app
+    from database import AsyncDatabase
+    import routes.async_ride_routes as async_ride_routes
+
+    db = AsyncDb(mongo)
+    monkeypatch.setattr(AsyncDatabase, "get_db", staticmethod(lambda stale_ok=False: db))
+
+    # mongomock has no $geoNear: match the same query instead
+    build = async_ride_routes.build_nearby_pipeline
+
+    def without_geo_near(**params):
+        pipeline = build(**params)
+        geo_near = pipeline[0]["$geoNear"]
+        return [{"$match": geo_near.get("query", {})}, {"$addFields": {"distance": 0.0}}, *pipeline[1:]]
+
+    # ...nor regexes inside $all, nor $indexOfCP: match each token prefix
+    # separately and rank everything equal (ranking has its own tests)
+    build_search = async_ride_routes.build_search_pipeline
+
+    def without_regex_all(*args, **kwargs):
+        pipeline = build_search(*args, **kwargs)
+        if pipeline is not None:
+            match = pipeline[0]["$match"]
+            prefixes = [{field: token} for field in ("pickupTokens", "dropoffTokens")
+                        for token in match.pop(field, {}).get("$all", [])]
+            if prefixes:
+                match["$and"] = prefixes
+            pipeline[3] = {"$addFields": {"relevance": 0}}
+        return pipeline
+
+    monkeypatch.setattr(async_ride_routes, "build_nearby_pipeline", without_geo_near)
+    monkeypatch.setattr(async_ride_routes, "build_search_pipeline", without_regex_all)
+    async_app = create_async_app()
+    async_app.config["SECRET_KEY"] = app.config["SECRET_KEY"]
+    return async_app.test_client()
+
+
+def call(client, path, headers=None):
+    async def run():
+        response = await client.get(path, headers=headers or {})
+        return response.status_code, await response.get_json()
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def rider(login):
+    return login("rider")
+
+
+@pytest.fixture
+def ride_id(new_ride, mongo, rider):
+    ride_id = new_ride("driver")
+    mongo.rides.update_one({"_id": ride_id}, {"$push": {"passengers": rider[0]}, "$inc": {"seatsAvailable": -1}})
+    return ride_id
+
+
+def test_nearby(async_client, ride_id):
+    status, body = call(async_client, f"/api/v1/rides/nearby?lat={LAT}&lng={LNG}")
+    assert status == 200
+    assert [r["_id"] for r in body] == [str(ride_id)]
+    assert body[0]["seatsAvailable"] == 1
+
+
+def test_nearby_invalid_parameters(async_client):
+    status, body = call(async_client, f"/api/v1/rides/nearby?lat=north&lng={LNG}")
+    assert status == 400
+    assert body["message"].startswith("Invalid parameters")
+
+
+def test_search(async_client, ride_id, rider):
+    status, body = call(async_client, "/api/v1/rides/search?from=camp&to=air", rider[1])
+    assert status == 200
+    assert [r["_id"] for r in body] == [str(ride_id)]
+
+
+def test_search_invalid_parameters(async_client, rider):
+    status, _ = call(async_client, "/api/v1/rides/search?from=camp&after=someday", rider[1])
+    assert status == 400
+
+
+def test_availability(async_client, ride_id, rider):
+    status, body = call(async_client, f"/api/v1/ride/{ride_id}/availability", rider[1])
+    assert status == 200
+    assert body["remainingSeats"] == 1
+    assert body["totalSeats"] == 2
+
+
+def test_availability_invalid_or_missing_id(async_client, rider):
+    status, body = call(async_client, "/api/v1/ride/not-an-id/availability", rider[1])
+    assert (status, body["message"]) == (400, "Invalid ride id")
+    status, body = call(async_client, f"/api/v1/ride/{ObjectId()}/availability", rider[1])
+    assert (status, body["message"]) == (404, "Ride not found")
+
+
+def test_joined_rides(async_client, ride_id, rider):
+    status, body = call(async_client, "/api/v1/my/joined-rides", rider[1])
+    assert status == 200
+    assert [r["_id"] for r in body] == [str(ride_id)]
+
+
+def test_joined_rides_invalid_parameters(async_client, rider):
+    status, _ = call(async_client, "/api/v1/my/joined-rides?limit=many", rider[1])
+    assert status == 400
+
+
+def test_token_required(async_client):
+    assert call(async_client, "/api/v1/my/joined-rides")[0] == 401
+    invalid = {"Authorization": "Bearer not-a-token"}
+    assert call(async_client, "/api/v1/my/joined-rides", invalid)[0] == 401
@@ -0,0 +1,130 @@
+import pytest
+from bson import ObjectId
+
+URL = "/api/v1/rides/batch-booking"
+
+
+@pytest.fixture
+def driver(login):
+    return login("driver")[0]
+
+
+@pytest.fixture
+def rider(login):
+    return login("rider")
+
+
+def book(client, headers, *ops):
+    operations = [{"action": action, "rideId": str(ride_id)} for action, ride_id in ops]
+    return client.post(URL, json={"operations": operations}, headers=headers)
+
+
+def outcome(response):
+    return [(r["action"], r["status"], r["message"]) for r in response.get_json()]
+
+
+def seats(mongo, ride_id):
+    ride = mongo.rides.find_one({"_id": ride_id})
+    return ride["seatsAvailable"], ride["passengers"]
+
+
+def test_partial_refusal_applies_the_rest(client, mongo, driver, rider, new_ride):
+    user_id, headers = rider
+    full = new_ride(driver, seats=1, passengers=["someone"])
+    open_ride = new_ride(driver)
+    response = book(client, headers, ("join", full), ("join", open_ride))
+    assert response.status_code == 200
+    assert outcome(response) == [
+        ("join", 400, "Ride is full"),
+        ("join", 200, "Successfully joined ride"),
+    ]
+    assert seats(mongo, full) == (0, ["someone"])
+    assert seats(mongo, open_ride) == (1, [user_id])
+    assert mongo.driver_stats.find_one({"_id": driver})["totalPassengersCarried"] == 1
+
+
+def test_duplicate_ops_take_one_seat(client, mongo, driver, rider, new_ride):
+    user_id, headers = rider
+    ride_id = new_ride(driver)
+    response = book(client, headers, ("join", ride_id), ("join", ride_id))
+    assert [status for _, status, _ in outcome(response)] == [200, 400]
+    assert outcome(response)[1][2] == "Duplicate operation"
+    assert seats(mongo, ride_id) == (1, [user_id])
+
+
+def test_mixed_ops_on_one_ride_are_checked_against_the_starting_state(client, mongo, driver, rider, new_ride):
+    user_id, headers = rider
+    ride_id = new_ride(driver, passengers=[user_id])
+    response = book(client, headers, ("cancel", ride_id), ("join", ride_id))
+    assert outcome(response) == [
+        ("cancel", 200, "Successfully cancelled ride request"),
+        ("join", 400, "You already joined this ride"),
+    ]
+    assert seats(mongo, ride_id) == (2, [])
+
+
+def test_join_then_cancel_on_a_new_ride(client, mongo, driver, rider, new_ride):
+    user_id, headers = rider
+    ride_id = new_ride(driver)
+    response = book(client, headers, ("join", ride_id), ("cancel", ride_id))
+    assert [status for _, status, _ in outcome(response)] == [200, 400]
+    assert seats(mongo, ride_id) == (1, [user_id])
+
+
+def test_missing_ride_and_own_ride(client, mongo, login, rider, new_ride):
+    user_id, headers = rider
+    own = new_ride(user_id)
+    response = book(client, headers, ("join", ObjectId()), ("join", own), ("cancel", own))
+    assert outcome(response) == [
+        ("join", 404, "Ride not found"),
+        ("join", 400, "Driver cannot join their own ride"),
+        ("cancel", 400, "You are not a passenger in this ride"),
+    ]
+    assert seats(mongo, own) == (2, [])
+
+
+def test_seat_taken_between_read_and_write_is_reported(client, mongo, driver, rider, monkeypatch, new_ride):
+    user_id, headers = rider
+    ride_id = new_ride(driver, seats=1)
+    bulk_write = mongo.rides.bulk_write
+
+    def racing_bulk_write(*args, **kwargs):
+        # Another request takes the last seat after batch_booking's read
+        mongo.rides.update_one({"_id": ride_id}, {"$push": {"passengers": "other"}, "$inc": {"seatsAvailable": -1}})
+        return bulk_write(*args, **kwargs)
+
+    monkeypatch.setattr(mongo.rides, "bulk_write", racing_bulk_write)
+    response = book(client, headers, ("join", ride_id))
+    assert outcome(response) == [("join", 400, "Ride is full")]
+    assert seats(mongo, ride_id) == (0, ["other"])
+    assert mongo.driver_stats.find_one({"_id": driver}) is None
+
+
+@pytest.mark.parametrize("bad", [
+    {"action": "join", "rideId": "not-an-id"},
+    {"action": "book", "rideId": str(ObjectId())},
+    {"action": "join"},
+    "join",
+])
+def test_invalid_operation_rejects_the_whole_batch(client, mongo, driver, rider, bad, new_ride):
+    _, headers = rider
+    ride_id = new_ride(driver)
+    response = client.post(URL, json={"operations": [{"action": "join", "rideId": str(ride_id)}, bad]},
+                           headers=headers)
+    assert response.status_code == 400
+    assert seats(mongo, ride_id) == (2, [])
+
+
+def test_empty_batch(client, rider):
+    _, headers = rider
+    assert client.post(URL, json={"operations": []}, headers=headers).status_code == 400
+
+
+def test_too_many_operations(client, rider):
+    _, headers = rider
+    response = book(client, headers, *[("join", ObjectId()) for _ in range(51)])
+    assert response.status_code == 400
+
+
+def test_requires_a_token(client):
+    assert client.post(URL, json={"operations": []}).status_code == 401
@@ -0,0 +1,45 @@
+import cache
+from cache import TTLCache
+
+
+def test_get_returns_value_until_ttl_expires(monkeypatch, clock):
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    c = TTLCache(maxsize=10, ttl=5)
+    c.set("a", 1)
+    clock.advance(4.9)
+    assert c.get("a") == 1
+    clock.advance(0.1)
+    assert c.get("a") is None
+    assert c.stats()["size"] == 0
+
+
+def test_per_entry_ttl_overrides_default(monkeypatch, clock):
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    c = TTLCache(maxsize=10, ttl=60)
+    c.set("short", 1, ttl=1)
+    clock.advance(2)
+    assert c.get("short", "missing") == "missing"
+
+
+def test_evicts_least_recently_used(monkeypatch, clock):
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")            # 'b' is now the least recently used
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1
+    assert c.get("c") == 3
+
+
+def test_invalidate_clear_and_counters():
+    c = TTLCache(maxsize=10, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.invalidate("a")
+    assert c.get("a") is None
+    assert c.get("b") == 2
+    c.clear()
+    assert c.get("b") is None
+    assert c.stats() == {"size": 0, "maxsize": 10, "hits": 1, "misses": 2}
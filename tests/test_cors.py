@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+PREFLIGHT = {
+    "Origin": "https://maps.example",
+    "Access-Control-Request-Method": "GET",
+    "Access-Control-Request-Headers": "authorization",
+}
+
+
+def assert_preflight_allowed(headers):
+    assert headers["Access-Control-Allow-Origin"] == "https://maps.example"
+    assert "GET" in headers["Access-Control-Allow-Methods"]
+    assert headers["Access-Control-Allow-Headers"].lower() == "authorization"
+
+
+def test_flask_app_preflight(client):
+    response = client.options("/api/v1/rides/nearby", headers=PREFLIGHT)
+    assert response.status_code == 200
+    assert_preflight_allowed(response.headers)
+
+
+def test_async_app_preflight_matches_flask():
+    pytest.importorskip("quart")
+    from async_app import create_async_app
+
+    async def run():
+        client = create_async_app().test_client()
+        preflight = await client.options("/api/v1/rides/nearby", headers=PREFLIGHT)
+        simple = await client.get("/api/v1/rides/nearby", headers={"Origin": "https://maps.example"})
+        return preflight, simple
+
+    preflight, simple = asyncio.run(run())
+    assert preflight.status_code == 200
+    assert_preflight_allowed(preflight.headers)
+    assert simple.headers["Access-Control-Allow-Origin"] == "https://maps.example"
+    assert "X-Next-Cursor" in simple.headers["Access-Control-Expose-Headers"]
@@ -0,0 +1,156 @@
+import pytest
+
+import events
+from config import Config
+from events import EventHub
+
+BOX = (-74.0, 40.7, -73.9, 40.8)
+INSIDE = [-73.95, 40.75]
+OUTSIDE = [-73.5, 40.75]
+
+
+@pytest.fixture
+def hub():
+    return EventHub(cell_degrees=0.05)
+
+
+def frames(sub):
+    out = []
+    while True:
+        frame = sub.next(timeout=0)
+        if frame is None:
+            return out
+        out.append(frame)
+
+
+def test_subscribe_requires_a_filter(hub):
+    with pytest.raises(ValueError):
+        hub.subscribe()
+
+
+def test_subscribe_rejects_oversized_region(hub, monkeypatch):
+    monkeypatch.setattr(Config, "EVENTS_MAX_REGION_CELLS", 4)
+    with pytest.raises(ValueError, match="region too large"):
+        hub.subscribe(bbox=BOX)
+
+
+def test_subscriber_limit(hub, monkeypatch):
+    monkeypatch.setattr(Config, "EVENTS_MAX_SUBSCRIBERS", 1)
+    hub.subscribe(ride_ids=["a"])
+    with pytest.raises(OverflowError):
+        hub.subscribe(ride_ids=["b"])
+
+
+def test_publish_by_ride_id(hub):
+    sub = hub.subscribe(ride_ids=["r1"])
+    other = hub.subscribe(ride_ids=["r2"])
+    assert hub.publish("seats", {"rideId": "r1", "seatsAvailable": 2}) == 1
+    [frame] = frames(sub)
+    assert frame.startswith("id: 1\nevent: seats\ndata: ")
+    assert '"seatsAvailable":2' in frame.replace(" ", "")
+    assert frame.endswith("\n\n")
+    assert frames(other) == []
+
+
+def test_publish_by_region_checks_exact_box(hub):
+    sub = hub.subscribe(bbox=BOX)
+    assert hub.publish("ride", {"rideId": "x"}, INSIDE) == 1
+    assert hub.publish("ride", {"rideId": "y"}, OUTSIDE) == 0
+    assert len(frames(sub)) == 1
+
+
+def test_point_in_shared_cell_but_outside_box_is_skipped(hub):
+    # The box ends at lng -73.99, inside the cell that also holds -73.96
+    sub = hub.subscribe(bbox=(-74.0, 40.7, -73.99, 40.8))
+    assert hub.publish("ride", {"rideId": "x"}, [-73.96, 40.75]) == 0
+    assert frames(sub) == []
+
+
+def test_subscriber_matching_both_ways_gets_one_frame(hub):
+    sub = hub.subscribe(ride_ids=["r1"], bbox=BOX)
+    assert hub.publish("seats", {"rideId": "r1"}, INSIDE) == 1
+    assert len(frames(sub)) == 1
+
+
+def test_event_ids_increase(hub):
+    sub = hub.subscribe(ride_ids=["r1"])
+    hub.publish("seats", {"rideId": "r1"})
+    hub.publish("seats", {"rideId": "r1"})
+    assert [f.split("\n", 1)[0] for f in frames(sub)] == ["id: 1", "id: 2"]
+
+
+def test_unsubscribe_removes_all_index_entries(hub):
+    sub = hub.subscribe(ride_ids=["r1"], bbox=BOX)
+    assert hub.stats()["subscribers"] == 1
+    hub.unsubscribe(sub)
+    assert hub.stats() == {"subscribers": 0, "rides": 0, "cells": 0}
+    assert sub.closed
+    assert hub.publish("seats", {"rideId": "r1"}, INSIDE) == 0
+
+
+def test_unsubscribe_twice_frees_one_slot(hub, monkeypatch):
+    monkeypatch.setattr(Config, "EVENTS_MAX_SUBSCRIBERS", 2)
+    first = hub.subscribe(ride_ids=["r1"])
+    hub.subscribe(ride_ids=["r2"])
+    hub.unsubscribe(first)
+    hub.unsubscribe(first)
+    assert hub.stats()["subscribers"] == 1
+    hub.subscribe(ride_ids=["r3"])
+    with pytest.raises(OverflowError):
+        hub.subscribe(ride_ids=["r4"])
+
+
+def test_slow_consumer_is_closed_instead_of_buffering(hub, monkeypatch):
+    monkeypatch.setattr(Config, "EVENTS_QUEUE_SIZE", 2)
+    sub = hub.subscribe(ride_ids=["r1"])
+    for _ in range(3):
+        hub.publish("seats", {"rideId": "r1"})
+    assert sub.closed
+    assert len(frames(sub)) == 2
+
+
+def test_next_times_out_with_none(hub):
+    sub = hub.subscribe(ride_ids=["r1"])
+    assert sub.next(timeout=0.01) is None
+
+
+def test_seats_changed_publishes_counts(monkeypatch):
+    hub = EventHub(cell_degrees=0.05)
+    monkeypatch.setattr(events, "hub", hub)
+    monkeypatch.setattr(Config, "EVENTS_SOURCE", "local")
+    sub = hub.subscribe(ride_ids=["r1"])
+    ride = {"_id": "r1", "seats": 3, "pickupCoords": {"type": "Point", "coordinates": INSIDE}}
+    events.seats_changed(ride, 5)
+    [frame] = frames(sub)
+    body = frame.replace(" ", "")
+    assert '"seatsTaken":5' in body
+    assert '"seatsAvailable":0' in body
+
+
+def test_change_stream_mode_skips_local_publish(monkeypatch):
+    hub = EventHub(cell_degrees=0.05)
+    monkeypatch.setattr(events, "hub", hub)
+    monkeypatch.setattr(Config, "EVENTS_SOURCE", "changestream")
+    sub = hub.subscribe(ride_ids=["r1"])
+    events.seats_changed({"_id": "r1", "seats": 3}, 1)
+    assert frames(sub) == []
+
+
+def test_touches_passengers():
+    assert events._touches_passengers({"updateDescription": {"updatedFields": {"passengers.2": "u"}}})
+    assert events._touches_passengers({"updateDescription": {"updatedFields": {"passengers": []}}})
+    assert not events._touches_passengers({"updateDescription": {"updatedFields": {"updatedAt": 1}}})
+
+
+def test_stream_that_is_never_iterated_releases_its_slot(client, login, monkeypatch):
+    hub = EventHub(cell_degrees=0.05)
+    monkeypatch.setattr(events, "hub", hub)
+    monkeypatch.setattr(events, "start_change_feed", lambda get_db: None)
+    _, headers = login("viewer")
+
+    # HEAD drops the body unread, so the generator's finally never runs
+    response = client.head("/api/v1/events/rides?rides=" + "a" * 24, headers=headers)
+    assert response.status_code == 200
+    assert hub.stats()["subscribers"] == 1
+    response.close()
+    assert hub.stats()["subscribers"] == 0
@@ -0,0 +1,279 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from config import Config
+from geo_index import RideGridIndex
+from matching import METERS_PER_DEGREE_LAT
+from routes.ride_routes import parse_nearby_args, NEARBY_MAX_DIST
+
+LAT, LNG = 40.75, -73.98
+NOW = datetime.now(timezone.utc)
+
+
+def ride(north_m=0.0, seats=3, passengers=(), hours=2, **extra):
+    return {
+        "_id": ObjectId(),
+        "driverId": "driver",
+        "pickup": "A",
+        "dropoff": "B",
+        "pickupCoords": {"type": "Point", "coordinates": [LNG, LAT + north_m / METERS_PER_DEGREE_LAT]},
+        "time": NOW + timedelta(hours=hours),
+        "seats": seats,
+        "seatsAvailable": seats - len(passengers),
+        "passengers": list(passengers),
+        **extra,
+    }
+
+
+class FakeRides:
+    """Minimal db.rides: find() filters on 'time' / 'updatedAt' $gte and can run a hook mid-scan."""
+
+    def __init__(self, docs, during_scan=None):
+        self.docs = docs
+        self.during_scan = during_scan
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        (field, cond), = query.items()
+        matching = [d for d in self.docs if d.get(field) is not None and d[field] >= cond["$gte"]]
+        return FakeCursor(matching, self.during_scan)
+
+
+class FakeCursor:
+    def __init__(self, docs, during_scan):
+        self.docs = docs
+        self.during_scan = during_scan
+
+    def batch_size(self, n):
+        return self
+
+    def __iter__(self):
+        for i, doc in enumerate(self.docs):
+            if i == 1 and self.during_scan:
+                self.during_scan()
+            yield doc
+
+
+class FakeDb:
+    def __init__(self, docs, during_scan=None):
+        self.rides = FakeRides(docs, during_scan)
+
+
+@pytest.fixture
+def index():
+    return RideGridIndex(cell_degrees=0.01, max_rides=1000)
+
+
+def ids(results):
+    return [r["_id"] for r in results]
+
+
+def test_cold_index_defers_to_mongo(index):
+    assert index.nearby(LAT, LNG, 1000, 10) is None
+
+
+def test_nearby_filters_by_distance_seats_and_window(index):
+    close, far, full, late = ride(100), ride(5000), ride(200, seats=1, passengers=["p"]), ride(300, hours=48)
+    assert index.load(FakeDb([close, far, full, late]))
+
+    assert set(ids(index.nearby(LAT, LNG, 1000, 10))) == {str(close["_id"]), str(late["_id"])}
+    assert ids(index.nearby(LAT, LNG, 1000, 10, min_seats=0)).count(str(full["_id"])) == 1
+    assert ids(index.nearby(LAT, LNG, 1000, 10, before=NOW + timedelta(hours=24))) == [str(close["_id"])]
+
+
+def test_nearby_scores_like_the_pipeline(index):
+    near_few, far_many = ride(0, seats=1), ride(800, seats=4)
+    index.load(FakeDb([near_few, far_many]))
+    results = index.nearby(LAT, LNG, 1000, 10)
+    by_id = {r["_id"]: r for r in results}
+    # 50 * closeness + 10 per free seat (capped at 50)
+    assert by_id[str(near_few["_id"])]["matchScore"] == 60
+    assert by_id[str(far_many["_id"])]["matchScore"] == int((1000 - by_id[str(far_many["_id"])]["distance"]) / 1000 * 50) + 40
+    assert ids(results) == [str(near_few["_id"]), str(far_many["_id"])]
+
+
+def test_seats_come_from_the_denormalized_counter(index):
+    # seats - passengers says 2 free, the counter (what Mongo filters on) says full
+    drifted, legacy = ride(0, seats=3, passengers=["p"], seatsAvailable=0), ride(50)
+    del legacy["seatsAvailable"]
+    index.load(FakeDb([drifted, legacy]))
+    assert index.nearby(LAT, LNG, 1000, 10) == []
+    results = {r["_id"]: r for r in index.nearby(LAT, LNG, 1000, 10, min_seats=0)}
+    assert results[str(drifted["_id"])]["seatsAvailable"] == 0
+    assert results[str(legacy["_id"])]["seatsAvailable"] == 0
+
+
+def test_after_before_the_last_load_defers_to_mongo(index):
+    index.load(FakeDb([ride()]))
+    assert index.nearby(LAT, LNG, 1000, 10, after=datetime(2000, 1, 1, tzinfo=timezone.utc)) is None
+    assert len(index.nearby(LAT, LNG, 1000, 10, after=index.watermark)) == 1
+
+
+def test_huge_radius_walks_occupied_cells_only(index):
+    close, far = ride(100), ride(5_000_000)
+    index.load(FakeDb([close, far]))
+    start = time.perf_counter()
+    results = index.nearby(LAT, LNG, 20_000_000, 10)
+    assert time.perf_counter() - start < 1
+    assert set(ids(results)) == {str(close["_id"]), str(far["_id"])}
+
+
+def test_parse_nearby_args_caps_dist():
+    assert parse_nearby_args({"lat": "1", "lng": "2", "dist": str(NEARBY_MAX_DIST)})["max_dist"] == NEARBY_MAX_DIST
+    for dist in ("0", str(NEARBY_MAX_DIST + 1), "2e7"):
+        with pytest.raises(ValueError):
+            parse_nearby_args({"lat": "1", "lng": "2", "dist": dist})
+
+
+def test_remove_keeps_cells_dense(index):
+    rides = [ride(10 * i) for i in range(5)]
+    index.load(FakeDb(rides))
+    index.remove(rides[1]["_id"])
+    index.remove(rides[4]["_id"])
+    assert sorted(ids(index.nearby(LAT, LNG, 1000, 10))) == sorted(str(r["_id"]) for r in (rides[0], rides[2], rides[3]))
+    for key, pos in index._slots.values():
+        assert index._cells[key].ids[pos] in index._slots
+    assert index.stats()["rides"] == 3
+
+
+def test_passenger_write_through(index):
+    r = ride(0, seats=1)
+    index.load(FakeDb([r]))
+    index.add_passenger(r["_id"], "p1")
+    index.add_passenger(r["_id"], "p1")
+    assert index.nearby(LAT, LNG, 1000, 10) == []
+    index.remove_passenger(r["_id"], "p1")
+    index.remove_passenger(r["_id"], "p1")
+    results = index.nearby(LAT, LNG, 1000, 10)
+    assert ids(results) == [str(r["_id"])]
+    assert results[0]["seatsAvailable"] == 1
+
+
+def test_writes_during_full_load_survive_the_swap(index):
+    existing = [ride(0, seats=2), ride(50)]
+    created = ride(100)
+
+    def concurrent_writes():
+        index.upsert(created)
+        index.add_passenger(existing[0]["_id"], "p1")
+        index.add_passenger(existing[0]["_id"], "p2")
+
+    index.load(FakeDb(existing, during_scan=concurrent_writes))
+    results = {r["_id"]: r for r in index.nearby(LAT, LNG, 1000, 10, min_seats=0)}
+    assert str(created["_id"]) in results
+    assert results[str(existing[0]["_id"])]["passengers"] == ["p1", "p2"]
+    assert index._journal is None
+
+
+def test_incremental_refresh_applies_changes_and_drops_departed(index, monkeypatch):
+    monkeypatch.setattr(Config, "GEO_INDEX_OVERLAP", 30)
+    stays, departs, booked = ride(0), ride(10, hours=-1), ride(20, seats=2)
+    index.load(FakeDb([stays, booked]))
+    index.upsert(departs)                       # written through, has departed since
+
+    later = NOW + timedelta(minutes=5)
+    changed = [
+        {**booked, "passengers": ["p1", "p2"], "seatsAvailable": 0, "updatedAt": later},
+        {**ride(30), "updatedAt": later},      # created by another worker
+        {**stays, "updatedAt": index.watermark - timedelta(hours=1)},
+    ]
+    db = FakeDb(changed)
+    assert index.refresh(db)
+
+    (query,) = db.rides.queries
+    assert query["updatedAt"]["$gte"] < index.watermark
+    results = ids(index.nearby(LAT, LNG, 1000, 10))
+    assert str(booked["_id"]) not in results             # now full
+    assert str(departs["_id"]) not in results
+    assert str(changed[1]["_id"]) in results
+    assert str(stays["_id"]) in results
+
+
+def test_refresh_drops_rides_with_legacy_string_times(index):
+    kept = ride(0)
+    index.load(FakeDb([kept]))
+    later = index.watermark + timedelta(minutes=1)
+    legacy = {**ride(10), "time": "2030-01-01T09:00", "updatedAt": later}
+    index.upsert({**kept, "time": "2030-01-01T09:00"})   # written through before migration
+    assert index.refresh(FakeDb([legacy]))
+    assert index.nearby(LAT, LNG, 1000, 10, min_seats=0) == []
+
+
+def test_full_reload_is_periodic(index, monkeypatch):
+    assert index.needs_full_reload()
+    index.load(FakeDb([ride()]))
+    assert not index.needs_full_reload()
+    monkeypatch.setattr(Config, "GEO_INDEX_FULL_RELOAD", 0)
+    assert index.needs_full_reload()
+
+
+def test_too_many_rides_stays_cold(index):
+    small = RideGridIndex(cell_degrees=0.01, max_rides=2)
+    assert not small.load(FakeDb([ride(i) for i in range(3)]))
+    assert small.nearby(LAT, LNG, 1000, 10) is None
+    assert small.needs_full_reload()
+
+
+def test_disabled_index_is_not_reloaded_on_every_request(client, monkeypatch):
+    import routes.ride_routes as ride_routes
+
+    small = RideGridIndex(cell_degrees=0.01, max_rides=2)
+    assert not small.load(FakeDb([ride(i) for i in range(3)]))
+    loads = []
+    monkeypatch.setattr(small, "load", lambda db: loads.append(db))
+    monkeypatch.setattr(ride_routes, "ride_index", small)
+    monkeypatch.setattr(Config, "GEO_INDEX_ENABLED", True)
+
+    # mongomock has no $geoNear, so the Mongo fallback answers 500; only the reloads matter here
+    for lat in (LAT, LAT + 1):
+        client.get(f"/api/v1/rides/nearby?lat={lat}&lng={LNG}")
+    assert loads == []
+    assert not small.needs_refresh()
+
+
+def test_disabled_index_retries_after_the_full_reload_interval(monkeypatch):
+    small = RideGridIndex(cell_degrees=0.01, max_rides=2)
+    small.load(FakeDb([ride(i) for i in range(3)]))
+    monkeypatch.setattr(small, "disabled_until", time.monotonic() - 1)
+    assert small.needs_refresh()
+    assert small.load(FakeDb([ride()]))
+    assert small.disabled_until is None
+
+
+def test_every_view_returns_the_same_fields_warm_or_cold(client, mongo, new_ride, monkeypatch):
+    import routes.ride_routes as ride_routes
+    from routes.response_cache import nearby_cache
+
+    new_ride("driver")
+    build = ride_routes.build_nearby_pipeline
+    aggregates = []
+
+    def without_geo_near(**params):
+        # mongomock has no $geoNear: match the same query, distance 0
+        pipeline = build(**params)
+        aggregates.append(pipeline)
+        geo_near = pipeline[0]["$geoNear"]
+        return [{"$match": geo_near.get("query", {})}, {"$addFields": {"distance": 0.0}}, *pipeline[1:]]
+
+    warm = RideGridIndex(cell_degrees=0.01, max_rides=1000)
+    assert warm.load(mongo)
+    monkeypatch.setattr(ride_routes, "build_nearby_pipeline", without_geo_near)
+    monkeypatch.setattr(ride_routes, "ride_index", warm)
+
+    def fetch(view, enabled):
+        monkeypatch.setattr(Config, "GEO_INDEX_ENABLED", enabled)
+        nearby_cache.clear()
+        response = client.get(f"/api/v1/rides/nearby?lat={LAT}&lng={LNG}&view={view}")
+        assert response.status_code == 200
+        [ride_json] = response.get_json()
+        return {k: v for k, v in ride_json.items() if k not in ("distance", "matchScore")}, set(ride_json)
+
+    for view in ("card", "pin", "detail"):
+        del aggregates[:]
+        assert fetch(view, True) == fetch(view, False)
+        # Narrow views come from memory; 'detail' needs fields the index lacks
+        assert len(aggregates) == (2 if view == "detail" else 1)
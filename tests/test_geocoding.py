@@ -0,0 +1,186 @@
+import threading
+import time
+import urllib.error
+
+import mongomock
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+
+import cache
+import geocoding
+from config import Config
+from database import Database
+from geocoding import GeocoderUnavailable, GeocoderTimeout
+
+
+class StubGeocoder:
+    """Upstream stand-in: counts calls and can block or fail on demand."""
+
+    def __init__(self, results=None, error=None):
+        self.results = results if results is not None else [{"name": "Campus", "lat": 1.0, "lng": 2.0}]
+        self.error = error
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.entered = threading.Event()
+
+    def search(self, query, limit):
+        self.calls += 1
+        self.entered.set()
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        return self.results[:limit]
+
+    def reverse(self, lat, lng):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return {"displayName": "Main St", "lat": lat, "lng": lng}
+
+
+class BrokenCollection:
+    def find_one(self, *args, **kwargs):
+        raise ServerSelectionTimeoutError("no servers")
+
+    def update_one(self, *args, **kwargs):
+        raise ServerSelectionTimeoutError("no servers")
+
+
+class BrokenDb:
+    geocode_cache = BrokenCollection()
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(Database, "get_db", staticmethod(lambda stale_ok=False: database))
+    yield database
+    geocoding.memory_cache.clear()
+    geocoding._inflight.clear()
+
+
+def use(monkeypatch, stub):
+    monkeypatch.setattr(geocoding, "_upstream", stub)
+    geocoding.memory_cache.clear()
+    return stub
+
+
+def test_cache_tiers(db, monkeypatch):
+    stub = use(monkeypatch, StubGeocoder())
+    first = geocoding.geocode("Campus", 5)
+    assert stub.calls == 1
+    assert db.geocode_cache.count_documents({}) == 1
+
+    # LRU hit
+    assert geocoding.geocode("  campus ", 5) == first
+    assert stub.calls == 1
+
+    # Mongo hit after the LRU is gone (e.g. another worker)
+    geocoding.memory_cache.clear()
+    assert geocoding.geocode("Campus", 5) == first
+    assert stub.calls == 1
+
+
+def test_empty_answers_are_not_stored(db, monkeypatch):
+    use(monkeypatch, StubGeocoder(results=[]))
+    assert geocoding.geocode("Nowhere", 5) == []
+    assert db.geocode_cache.count_documents({}) == 0
+
+
+def test_empty_answers_expire_from_memory_quickly(db, monkeypatch, clock):
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    stub = use(monkeypatch, StubGeocoder(results=[]))
+    geocoding.geocode("Nowhere", 5)
+    geocoding.geocode("Nowhere", 5)
+    assert stub.calls == 1
+
+    clock.advance(Config.GEOCODE_NEGATIVE_TTL + 1)
+    stub.results = [{"name": "Nowhere", "lat": 1.0, "lng": 2.0}]
+    assert geocoding.geocode("Nowhere", 5) == stub.results
+    assert stub.calls == 2
+
+    # Real answers keep the long memory TTL
+    clock.advance(Config.GEOCODE_NEGATIVE_TTL + 1)
+    geocoding.geocode("Nowhere", 5)
+    assert stub.calls == 2
+
+
+def test_reverse_lookups_share_a_grid_cell(db, monkeypatch):
+    stub = use(monkeypatch, StubGeocoder())
+    step = Config.GEOCODE_REVERSE_DEGREES
+    assert geocoding.reverse_geocode(40.0, -73.0) is not None
+    geocoding.reverse_geocode(40.0 + step / 4, -73.0 - step / 4)
+    assert stub.calls == 1
+
+
+def test_upstream_failure_raises_unavailable(db, monkeypatch):
+    use(monkeypatch, StubGeocoder(error=urllib.error.URLError("connection refused")))
+    with pytest.raises(GeocoderUnavailable) as info:
+        geocoding.geocode("Campus", 5)
+    assert not isinstance(info.value, GeocoderTimeout)
+    assert geocoding._inflight == {}
+
+
+def test_upstream_timeout_raises_timeout(db, monkeypatch):
+    use(monkeypatch, StubGeocoder(error=urllib.error.URLError(TimeoutError("timed out"))))
+    with pytest.raises(GeocoderTimeout):
+        geocoding.geocode("Campus", 5)
+
+
+def test_mongo_errors_fall_through_to_upstream(monkeypatch):
+    monkeypatch.setattr(Database, "get_db", staticmethod(lambda stale_ok=False: BrokenDb()))
+    stub = use(monkeypatch, StubGeocoder())
+    try:
+        assert geocoding.geocode("Campus", 5) == stub.results
+        assert stub.calls == 1
+    finally:
+        geocoding.memory_cache.clear()
+
+
+def start_lookup(results, key="Campus"):
+    def run():
+        try:
+            results.append(geocoding.geocode(key, 5))
+        except Exception as e:
+            results.append(e)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_for_inflight():
+    deadline = time.monotonic() + 2
+    while not geocoding._inflight and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert geocoding._inflight
+
+
+def test_concurrent_misses_are_coalesced(db, monkeypatch):
+    stub = use(monkeypatch, StubGeocoder())
+    stub.release.clear()
+    results = []
+    leader = start_lookup(results)
+    assert stub.entered.wait(2)
+    follower = start_lookup(results)
+    time.sleep(0.05)
+    stub.release.set()
+    leader.join(2)
+    follower.join(2)
+    assert stub.calls == 1
+    assert results == [stub.results, stub.results]
+
+
+def test_follower_times_out_with_geocoder_timeout(db, monkeypatch):
+    monkeypatch.setattr(Config, "GEOCODER_TIMEOUT", 0.05)
+    stub = use(monkeypatch, StubGeocoder())
+    stub.release.clear()
+    results = []
+    leader = start_lookup(results)
+    assert stub.entered.wait(2)
+    wait_for_inflight()
+    with pytest.raises(GeocoderTimeout):
+        geocoding.geocode("Campus", 5)
+    stub.release.set()
+    leader.join(2)
+    assert results == [stub.results]
@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+import pytest
+from bson import ObjectId
+
+from routes.json_stream import aiter_json_array, primed_json_array
+
+
+class AsyncCursor:
+    """Async-iterable list of documents that can fail after 'fail_after' docs."""
+
+    def __init__(self, docs, fail_after=None):
+        self.docs = docs
+        self.fail_after = fail_after
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for i, doc in enumerate(self.docs):
+            if i == self.fail_after:
+                raise RuntimeError("cursor died")
+            yield doc
+
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 3, 4, 7])
+def test_chunks_join_to_valid_json(count):
+    docs = [{"_id": ObjectId(), "n": i} for i in range(count)]
+    chunks = asyncio.run(collect(aiter_json_array(AsyncCursor(docs), batch_size=2)))
+    assert [d["n"] for d in json.loads("".join(chunks))] == list(range(count))
+
+
+def test_first_chunk_contains_first_batch():
+    docs = [{"n": i} for i in range(5)]
+    first = asyncio.run(aiter_json_array(AsyncCursor(docs), batch_size=2).__anext__())
+    assert first == '[{"n":0},{"n":1}'
+
+
+def test_primed_raises_before_response_when_first_batch_fails():
+    with pytest.raises(RuntimeError):
+        asyncio.run(primed_json_array(AsyncCursor([{"n": 0}], fail_after=0), batch_size=2))
+
+
+def test_primed_streams_everything_and_aborts_on_late_failure():
+    async def run(cursor):
+        return await collect(await primed_json_array(cursor, batch_size=2))
+
+    assert json.loads("".join(asyncio.run(run(AsyncCursor([{"n": i} for i in range(3)]))))) == [
+        {"n": 0}, {"n": 1}, {"n": 2}
+    ]
+    with pytest.raises(RuntimeError):
+        asyncio.run(run(AsyncCursor([{"n": i} for i in range(5)], fail_after=3)))
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from maintenance import archive_past_rides, migrate_ride_times
+from models import parse_departure
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2025-01-01T10:00", datetime(2025, 1, 1, 10, 0, tzinfo=timezone.utc)),
+    ("2025-01-01T10:00Z", datetime(2025, 1, 1, 10, 0, tzinfo=timezone.utc)),
+    ("2025-01-01T15:00+05:00", datetime(2025, 1, 1, 10, 0, tzinfo=timezone.utc)),
+    (datetime(2025, 1, 1, 10, 0), datetime(2025, 1, 1, 10, 0, tzinfo=timezone.utc)),
+])
+def test_parse_departure_returns_aware_utc(value, expected):
+    when = parse_departure(value)
+    assert when == expected
+    assert when.utcoffset() == timedelta(0)
+
+
+@pytest.mark.parametrize("value", ["", "  ", "tomorrow", None, 1735725600])
+def test_parse_departure_rejects_unparseable_values(value):
+    with pytest.raises(ValueError):
+        parse_departure(value)
+
+
+def test_migrate_ride_times(mongo, capsys):
+    legacy = mongo.rides.insert_one({"time": "2025-01-01T15:00+05:00"}).inserted_id
+    broken = mongo.rides.insert_one({"time": "next tuesday"}).inserted_id
+    typed = mongo.rides.insert_one({"time": NOW}).inserted_id
+
+    migrate_ride_times(mongo)
+    assert mongo.rides.find_one({"_id": legacy})["time"] == datetime(2025, 1, 1, 10, 0, tzinfo=timezone.utc)
+    assert mongo.rides.find_one({"_id": broken})["time"] == "next tuesday"
+    assert "Skipped 1 rides with unparseable time" in capsys.readouterr().out
+    before = list(mongo.rides.find().sort("_id", 1))
+
+    migrate_ride_times(mongo)
+    assert list(mongo.rides.find().sort("_id", 1)) == before
+    assert abs(mongo.rides.find_one({"_id": typed})["time"] - NOW) < timedelta(milliseconds=1)
+
+
+def test_archive_moves_departed_rides(mongo):
+    departed = mongo.rides.insert_one({"time": NOW - timedelta(hours=2)}).inserted_id
+    within_grace = mongo.rides.insert_one({"time": NOW - timedelta(minutes=5)}).inserted_id
+    upcoming = mongo.rides.insert_one({"time": NOW + timedelta(hours=2)}).inserted_id
+
+    assert archive_past_rides(mongo, grace_minutes=30) == 1
+    assert [r["_id"] for r in mongo.rides_history.find()] == [departed]
+    assert {r["_id"] for r in mongo.rides.find()} == {within_grace, upcoming}
+
+    assert archive_past_rides(mongo, grace_minutes=30) == 0
+    assert mongo.rides_history.count_documents({}) == 1
+    assert mongo.rides.count_documents({}) == 2
+
+
+def test_archive_finishes_a_ride_copied_by_an_interrupted_run(mongo):
+    ride = {"time": NOW - timedelta(hours=2)}
+    ride_id = mongo.rides.insert_one(ride).inserted_id
+    mongo.rides_history.insert_one(dict(ride))   # copied, delete never ran
+
+    assert archive_past_rides(mongo, grace_minutes=0) == 1
+    assert mongo.rides.count_documents({}) == 0
+    assert [r["_id"] for r in mongo.rides_history.find()] == [ride_id]
@@ -0,0 +1,74 @@
+import pytest
+
+from matching import rank_matches, bounding_polygon, haversine, METERS_PER_DEGREE_LAT
+from routes.ride_routes import build_match_pipeline, build_nearby_pipeline
+
+ORIGIN = (-73.98, 40.75)
+DESTINATION = (-73.90, 40.80)
+
+
+def point(lng, lat):
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def ride(name, pickup_offset_m=0.0, dropoff_offset_m=0.0):
+    """A ride whose pickup / dropoff lie north of origin / destination by the given meters."""
+    return {
+        "_id": name,
+        "pickupCoords": point(ORIGIN[0], ORIGIN[1] + pickup_offset_m / METERS_PER_DEGREE_LAT),
+        "dropoffCoords": point(DESTINATION[0], DESTINATION[1] + dropoff_offset_m / METERS_PER_DEGREE_LAT),
+    }
+
+
+def test_haversine_one_degree_of_latitude():
+    assert haversine(0.0, 0.0, 0.0, 1.0) == pytest.approx(111195, rel=1e-3)
+
+
+def test_bounding_polygon_is_closed_box_around_point():
+    ring = bounding_polygon(*ORIGIN, 1000)["coordinates"][0]
+    assert ring[0] == ring[-1]
+    lngs = [p[0] for p in ring]
+    lats = [p[1] for p in ring]
+    assert min(lngs) < ORIGIN[0] < max(lngs)
+    assert min(lats) < ORIGIN[1] < max(lats)
+
+
+def test_rank_orders_by_score_and_limits():
+    rides = [ride("far", 1500, 1500), ride("exact"), ride("near", 200, 300)]
+    ranked = rank_matches(rides, ORIGIN, DESTINATION, 2000, 2000, limit=2)
+    assert [r["_id"] for r in ranked] == ["exact", "near"]
+    assert ranked[0]["matchScore"] == 100
+    assert ranked[0]["pickupDistance"] == pytest.approx(0, abs=0.5)
+    assert ranked[1]["pickupDistance"] == pytest.approx(200, rel=0.01)
+    assert ranked[1]["dropoffDistance"] == pytest.approx(300, rel=0.01)
+
+
+def test_rank_drops_rides_outside_either_radius():
+    rides = [ride("pickup too far", 2500, 0), ride("dropoff too far", 0, 3500), ride("ok", 100, 100)]
+    assert [r["_id"] for r in rank_matches(rides, ORIGIN, DESTINATION, 2000, 3000, 10)] == ["ok"]
+
+
+def test_rank_breaks_ties_on_detour():
+    # Same pickup/dropoff distances, but 'short' starts past the origin and ends
+    # before the destination, so picking the passenger up costs a longer detour
+    short = ride("short", 500, -500)
+    long = ride("long", -500, 500)
+    ranked = rank_matches([short, long], ORIGIN, DESTINATION, 2000, 2000, 10)
+    assert [r["_id"] for r in ranked] == ["long", "short"]
+    assert ranked[0]["matchScore"] == ranked[1]["matchScore"]
+    assert ranked[0]["detourMeters"] < ranked[1]["detourMeters"]
+
+
+def test_rank_empty_and_does_not_mutate_input():
+    assert rank_matches([], ORIGIN, DESTINATION, 2000, 2000, 10) == []
+    rides = [ride("exact")]
+    rank_matches(rides, ORIGIN, DESTINATION, 2000, 2000, 10)
+    assert "matchScore" not in rides[0]
+
+
+def test_geonear_stages_name_their_index_key():
+    # 'rides' has several 2dsphere indexes; without 'key' MongoDB rejects $geoNear
+    nearby = build_nearby_pipeline(40.75, -73.98, 5000, 50)
+    match = build_match_pipeline(ORIGIN, DESTINATION, 2000, 3000)
+    assert nearby[0]["$geoNear"]["key"] == "pickupCoords"
+    assert match[0]["$geoNear"]["key"] == "pickupCoords"
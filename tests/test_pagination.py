@@ -0,0 +1,160 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+
+from routes.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE,
+    encode_cursor, decode_cursor, parse_page_args, seek_filter, take_page, page_response,
+)
+
+BASE = datetime(2025, 1, 1, 8, 0, tzinfo=timezone.utc)
+
+
+def row(minutes, relevance=None):
+    doc = {"_id": ObjectId(), "time": BASE + timedelta(minutes=minutes)}
+    if relevance is not None:
+        doc["relevance"] = relevance
+    return doc
+
+
+def token(value):
+    raw = json.dumps(value).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def test_cursor_round_trip():
+    doc = row(30)
+    cursor = decode_cursor(encode_cursor(doc))
+    assert cursor["time"] == doc["time"]
+    assert cursor["_id"] == doc["_id"]
+    assert cursor["relevance"] is None
+
+
+def test_cursor_round_trip_with_relevance():
+    doc = row(30, relevance=2.5)
+    assert decode_cursor(encode_cursor(doc, with_relevance=True))["relevance"] == 2.5
+
+
+def test_cursor_token_is_url_safe():
+    assert "=" not in encode_cursor(row(0))
+
+
+@pytest.mark.parametrize("bad", [
+    "W10",                                  # []
+    token(None),
+    token(42),
+    token("abc"),
+    token({"t": BASE.isoformat()}),         # missing id
+    token({"t": BASE.isoformat(), "id": "not-an-id"}),
+    token({"t": "yesterday", "id": str(ObjectId())}),
+    token({"t": None, "id": str(ObjectId())}),
+    token({"t": "", "id": str(ObjectId())}),
+    token({"id": str(ObjectId())}),
+    token({"t": {"$gt": ""}, "id": str(ObjectId())}),
+    token({"t": BASE.isoformat(), "id": str(ObjectId()), "r": {"$gt": -1}}),
+    token({"t": BASE.isoformat(), "id": str(ObjectId()), "r": "1"}),
+    token({"t": BASE.isoformat(), "id": str(ObjectId()), "r": True}),
+    "!!!",
+])
+def test_malformed_cursor_raises_value_error(bad):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(bad)
+
+
+def test_parse_page_args_defaults_and_bounds():
+    assert parse_page_args({}) == (DEFAULT_PAGE_SIZE, None)
+    assert parse_page_args({"limit": "0"})[0] == 1
+    assert parse_page_args({"limit": "100000"})[0] == MAX_PAGE_SIZE
+    with pytest.raises(ValueError):
+        parse_page_args({"limit": "ten"})
+    with pytest.raises(ValueError):
+        parse_page_args({"cursor": "W10"})
+
+
+def test_seek_filter_without_cursor_is_empty():
+    assert seek_filter(None) == {}
+
+
+def test_seek_filter_ascending_and_descending():
+    cursor = decode_cursor(encode_cursor(row(0)))
+    assert seek_filter(cursor) == {"$or": [
+        {"time": {"$gt": cursor["time"]}},
+        {"time": cursor["time"], "_id": {"$gt": cursor["_id"]}},
+    ]}
+    assert seek_filter(cursor, descending=True) == {"$or": [
+        {"time": {"$lt": cursor["time"]}},
+        {"time": cursor["time"], "_id": {"$lt": cursor["_id"]}},
+    ]}
+
+
+def test_seek_filter_with_relevance_orders_relevance_first():
+    cursor = decode_cursor(encode_cursor(row(0, relevance=3), with_relevance=True))
+    query = seek_filter(cursor, with_relevance=True)
+    assert query["$or"][0] == {"relevance": {"$lt": 3}}
+    assert query["$or"][1]["$and"][0] == {"relevance": 3}
+    assert query["$or"][1]["$and"][1] == seek_filter(cursor)
+
+
+def test_take_page_last_page_has_no_cursor():
+    docs = [row(i) for i in range(3)]
+    assert take_page(docs, 3) == (docs, None)
+
+
+def test_take_page_cursor_points_after_last_row():
+    docs = [row(i) for i in range(4)]
+    page, next_cursor = take_page(iter(docs), 3)
+    assert page == docs[:3]
+    assert decode_cursor(next_cursor)["_id"] == docs[2]["_id"]
+
+
+def test_page_response_sets_next_cursor_headers():
+    app = Flask(__name__)
+    with app.test_request_context("/api/v1/rides?limit=2&origin=New York"):
+        response, status = page_response([{"a": 1}], "abc")
+    assert status == 200
+    assert response.headers["X-Next-Cursor"] == "abc"
+    assert response.headers["Link"] == '</api/v1/rides?limit=2&origin=New%20York&cursor=abc>; rel="next"'
+
+
+def test_page_response_last_page_has_no_headers():
+    app = Flask(__name__)
+    with app.test_request_context("/api/v1/rides"):
+        response, _ = page_response([], None)
+    assert "X-Next-Cursor" not in response.headers
+    assert "Link" not in response.headers
+
+
+def test_take_page_skips_legacy_string_times_for_the_cursor():
+    docs = [row(0), {"_id": ObjectId(), "time": "2025-01-01T09:00"}, row(5)]
+    page, next_cursor = take_page(docs, 2)
+    assert page == docs[:2]
+    assert decode_cursor(next_cursor)["_id"] == docs[0]["_id"]
+
+
+def test_take_page_without_datetime_rows_has_no_cursor():
+    docs = [{"_id": ObjectId(), "time": "2025-01-01T09:00"} for _ in range(3)]
+    assert take_page(docs, 2) == (docs[:2], None)
+
+
+def test_my_rides_by_role_pages_through_headers(client, mongo, login):
+    user_id, headers = login("driver")
+    mongo.rides.insert_many([{"driverId": user_id, "pickup": "A", "dropoff": "B", "passengers": [],
+                              "time": BASE + timedelta(minutes=i)} for i in range(3)])
+
+    first = client.get("/api/v1/my/rides?role=driver&limit=2", headers=headers)
+    assert first.status_code == 200
+    assert len(first.get_json()) == 2
+    cursor = first.headers["X-Next-Cursor"]
+
+    second = client.get(f"/api/v1/my/rides?role=driver&limit=2&cursor={cursor}", headers=headers)
+    assert len(second.get_json()) == 1
+    assert "X-Next-Cursor" not in second.headers
+
+    combined = client.get("/api/v1/my/rides?limit=2", headers=headers).get_json()
+    assert set(combined) == {"driven_rides", "joined_rides"}
+    assert client.get("/api/v1/my/rides?role=owner", headers=headers).status_code == 400
+    assert client.get(f"/api/v1/my/rides?cursor={cursor}", headers=headers).status_code == 400
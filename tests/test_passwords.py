@@ -0,0 +1,75 @@
+import os
+
+import pytest
+from werkzeug.security import check_password_hash
+
+import passwords
+from config import Config
+
+FAST = "pbkdf2:sha256:1000"
+
+
+@pytest.fixture
+def method(monkeypatch):
+    def set_method(value):
+        monkeypatch.setattr(Config, "PASSWORD_HASH_METHOD", value)
+    return set_method
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A real one-process pool, torn down after the test."""
+    monkeypatch.setattr(Config, "PASSWORD_POOL_WORKERS", 1)
+    monkeypatch.setattr(Config, "PASSWORD_HASH_METHOD", FAST)
+    yield
+    if passwords._executor is not None:
+        passwords._executor.shutdown(wait=True)
+    passwords._executor = None
+
+
+@pytest.mark.parametrize("stored, configured, expected", [
+    # werkzeug's default iteration count satisfies a method without one
+    ("pbkdf2:sha256:1000000$salt$hash", "pbkdf2:sha256", False),
+    ("pbkdf2:sha256:1000000$salt$hash", "pbkdf2", False),
+    # never downgrade a stronger hash
+    ("pbkdf2:sha256:1000000$salt$hash", "pbkdf2:sha256:600000", False),
+    ("pbkdf2:sha256:260000$salt$hash", "pbkdf2:sha256", True),
+    ("pbkdf2:sha1:1000000$salt$hash", "pbkdf2:sha256", True),
+    ("scrypt:32768:8:1$salt$hash", "pbkdf2:sha256", True),
+    ("scrypt:32768:8:1$salt$hash", "scrypt", False),
+    ("scrypt:16384:8:1$salt$hash", "scrypt", True),
+    ("pbkdf2:sha256:bogus$salt$hash", "pbkdf2:sha256", True),
+])
+def test_needs_rehash(method, stored, configured, expected):
+    method(configured)
+    assert passwords.needs_rehash(stored) is expected
+
+
+def test_inline_hash_round_trip(monkeypatch, method):
+    monkeypatch.setattr(Config, "PASSWORD_POOL_WORKERS", 0)
+    method(FAST)
+    stored = passwords.hash_password("secret")
+    assert stored.startswith(FAST + "$")
+    assert passwords.verify_password(stored, "secret")
+    assert not passwords.verify_password(stored, "wrong")
+    assert not passwords.needs_rehash(stored)
+
+
+def test_pool_does_not_fork(pool):
+    executor = passwords._get_executor()
+    assert executor._mp_context.get_start_method() in ("forkserver", "spawn")
+    assert check_password_hash(passwords.hash_password("secret"), "secret")
+
+
+def test_dead_pool_process_is_replaced(pool):
+    broken = passwords._get_executor()
+    # Kill the pool's only process: the executor is now permanently broken
+    with pytest.raises(Exception):
+        broken.submit(os._exit, 1).result()
+
+    stored = passwords.hash_password("secret")     # hashed inline, pool discarded
+    assert check_password_hash(stored, "secret")
+    assert passwords._executor is None
+    assert passwords.verify_password(stored, "secret")   # fresh pool
+    assert passwords._executor is not broken
+    assert passwords.pending() == 0
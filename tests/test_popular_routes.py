@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import cache
+import routes.ride_routes as ride_routes
+from routes.ride_routes import record_route, route_bucket, routes_cache
+
+URL = "/api/v1/analytics/popular-routes"
+NOW = datetime(2025, 6, 1, 12, 30, tzinfo=timezone.utc)
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return NOW.astimezone(tz) if tz else NOW.replace(tzinfo=None)
+
+
+@pytest.fixture(autouse=True)
+def frozen(monkeypatch):
+    monkeypatch.setattr(ride_routes, "datetime", FrozenDatetime)
+    routes_cache.clear()
+    yield
+    routes_cache.clear()
+
+
+@pytest.fixture
+def headers(login):
+    return login("analyst")[1]
+
+
+def ride(mongo, pickup, dropoff, created_at, count=1):
+    for _ in range(count):
+        record_route(mongo, pickup, dropoff, created_at)
+
+
+def top(client, headers, window):
+    response = client.get(f"{URL}?window={window}", headers=headers)
+    assert response.status_code == 200
+    return [(r["_id"]["from"], r["_id"]["to"], r["rideCount"]) for r in response.get_json()]
+
+
+def test_route_bucket_is_the_utc_hour():
+    local = datetime(2025, 6, 1, 17, 45, tzinfo=timezone(timedelta(hours=5)))
+    assert route_bucket(local) == datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+    assert route_bucket(datetime(2025, 6, 1, 12, 45)) == datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def test_windows(client, mongo, headers):
+    ride(mongo, "Campus", "Airport", NOW - timedelta(hours=1), count=2)
+    ride(mongo, "Campus", "Mall", NOW - timedelta(days=3))
+    ride(mongo, "Dorms", "Station", NOW - timedelta(days=30), count=3)
+
+    assert top(client, headers, "24h") == [("Campus", "Airport", 2)]
+    assert top(client, headers, "7d") == [("Campus", "Airport", 2), ("Campus", "Mall", 1)]
+    assert top(client, headers, "all") == [("Dorms", "Station", 3), ("Campus", "Airport", 2), ("Campus", "Mall", 1)]
+
+
+def test_window_start_is_the_utc_hour_24h_ago(client, mongo, headers):
+    # Window starts at 2025-05-31 12:00 UTC (NOW - 24h, truncated to the hour)
+    ride(mongo, "In", "Window", datetime(2025, 5, 31, 12, 5, tzinfo=timezone.utc))
+    # Same instant as 12:10 UTC, given in another zone
+    ride(mongo, "Also", "In", datetime(2025, 5, 31, 17, 10, tzinfo=timezone(timedelta(hours=5))))
+    ride(mongo, "Too", "Early", datetime(2025, 5, 31, 11, 55, tzinfo=timezone.utc))
+
+    assert sorted(top(client, headers, "24h")) == [("Also", "In", 1), ("In", "Window", 1)]
+
+
+def test_invalid_window(client, headers):
+    assert client.get(f"{URL}?window=1y", headers=headers).status_code == 400
+
+
+def test_cached_result_is_reloaded_after_the_ttl(client, mongo, headers, monkeypatch, clock):
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    ride(mongo, "Campus", "Airport", NOW - timedelta(hours=1))
+    assert top(client, headers, "all") == [("Campus", "Airport", 1)]
+
+    ride(mongo, "Campus", "Airport", NOW - timedelta(hours=1))
+    clock.advance(routes_cache.refresh_after / 2)
+    assert top(client, headers, "all") == [("Campus", "Airport", 1)]
+
+    clock.advance(routes_cache.ttl)
+    assert top(client, headers, "all") == [("Campus", "Airport", 2)]
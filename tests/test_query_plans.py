@@ -0,0 +1,101 @@
+"""
+Explain-plan checks for every query_catalog shape (see explain_check.py).
+
+The plan tests need a real mongod and are skipped unless EXPLAIN_MONGO_URI
+points at one. The database in that URI is WIPED and reseeded:
+
+    EXPLAIN_MONGO_URI=mongodb://localhost:27017/unicarpool_explain python -m pytest tests/test_query_plans.py
+"""
+import os
+import random
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure, PyMongoError
+
+from query_catalog import QueryShape, query_shapes, check_shape, plan_problems, plan_stages, aggregate
+
+MONGO_URI = os.environ.get("EXPLAIN_MONGO_URI")
+SHAPE_NAMES = [shape.name for shape in query_shapes()]
+
+
+def winning(stage):
+    return {"queryPlanner": {"winningPlan": {"stage": stage}}}
+
+
+class RefusingDb:
+    def command(self, *args, **kwargs):
+        raise OperationFailure("unable to find index for $geoNear query", code=291)
+
+
+def test_plan_problems_flags_collscan_and_unexplained_sort():
+    shape = QueryShape("s", "rides", {})
+    assert plan_problems(shape, winning("COLLSCAN")) == ["COLLSCAN"]
+    assert plan_problems(shape, winning("SORT")) == ["blocking SORT"]
+    assert plan_problems(QueryShape("s", "rides", {}, sort_ok="top-k"), winning("SORT")) == []
+    assert plan_problems(shape, {}) == ["no winning plan in explain output"]
+
+
+def classic_aggregate(*stages):
+    """Aggregate explain as the classic engine reports it: pipeline stages beside the plan."""
+    cursor = {"$cursor": {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}}}
+    return {"stages": [cursor, *stages]}
+
+
+def test_plan_stages_include_classic_pipeline_stages():
+    result = classic_aggregate({"$group": {"_id": "$x"}}, {"$sort": {"sortKey": {"n": -1}}})
+    assert sorted(plan_stages(result)) == ["$GROUP", "$SORT", "FETCH", "IXSCAN"]
+
+
+def test_aggregate_sort_on_unindexed_key_fails():
+    shape = QueryShape("s", "rides", aggregate("rides", [{"$sort": {"seats": 1}}]))
+    assert plan_problems(shape, classic_aggregate({"$sort": {"sortKey": {"seats": 1}}})) == ["blocking $sort"]
+    assert plan_problems(shape, classic_aggregate({"$group": {"_id": "$seats"}})) == ["blocking $group"]
+    shape.sort_ok = "documented"
+    assert plan_problems(shape, classic_aggregate({"$sort": {"sortKey": {"seats": 1}}})) == []
+
+
+def test_check_shape_reports_server_errors_as_problems():
+    stages, problems = check_shape(RefusingDb(), QueryShape("s", "rides", {}))
+    assert stages == []
+    assert problems[0].startswith("explain failed: unable to find index")
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    if not MONGO_URI:
+        pytest.skip("EXPLAIN_MONGO_URI not set")
+    try:
+        MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000).admin.command("ping")
+    except PyMongoError as e:
+        pytest.skip(f"no mongod at EXPLAIN_MONGO_URI: {e}")
+
+    from benchmark import seed
+    from config import Config
+    from database import Database
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(Config, "MONGO_URI", MONGO_URI)
+        mp.setattr(Config, "INDEX_BUILD", "off")
+        Database.reset()
+        db = Database.get_db()
+        Database.ensure_indexes(force=True)
+        user_ids = seed(db, 50, 1000, random.Random(42))
+        ride = db.rides.find_one({}, {"_id": 1})
+        shapes = {s.name: s for s in query_shapes(user_id=user_ids[0], ride_id=ride["_id"])}
+        yield db, shapes
+        Database.reset()
+
+
+@pytest.mark.parametrize("name", SHAPE_NAMES)
+def test_shape_is_index_backed(seeded, name):
+    db, shapes = seeded
+    stages, problems = check_shape(db, shapes[name])
+    assert not problems, f"{name}: {', '.join(problems)} -> {' > '.join(stages)}"
+
+
+def test_unindexed_aggregate_sort_is_caught(seeded):
+    db, _ = seeded
+    shape = QueryShape("unindexed sort", "rides",
+        aggregate("rides", [{"$match": {"seats": {"$gte": 1}}}, {"$sort": {"pickup": 1, "seats": -1}}]))
+    _, problems = check_shape(db, shape)
+    assert problems
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+from flask import Flask
+
+from cache import TTLCache
+from routes.response_cache import cached_json, quantize, invalidate_ride, nearby_cache, availability_cache
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+class Producer:
+    def __init__(self, payload=None, status=200):
+        self.payload = {"rides": [1, 2]} if payload is None else payload
+        self.status = status
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.payload, self.status
+
+
+def get(app, cache, key, producer, headers=None):
+    with app.test_request_context("/", headers=headers or {}):
+        return cached_json(cache, key, producer)
+
+
+def test_miss_then_hit_with_validators(app):
+    cache, producer = TTLCache(10, 60), Producer()
+    first = get(app, cache, "k", producer)
+    second = get(app, cache, "k", producer)
+    assert producer.calls == 1
+    assert first.status_code == second.status_code == 200
+    assert json.loads(first.get_data()) == {"rides": [1, 2]}
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert "Last-Modified" in first.headers
+
+
+def test_if_none_match_answers_304(app):
+    cache, producer = TTLCache(10, 60), Producer()
+    etag = get(app, cache, "k", producer).headers["ETag"]
+    for header in (etag, f'"other", {etag}', "*"):
+        res = get(app, cache, "k", producer, {"If-None-Match": header})
+        assert res.status_code == 304
+        assert res.get_data() == b""
+        assert res.headers["ETag"] == etag
+    assert get(app, cache, "k", producer, {"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_if_modified_since(app):
+    cache, producer = TTLCache(10, 60), Producer()
+    last_modified = get(app, cache, "k", producer).headers["Last-Modified"]
+    assert get(app, cache, "k", producer, {"If-Modified-Since": last_modified}).status_code == 304
+    assert get(app, cache, "k", producer, {"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}).status_code == 200
+    assert get(app, cache, "k", producer, {"If-Modified-Since": "garbage"}).status_code == 200
+
+
+def test_errors_are_not_cached(app):
+    cache, producer = TTLCache(10, 60), Producer({"message": "Ride not found"}, 404)
+    assert get(app, cache, "k", producer).status_code == 404
+    assert get(app, cache, "k", producer).status_code == 404
+    assert producer.calls == 2
+    assert "ETag" not in get(app, cache, "k", producer).headers
+
+
+def test_etag_follows_content(app):
+    cache = TTLCache(10, 60)
+    a = get(app, cache, "a", Producer({"n": 1})).headers["ETag"]
+    b = get(app, cache, "b", Producer({"n": 2})).headers["ETag"]
+    c = get(app, cache, "c", Producer({"n": 1})).headers["ETag"]
+    assert a != b
+    assert a == c
+
+
+def test_quantize_shares_a_cell():
+    assert quantize(40.75012, 0.001) == quantize(40.75088, 0.001) == 40.7505
+    assert quantize(40.7501, 0.001) != quantize(40.7511, 0.001)
+    assert quantize(-73.9801, 0.001) == -73.9805
+
+
+def test_invalidate_ride():
+    nearby_cache.set("cell", {"body": b"[]"})
+    availability_cache.set("r1", {"body": b"{}"})
+    availability_cache.set("r2", {"body": b"{}"})
+    invalidate_ride("r1")
+    assert nearby_cache.get("cell") is None
+    assert availability_cache.get("r1") is None
+    assert availability_cache.get("r2") is not None
+    availability_cache.clear()
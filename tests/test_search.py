@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+
+from routes import ride_routes
+from routes.ride_routes import build_search_pipeline, token_prefix_filter, SEARCH_MAX_CANDIDATES
+
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def test_no_searchable_words_matches_nothing():
+    assert token_prefix_filter("  - ") is None
+    assert build_search_pipeline("--", None) is None
+
+
+def test_prefix_filter_is_anchored_per_word():
+    clause = token_prefix_filter("Uni. (Lib")
+    assert sorted(p.pattern for p in clause["$all"]) == ["^lib", "^uni"]
+
+
+def test_candidates_are_bounded_before_ranking():
+    pipeline = build_search_pipeline("ca", "uni", 51, NOW)
+    match, sort, limit, add_fields = pipeline[:4]
+    assert set(match["$match"]) == {"time", "pickupTokens", "dropoffTokens"}
+    assert sort == {"$sort": {"time": 1, "_id": 1}}
+    assert limit == {"$limit": SEARCH_MAX_CANDIDATES}
+    assert "relevance" in add_fields["$addFields"]
+    assert pipeline[-3:-1] == [{"$sort": {"relevance": -1, "time": 1, "_id": 1}}, {"$limit": 51}]
+
+
+def test_candidate_bound_does_not_depend_on_page_size(monkeypatch):
+    monkeypatch.setattr(ride_routes, "SEARCH_MAX_CANDIDATES", 7)
+    for limit in (2, 201):
+        assert build_search_pipeline("ca", None, limit, NOW)[2] == {"$limit": 7}
+
+
+def test_next_page_seeks_after_ranking():
+    cursor = {"time": NOW, "_id": "x", "relevance": 2}
+    stages = [next(iter(stage)) for stage in build_search_pipeline("ca", None, 51, NOW, cursor=cursor)]
+    assert stages == ["$match", "$sort", "$limit", "$addFields", "$match", "$sort", "$limit", "$project"]
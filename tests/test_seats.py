@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from maintenance import backfill_seats_available
+from routes.ride_routes import availability_payload
+
+
+@pytest.fixture
+def driver(login):
+    return login("driver")
+
+
+@pytest.fixture
+def rider(login):
+    return login("rider")
+
+
+def join(client, headers, ride_id):
+    return client.post(f"/api/v1/ride/request/{ride_id}", headers=headers)
+
+
+def cancel(client, headers, ride_id):
+    return client.post(f"/api/v1/ride/cancel/{ride_id}", headers=headers)
+
+
+def state(mongo, ride_id):
+    ride = mongo.rides.find_one({"_id": ride_id})
+    return ride["seatsAvailable"], ride["passengers"]
+
+
+def test_join_takes_a_seat(client, mongo, driver, rider, new_ride):
+    user_id, headers = rider
+    ride_id = new_ride(driver[0])
+    response = join(client, headers, ride_id)
+    assert response.status_code == 200
+    assert state(mongo, ride_id) == (1, [user_id])
+    assert mongo.driver_stats.find_one({"_id": driver[0]})["totalPassengersCarried"] == 1
+
+
+def test_full_ride_is_refused(client, mongo, driver, rider, login, new_ride):
+    ride_id = new_ride(driver[0], seats=1)
+    first, first_headers = login("first")
+    assert join(client, first_headers, ride_id).status_code == 200
+    response = join(client, rider[1], ride_id)
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "Ride is full"
+    assert state(mongo, ride_id) == (0, [first])
+
+
+def test_join_is_guarded_by_the_counter(client, mongo, driver, rider, new_ride):
+    # seatsAvailable is authoritative, even if 'passengers' looks short
+    ride_id = new_ride(driver[0], seats=2)
+    mongo.rides.update_one({"_id": ride_id}, {"$set": {"seatsAvailable": 0}})
+    assert join(client, rider[1], ride_id).status_code == 400
+    assert state(mongo, ride_id) == (0, [])
+
+
+def test_driver_cannot_join(client, mongo, driver, new_ride):
+    ride_id = new_ride(driver[0])
+    response = join(client, driver[1], ride_id)
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "Driver cannot join their own ride"
+    assert state(mongo, ride_id) == (2, [])
+
+
+def test_duplicate_join_does_not_take_a_second_seat(client, mongo, driver, rider, new_ride):
+    user_id, headers = rider
+    ride_id = new_ride(driver[0])
+    assert join(client, headers, ride_id).status_code == 200
+    response = join(client, headers, ride_id)
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "You already joined this ride"
+    assert state(mongo, ride_id) == (1, [user_id])
+
+
+def test_join_missing_or_invalid_ride(client, rider):
+    assert join(client, rider[1], ObjectId()).status_code == 404
+    assert join(client, rider[1], "not-an-id").status_code == 400
+
+
+def test_cancel_gives_the_seat_back(client, mongo, driver, rider, new_ride):
+    _, headers = rider
+    ride_id = new_ride(driver[0])
+    join(client, headers, ride_id)
+    assert cancel(client, headers, ride_id).status_code == 200
+    assert state(mongo, ride_id) == (2, [])
+    assert mongo.driver_stats.find_one({"_id": driver[0]})["totalPassengersCarried"] == 0
+
+
+def test_cancel_by_non_passenger_leaves_counter_alone(client, mongo, driver, rider, login, new_ride):
+    user_id, headers = rider
+    ride_id = new_ride(driver[0])
+    join(client, headers, ride_id)
+    _, other_headers = login("other")
+    response = cancel(client, other_headers, ride_id)
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "You are not a passenger in this ride"
+    assert state(mongo, ride_id) == (1, [user_id])
+
+    assert cancel(client, headers, ride_id).status_code == 200
+    assert cancel(client, headers, ride_id).status_code == 400
+    assert state(mongo, ride_id) == (2, [])
+    assert cancel(client, headers, ObjectId()).status_code == 404
+
+
+def test_join_and_cancel_bump_updated_at(client, mongo, driver, rider, new_ride):
+    ride_id = new_ride(driver[0])
+    old = datetime(2000, 1, 1, tzinfo=timezone.utc)
+    mongo.rides.update_one({"_id": ride_id}, {"$set": {"updatedAt": old}})
+    join(client, rider[1], ride_id)
+    assert mongo.rides.find_one({"_id": ride_id})["updatedAt"] > old
+
+
+def test_availability_route_follows_bookings(client, driver, rider, new_ride):
+    ride_id = new_ride(driver[0], seats=1)
+    url = f"/api/v1/ride/{ride_id}/availability"
+    assert client.get(url, headers=rider[1]).get_json()["status"] == "Available"
+    join(client, rider[1], ride_id)
+    body = client.get(url, headers=rider[1]).get_json()
+    assert (body["remainingSeats"], body["seatsTaken"], body["status"]) == (0, 1, "Full")
+
+
+def test_create_ride_survives_a_failed_derived_write(client, mongo, driver, monkeypatch):
+    import routes.ride_routes as ride_routes
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("rollup write failed")
+
+    monkeypatch.setattr(ride_routes, "record_route", broken)
+    monkeypatch.setattr(ride_routes, "record_places", broken)
+    response = client.post("/api/v1/ride/create", headers=driver[1], json={
+        "pickup": "Campus", "dropoff": "Airport", "seats": 2,
+        "time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "pickupCoords": {"lat": 40.75, "lng": -73.98}, "dropoffCoords": {"lat": 40.64, "lng": -73.78}
+    })
+    assert response.status_code == 201
+    assert mongo.rides.count_documents({"driverId": driver[0]}) == 1
+    # The writes after the failing ones still ran
+    assert mongo.driver_stats.find_one({"_id": driver[0]})["totalRidesOffered"] == 1
+
+
+def test_bookings_survive_a_failed_stats_write(client, mongo, driver, rider, new_ride, monkeypatch):
+    import routes.ride_routes as ride_routes
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("driver_stats write failed")
+
+    monkeypatch.setattr(ride_routes, "bump_driver_stats", broken)
+    monkeypatch.setattr(ride_routes, "bump_driver_stats_bulk", broken)
+    ride_id = new_ride(driver[0])
+
+    response = join(client, rider[1], ride_id)
+    assert response.status_code == 200
+    assert response.get_json()["message"] == "Successfully joined ride"
+    response = cancel(client, rider[1], ride_id)
+    assert response.status_code == 200
+    assert response.get_json()["message"] == "Successfully cancelled ride request"
+    response = client.post("/api/v1/rides/batch-booking", headers=rider[1],
+                           json={"operations": [{"action": "join", "rideId": str(ride_id)}]})
+    assert response.status_code == 200
+    assert response.get_json()[0]["status"] == 200
+    assert state(mongo, ride_id) == (1, [rider[0]])
+
+
+def test_availability_rejects_a_malformed_id(client, rider):
+    response = client.get("/api/v1/ride/not-an-id/availability", headers=rider[1])
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "Invalid ride id"
+    response = client.get(f"/api/v1/ride/{ObjectId()}/availability", headers=rider[1])
+    assert response.status_code == 404
+
+
+def test_availability_payload():
+    assert availability_payload({"_id": "r", "seats": 3, "seatsAvailable": 1}) == {
+        "rideId": "r", "totalSeats": 3, "seatsTaken": 2, "remainingSeats": 1, "status": "Available"
+    }
+    assert availability_payload({"_id": "r", "seats": 3, "seatsAvailable": 0})["status"] == "Full"
+
+
+def test_backfill_seats_available(mongo, new_ride):
+    full = new_ride("d", seats=1)
+    overbooked = new_ride("d", seats=1)
+    mongo.rides.update_many({}, {"$unset": {"seatsAvailable": ""}})
+    mongo.rides.update_one({"_id": full}, {"$set": {"passengers": ["a"]}})
+    mongo.rides.update_one({"_id": overbooked}, {"$set": {"passengers": ["a", "b"]}})
+    open_ride = new_ride("d", seats=3)
+    backfill_seats_available(mongo)
+    assert mongo.rides.find_one({"_id": full})["seatsAvailable"] == 0
+    assert mongo.rides.find_one({"_id": overbooked})["seatsAvailable"] == 0
+    assert mongo.rides.find_one({"_id": open_ride})["seatsAvailable"] == 3